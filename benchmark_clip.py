@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from io import BytesIO
+
+import torch
+from PIL import Image
+
+from clip_utils import INFERENCE_MODES, TORCH_THREADS, load_clip
+from image_cache import get_image_cache
+
+
+def load_images(images_dir: str | None, db_path: str, limit: int) -> list:
+    """
+    Загружает изображения для замера: из папки или по ссылкам из базы (через кеш изображений).
+
+    Returns:
+        list: Список PIL.Image в RGB.
+    """
+    images = []
+    if images_dir:
+        for name in sorted(os.listdir(images_dir))[:limit]:
+            try:
+                images.append(Image.open(os.path.join(images_dir, name)).convert("RGB"))
+            except OSError:
+                continue
+        return images
+
+    cache = get_image_cache()
+    with sqlite3.connect(db_path) as conn:
+        urls = [r[0] for r in conn.execute(
+            "SELECT image FROM memes WHERE image LIKE 'http%' ORDER BY id LIMIT ?", (limit,)
+        )]
+    for url in urls:
+        try:
+            images.append(Image.open(BytesIO(cache.get(url))).convert("RGB"))
+        except Exception as e:
+            print(f"[!] Пропуск {url}: {e}")
+    return images
+
+
+def load_queries(db_path: str, limit: int) -> list:
+    """Берёт первые теги мемов как тестовые текстовые запросы."""
+    try:
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute(
+                "SELECT tags FROM memes WHERE tags IS NOT NULL AND tags != '-' LIMIT ?", (limit,)
+            ).fetchall()
+        queries = [r[0].split(",")[0].strip().strip('"') for r in rows]
+        return [q for q in queries if q] or ["кот", "грустный мем", "шок"]
+    except sqlite3.Error:
+        return ["кот", "грустный мем", "шок"]
+
+
+def run_mode(mode: str, images: list, queries: list, batch_size: int) -> dict:
+    """
+    Замеряет один режим: скорость кодирования картинок и текстовых запросов.
+
+    Returns:
+        dict: images_per_sec, text_ms, а также нормированные векторы картинок и запросов.
+    """
+    started = time.perf_counter()
+    model, preprocess, tokenizer = load_clip(mode)
+    load_seconds = time.perf_counter() - started
+
+    tensors = [preprocess(image) for image in images]
+    with torch.inference_mode():
+        model.encode_image(torch.stack(tensors[:batch_size]))  # прогрев
+
+        started = time.perf_counter()
+        image_vectors = torch.cat([
+            model.encode_image(torch.stack(tensors[i:i + batch_size]))
+            for i in range(0, len(tensors), batch_size)
+        ])
+        image_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        text_vectors = torch.cat([model.encode_text(tokenizer([q])) for q in queries])
+        text_seconds = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "images_per_sec": len(images) / image_seconds,
+        "text_ms": 1000 * text_seconds / len(queries),
+        "image_vectors": torch.nn.functional.normalize(image_vectors.float(), dim=-1),
+        "text_vectors": torch.nn.functional.normalize(text_vectors.float(), dim=-1),
+    }
+
+
+def compare(reference: dict, result: dict, top_k: int) -> dict:
+    """
+    Сравнивает векторы режима с эталонными fp32.
+
+    Returns:
+        dict: средний и минимальный косинус между векторами картинок и
+        среднее пересечение top-k выдачи «текст → картинка» с fp32.
+    """
+    cosines = (reference["image_vectors"] * result["image_vectors"]).sum(dim=-1)
+    k = min(top_k, len(cosines))
+    ref_top = (reference["text_vectors"] @ reference["image_vectors"].T).topk(k).indices
+    top = (result["text_vectors"] @ result["image_vectors"].T).topk(k).indices
+    overlap = [
+        len(set(a.tolist()) & set(b.tolist())) / k for a, b in zip(ref_top, top)
+    ]
+    return {
+        "cosine_mean": cosines.mean().item(),
+        "cosine_min": cosines.min().item(),
+        f"overlap_at_{k}": sum(overlap) / len(overlap),
+    }
+
+
+def main() -> None:
+    """
+    Сравнивает режимы инференса CLIP на CPU: изображений в секунду,
+    задержку кодирования запроса и совпадение векторов с fp32.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк режимов инференса OpenCLIP на CPU")
+    parser.add_argument("--db", default="memes.db")
+    parser.add_argument("--images", default=None, help="папка с картинками вместо базы")
+    parser.add_argument("--limit", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--modes", default=",".join(INFERENCE_MODES))
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--output", default=None, help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.db, args.limit)
+    queries = load_queries(args.db, 50)
+    if not images:
+        print("[!] Нет изображений для замера.")
+        return
+    print(
+        f"[i] Изображений: {len(images)}, запросов: {len(queries)}, "
+        f"потоков torch: {TORCH_THREADS}"
+    )
+
+    # fp32 всегда замеряется первым: это эталон для сравнения векторов
+    modes = ["fp32"] + [m.strip() for m in args.modes.split(",") if m.strip() not in ("", "fp32")]
+
+    reference = None
+    report = []
+    for mode in modes:
+        result = run_mode(mode, images, queries, args.batch_size)
+        if mode == "fp32":
+            reference = result
+        row = {
+            "mode": mode,
+            "load_seconds": round(result["load_seconds"], 2),
+            "images_per_sec": round(result["images_per_sec"], 2),
+            "text_ms": round(result["text_ms"], 2),
+            **{k: round(v, 4) for k, v in compare(reference, result, args.top_k).items()},
+        }
+        report.append(row)
+        print(
+            f"{mode:<12} {row['images_per_sec']:>8.1f} изобр/с  {row['text_ms']:>7.1f} мс/запрос  "
+            f"cos mean {row['cosine_mean']:.4f} min {row['cosine_min']:.4f}  "
+            + "  ".join(f"{k} {v:.3f}" for k, v in row.items() if k.startswith("overlap"))
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[✓] Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Нагрузочный симулятор бота: синтетические пользователи проходят сценарий поиска
+через настоящий Dispatcher из bot.py.
+
+Каждый пользователь отправляет /start → «Начать поиск» → тему → число →
+«Ещё мемы» → число. Telegram заменён FakeTelegramSession, Elasticsearch —
+локальной заменой (benchmarks/fake_es.py), embeddings API — заглушкой;
+у всех трёх настраивается задержка. Для каждого уровня конкурентности
+замеряются:
+  - задержка каждого обработчика (p50/p95/p99);
+  - лаг event loop (насколько опаздывает asyncio.sleep контрольной задачи);
+  - память на активную сессию (tracemalloc, прирост за уровень / число пользователей);
+  - исходящие вызовы: методы Bot API, запросы к ES и к embeddings API на один сценарий.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bot_load --concurrency 1,10,50
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from aiogram import BaseMiddleware
+from aiogram.types import Chat, Message, Update, User
+from elasticsearch import Elasticsearch
+
+from benchmarks.common import compare_with_baseline, save_baseline, summarize
+from benchmarks.fake_es import start_fake_elasticsearch
+from benchmarks.fake_telegram import FakeTelegramSession
+from benchmarks.search_benchmark import build_dataset, build_queries
+from embedding_providers import OpenAIEmbeddingProvider
+from embedding_stub_server import start_stub_server
+
+# bot.py создаёт Bot при импорте, токен должен быть синтаксически корректным
+os.environ.setdefault("BOT_TOKEN", "123456:LOAD-TEST-TOKEN")
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Внутренний middleware сообщений: замеряет время каждого обработчика по имени."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            name = data["handler"].callback.__name__
+            self.latencies[name].append(time.perf_counter() - started)
+
+
+class LoopLagMonitor:
+    """
+    Контрольная задача, которая спит interval секунд и записывает опоздание пробуждения.
+
+    Большой лаг означает, что обработчики блокируют event loop синхронными вызовами.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    """Собирает Update с текстовым сообщением пользователя в личном чате."""
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name=f"user{user_id}"),
+            text=text,
+        ),
+    )
+
+
+def user_flow(texts, topic: str, count: int, more: int) -> list:
+    """Сообщения одного пользователя в сценарии поиска."""
+    return ["/start", texts.start_search, topic, str(count), texts.more_memes, str(more)]
+
+
+async def _run_level(bot_module, users: int, first_user_id: int, topics: list,
+                     think_time: float, trace_memory: bool) -> dict:
+    """Прогоняет users одновременных пользователей и возвращает метрики уровня."""
+    dp, bot = bot_module.dp, bot_module.bot
+    timing = HandlerTimingMiddleware()
+    dp.message.middleware(timing)
+    monitor = LoopLagMonitor()
+    update_ids = iter(range(first_user_id * 10, first_user_id * 10 + users * 100))
+
+    async def simulate(user_id: int) -> None:
+        rng = random.Random(user_id)
+        flow = user_flow(
+            bot_module.Texts, rng.choice(topics), rng.randint(1, 5), rng.randint(1, 3)
+        )
+        for text in flow:
+            await dp.feed_update(bot, make_update(next(update_ids), user_id, text))
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, think_time))
+
+    memory_before = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulate(first_user_id + i) for i in range(users)))
+    finally:
+        wall = time.perf_counter() - started
+        await monitor.stop()
+        dp.message.middleware.unregister(timing)
+    memory_after = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+
+    updates = sum(len(v) for v in timing.latencies.values())
+    return {
+        "handlers": {name: summarize(values, wall) for name, values in timing.latencies.items()},
+        "loop_lag": summarize(monitor.samples, wall),
+        "wall_seconds": round(wall, 3),
+        "updates": updates,
+        "updates_per_sec": round(updates / wall, 2) if wall else 0.0,
+        "active_sessions": len(dp.storage.storage),
+        "memory_per_session_kb": (
+            round((memory_after - memory_before) / users / 1024, 2) if trace_memory else None
+        ),
+    }
+
+
+async def simulate_load(
+    concurrency_levels: list,
+    docs: int = 1000,
+    dim: int = 1536,
+    telegram_latency_ms: float = 50.0,
+    es_latency_ms: float = 2.0,
+    embed_latency_ms: float = 30.0,
+    think_time: float = 0.0,
+    trace_memory: bool = True,
+    seed: int = 0,
+) -> dict:
+    """
+    Прогоняет сценарий поиска на каждом уровне конкурентности.
+
+    На время прогона bot.bot получает FakeTelegramSession, а bot.get_search_service
+    отдаёт SearchService, направленный в замену ES; на каждом уровне конкурентности
+    сервис (и его кеши результатов и эмбеддингов) создаётся заново.
+    Рабочая папка переключается во временную с синтетической memes.db.
+
+    Args:
+        concurrency_levels (list): Числа одновременных пользователей, например [1, 10, 50].
+        docs (int): Число синтетических мемов.
+        dim (int): Размерность эмбеддингов.
+        telegram_latency_ms (float): Задержка ответа Bot API, мс.
+        es_latency_ms (float): Задержка ответа ES, мс.
+        embed_latency_ms (float): Задержка ответа embeddings API, мс.
+        think_time (float): Максимальная пауза пользователя между сообщениями, с.
+        trace_memory (bool): Замерять память через tracemalloc (замедляет
+            CPU-нагруженные обработчики; для чистых задержек отключить).
+        seed (int): Зерно генератора данных.
+
+    Returns:
+        dict: {"levels": {уровень: метрики}, "latency": {"c<уровень>/<обработчик>": сводка}}.
+    """
+    import bot as bot_module
+    from elasticsearch_utils import ElasticsearchManager
+    from search_service import CachedEmbeddingProvider, SearchService
+
+    es_server = start_fake_elasticsearch(latency=es_latency_ms / 1000)
+    stub_server = start_stub_server(dim=dim, latency=embed_latency_ms / 1000)
+    stub_host, stub_port = stub_server.server_address[:2]
+    tmp_dir = tempfile.TemporaryDirectory()
+    old_cwd = os.getcwd()
+    old_session = bot_module.bot.session
+    old_get_service = bot_module.get_search_service
+    session = FakeTelegramSession(latency=telegram_latency_ms / 1000)
+    provider = OpenAIEmbeddingProvider(
+        dim=dim, api_key="stub", base_url=f"http://{stub_host}:{stub_port}/v1"
+    )
+
+    def manager_factory(provider=provider):
+        return ElasticsearchManager(
+            db_path="memes.db", embedding_dim=dim, provider=provider,
+            es=Elasticsearch(es_server.url, request_timeout=30)
+        )
+
+    try:
+        os.chdir(tmp_dir.name)
+        vocabulary = build_dataset("memes.db", docs, dim, seed)
+        queries = build_queries(vocabulary, seed)
+        topics = queries["text"] + queries["knn_fallback"][:5] + queries["emoji"]
+        loader = manager_factory()
+        loader.initialize_elasticsearch()
+        loader.sync_db_to_elasticsearch()
+
+        # Middleware сессии (трассировка вызовов Bot API) переносится в подменную сессию
+        session.middleware = old_session.middleware
+        bot_module.bot.session = session
+        if trace_memory:
+            tracemalloc.start()
+
+        report = {"levels": {}, "latency": {}}
+        first_user_id = 1_000_000
+        for level in concurrency_levels:
+            calls_before = dict(session.calls)
+            es_before = dict(es_server.request_counts)
+            embed_before = stub_server.request_count
+            service = SearchService(manager_factory(CachedEmbeddingProvider(provider)))
+            bot_module.get_search_service = lambda: service
+
+            metrics = await _run_level(
+                bot_module, level, first_user_id, topics, think_time, trace_memory
+            )
+            calls = {
+                **{f"telegram.{name}": count - calls_before.get(name, 0)
+                   for name, count in session.calls.items()},
+                **{f"es.{name}": count - es_before.get(name, 0)
+                   for name, count in es_server.request_counts.items()},
+                "embeddings": stub_server.request_count - embed_before,
+            }
+            metrics["calls_per_flow"] = {
+                name: round(count / level, 2) for name, count in calls.items() if count
+            }
+            report["levels"][level] = metrics
+            for name, summary in metrics["handlers"].items():
+                report["latency"][f"c{level}/{name}"] = summary
+            report["latency"][f"c{level}/loop_lag"] = metrics["loop_lag"]
+
+            bot_module.dp.storage.storage.clear()
+            first_user_id += level
+        return report
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        bot_module.bot.session = old_session
+        bot_module.get_search_service = old_get_service
+        os.chdir(old_cwd)
+        es_server.shutdown()
+        stub_server.shutdown()
+        tmp_dir.cleanup()
+
+
+def print_report(report: dict) -> None:
+    """Печатает метрики уровней и задержки обработчиков."""
+    for level, metrics in report["levels"].items():
+        memory = metrics["memory_per_session_kb"]
+        print(
+            f"\n[i] Пользователей: {level}, обновлений/с: {metrics['updates_per_sec']}, "
+            f"лаг loop p99: {metrics['loop_lag']['p99_ms']:.1f} мс "
+            f"(max {metrics['loop_lag']['max_ms']:.1f}), "
+            f"память на сессию: {'—' if memory is None else f'{memory} КБ'}"
+        )
+        print(f"    {'обработчик':<28} {'p50':>9} {'p95':>9} {'p99':>9} {'вызовов':>8}")
+        for name, row in sorted(metrics["handlers"].items()):
+            print(
+                f"    {name:<28} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                f"{row['p99_ms']:>9.1f} {row['count']:>8}"
+            )
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(metrics["calls_per_flow"].items()))
+        print(f"    вызовов на сценарий: {calls}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный симулятор Telegram-бота")
+    parser.add_argument("--concurrency", default="1,10,50",
+                        help="уровни одновременных пользователей через запятую")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--telegram-latency-ms", type=float, default=50.0)
+    parser.add_argument("--es-latency-ms", type=float, default=2.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="не замерять память (tracemalloc искажает задержки)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", default=None, help="сохранить результаты в JSON")
+    parser.add_argument("--compare", default=None, help="сравнить с базовым JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    params = {
+        "concurrency_levels": [int(x) for x in args.concurrency.split(",") if x.strip()],
+        "docs": args.docs,
+        "dim": args.dim,
+        "telegram_latency_ms": args.telegram_latency_ms,
+        "es_latency_ms": args.es_latency_ms,
+        "embed_latency_ms": args.embed_latency_ms,
+        "think_time": args.think_time,
+        "trace_memory": not args.no_trace_memory,
+        "seed": args.seed,
+    }
+    report = asyncio.run(simulate_load(**params))
+    print_report(report)
+
+    if args.save_baseline:
+        meta = {"params": params, "levels": report["levels"],
+                "python": platform.python_version(), "cpus": os.cpu_count()}
+        save_baseline(args.save_baseline, report["latency"], meta)
+        print(f"[✓] Базовый замер сохранён в {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare_with_baseline(report["latency"], args.compare, args.tolerance)
+        if regressions:
+            print("[!] Регрессии относительно базового замера:")
+            for line in regressions:
+                print(f"    {line}")
+            return 1
+        print("[✓] Регрессий нет.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
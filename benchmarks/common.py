@@ -0,0 +1,150 @@
+"""
+Общие функции бенчмарков: перцентили, прогон нагрузки, сохранение и сравнение базовых замеров.
+"""
+
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Перцентиль с линейной интерполяцией между соседними значениями.
+
+    Args:
+        values (list): Замеры (в любом порядке).
+        q (float): Перцентиль от 0 до 100.
+
+    Returns:
+        float: Значение перцентиля; 0.0 для пустого списка.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: list, wall_seconds: float, errors: int = 0) -> dict:
+    """
+    Сводка по серии вызовов.
+
+    Args:
+        latencies (list): Длительности вызовов в секундах.
+        wall_seconds (float): Общее время серии (для пропускной способности).
+        errors (int): Число вызовов, завершившихся исключением.
+
+    Returns:
+        dict: count, errors, p50_ms, p95_ms, p99_ms, mean_ms, max_ms, throughput (вызовов/с).
+    """
+    count = len(latencies)
+    return {
+        "count": count,
+        "errors": errors,
+        "p50_ms": round(1000 * percentile(latencies, 50), 3),
+        "p95_ms": round(1000 * percentile(latencies, 95), 3),
+        "p99_ms": round(1000 * percentile(latencies, 99), 3),
+        "mean_ms": round(1000 * sum(latencies) / count, 3) if count else 0.0,
+        "max_ms": round(1000 * max(latencies), 3) if count else 0.0,
+        "throughput": round(count / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+def run_load(func, args_list: list, iterations: int, concurrency: int = 1, warmup: int = 1) -> dict:
+    """
+    Вызывает func по кругу на аргументах из args_list и замеряет каждый вызов.
+
+    Args:
+        func (callable): Замеряемая функция.
+        args_list (list): Кортежи аргументов, перебираются циклически.
+        iterations (int): Число замеряемых вызовов.
+        concurrency (int): Число потоков, вызывающих func одновременно.
+        warmup (int): Незамеряемых вызовов на каждый набор аргументов перед серией.
+
+    Returns:
+        dict: Сводка summarize().
+    """
+    for args in args_list:
+        for _ in range(warmup):
+            func(*args)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(i: int) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            func(*args_list[i % len(args_list)])
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(iterations):
+            call(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(call, range(iterations)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def save_baseline(path: str, results: dict, meta: dict | None = None) -> None:
+    """Сохраняет результаты прогона как базовый замер (JSON)."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta or {}, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def compare_with_baseline(results: dict, path: str, tolerance: float = 0.2) -> list:
+    """
+    Сравнивает результаты с сохранённым базовым замером.
+
+    Регрессией считается рост p95 или падение пропускной способности
+    больше чем на tolerance (доля) относительно базового замера.
+
+    Args:
+        results (dict): {сценарий: сводка summarize()}.
+        path (str): Файл базового замера.
+        tolerance (float): Допустимое ухудшение (0.2 — 20%).
+
+    Returns:
+        list: Строки с описанием регрессий; пустой список, если регрессий нет.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if reference["p95_ms"] and current["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {reference['p95_ms']:.1f} -> {current['p95_ms']:.1f} мс"
+            )
+        if current["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: пропускная способность {reference['throughput']:.1f} -> "
+                f"{current['throughput']:.1f} в секунду"
+            )
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    """Печатает сводки сценариев таблицей."""
+    print(f"{'сценарий':<34} {'p50':>8} {'p95':>8} {'p99':>8} {'в сек':>8} {'ошибок':>7}")
+    for name, row in results.items():
+        print(
+            f"{name:<34} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['throughput']:>8.1f} {row['errors']:>7}"
+        )
@@ -0,0 +1,301 @@
+"""
+Локальная замена Elasticsearch для бенчмарков и нагрузочных прогонов.
+
+Реализует по HTTP то подмножество API, которым пользуется ElasticsearchManager:
+ping, indices.exists/create/get_mapping/put_mapping, search (multi_match и knn),
+msearch и bulk. Настоящий клиент elasticsearch-py работает с ней без изменений,
+поэтому в замеры входят сериализация и HTTP, как в бою. Задержка ответа настраивается.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _tokens(text) -> list:
+    return _TOKEN_RE.findall(str(text).lower()) if text else []
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Проверяет, что строки отличаются не более чем на одну правку (как fuzziness=1)."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return edits + (len(b) - j) <= 1
+
+
+class FakeIndex:
+    """
+    Документы одного индекса с инвертированным индексом для текстовых полей
+    и матрицами векторов для KNN.
+    """
+
+    def __init__(self, mappings: dict | None = None):
+        self.mappings = mappings or {"properties": {}}
+        self.docs = {}
+        self.postings = defaultdict(lambda: defaultdict(dict))  # поле -> терм -> {id: tf}
+        self._matrices = {}
+        self._expansions = {}
+        self._lock = threading.Lock()
+
+    def index(self, doc_id: str, source: dict) -> str:
+        with self._lock:
+            result = "updated" if doc_id in self.docs else "created"
+            if result == "updated":
+                self._unindex(doc_id)
+            self.docs[doc_id] = source
+            for field, value in source.items():
+                if isinstance(value, str):
+                    for term in _tokens(value):
+                        postings = self.postings[field][term]
+                        postings[doc_id] = postings.get(doc_id, 0) + 1
+            self._matrices.clear()
+            self._expansions.clear()
+            return result
+
+    def _unindex(self, doc_id: str) -> None:
+        for field, value in self.docs[doc_id].items():
+            if isinstance(value, str):
+                for term in set(_tokens(value)):
+                    self.postings[field][term].pop(doc_id, None)
+
+    def _expand(self, field: str, term: str, fuzziness: int) -> list:
+        if not fuzziness or len(term) <= 2:
+            return [term] if term in self.postings[field] else []
+        key = (field, term)
+        if key not in self._expansions:
+            self._expansions[key] = [
+                t for t in list(self.postings[field]) if _within_one_edit(term, t)
+            ]
+        return self._expansions[key]
+
+    def multi_match(self, query: str, fields: list, fuzziness: int, size: int) -> list:
+        """TF-IDF по полям с нечётким совпадением термов (расстояние правки 1)."""
+        scores = defaultdict(float)
+        total = max(len(self.docs), 1)
+        for field in fields:
+            field = field.split("^")[0]
+            for term in _tokens(query):
+                for matched in self._expand(field, term, fuzziness):
+                    postings = self.postings[field][matched]
+                    if not postings:
+                        continue
+                    idf = math.log(1 + total / len(postings))
+                    for doc_id, tf in postings.items():
+                        scores[doc_id] += idf * (1 + math.log(tf))
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:size]
+        return [(doc_id, score) for doc_id, score in ranked]
+
+    def _matrix(self, field: str):
+        with self._lock:
+            if field not in self._matrices:
+                ids, rows = [], []
+                for doc_id, source in self.docs.items():
+                    vector = source.get(field)
+                    if vector:
+                        ids.append(doc_id)
+                        rows.append(vector)
+                matrix = np.asarray(rows, dtype=np.float32) if rows else np.zeros((0, 1))
+                if len(rows):
+                    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+                self._matrices[field] = (ids, matrix)
+            return self._matrices[field]
+
+    def knn(self, field: str, vector: list, k: int) -> list:
+        """Точный косинусный KNN; оценка как у ES: (1 + cos) / 2."""
+        ids, matrix = self._matrix(field)
+        if not ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        similarities = matrix @ query
+        k = min(k, len(ids))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(ids[i], float((1 + similarities[i]) / 2)) for i in top]
+
+
+class FakeElasticsearchServer(ThreadingHTTPServer):
+    """HTTP-сервер с индексами в памяти и настраиваемой задержкой ответа."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.indices = {}
+        self.request_counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def search(self, index_name: str, body: dict) -> dict:
+        started = time.perf_counter()
+        index = self.indices.get(index_name)
+        if index is None:
+            return None
+        size = body.get("size", 10)
+        query = body.get("query", {})
+        knn = query.get("knn") or body.get("knn")
+        if knn:
+            matches = index.knn(knn["field"], knn["query_vector"], knn.get("k", size))
+        elif "multi_match" in query:
+            mm = query["multi_match"]
+            fuzziness = mm.get("fuzziness", 0)
+            fuzziness = 1 if fuzziness in ("AUTO", "auto") else int(fuzziness)
+            matches = index.multi_match(mm["query"], mm.get("fields", []), fuzziness, size)
+        else:
+            matches = [(doc_id, 1.0) for doc_id in list(index.docs)[:size]]
+        matches = matches[:size]
+        response = {
+            "took": int((time.perf_counter() - started) * 1000),
+            "timed_out": False,
+            "hits": {
+                "total": {"value": len(matches), "relation": "eq"},
+                "max_score": matches[0][1] if matches else None,
+                "hits": [
+                    {"_index": index_name, "_id": doc_id, "_score": score,
+                     "_source": index.docs[doc_id]}
+                    for doc_id, score in matches
+                ],
+            },
+        }
+        if body.get("profile"):
+            response["profile"] = {"shards": [{"id": "[fake][0]", "searches": []}]}
+        return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят отдельными write; без TCP_NODELAY на keep-alive
+    # соединении каждый ответ ждёт отложенный ACK (~40 мс) и искажает замеры
+    disable_nagle_algorithm = True
+
+    def _reply(self, status: int, body=None) -> None:
+        raw = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(raw)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _route(self):
+        server = self.server
+        raw = self._body()
+        if server.latency:
+            time.sleep(server.latency)
+        parts = [p for p in urlsplit(self.path).path.split("/") if p]
+        with server.lock:
+            server.request_counts[parts[-1] if parts else "ping"] += 1
+
+        if not parts:
+            return self._reply(200, {"version": {"number": "9.0.0"}, "tagline": "fake"})
+        if parts == ["_bulk"] or parts[-1] == "_bulk":
+            return self._reply(200, self._bulk(raw, parts[0] if len(parts) == 2 else None))
+        if parts[-1] == "_msearch":
+            return self._reply(200, self._msearch(raw, parts[0] if len(parts) == 2 else None))
+
+        index_name = parts[0]
+        index = server.indices.get(index_name)
+        if len(parts) == 1:
+            if self.command == "HEAD":
+                return self._reply(200 if index else 404)
+            if self.command == "PUT":
+                body = json.loads(raw or b"{}")
+                server.indices[index_name] = FakeIndex(body.get("mappings"))
+                return self._reply(200, {"acknowledged": True, "index": index_name})
+        if index is None:
+            return self._reply(404, {"error": {"type": "index_not_found_exception"},
+                                     "status": 404})
+        if parts[1] == "_mapping":
+            if self.command == "GET":
+                return self._reply(200, {index_name: {"mappings": index.mappings}})
+            properties = json.loads(raw or b"{}").get("properties", {})
+            index.mappings.setdefault("properties", {}).update(properties)
+            return self._reply(200, {"acknowledged": True})
+        if parts[1] == "_search":
+            return self._reply(200, server.search(index_name, json.loads(raw or b"{}")))
+        return self._reply(400, {"error": {"type": "unsupported"}, "status": 400})
+
+    def _bulk(self, raw: bytes, default_index: str | None) -> dict:
+        lines = [line for line in raw.decode("utf-8").splitlines() if line.strip()]
+        items = []
+        for header_line, source_line in zip(lines[::2], lines[1::2]):
+            action, meta = next(iter(json.loads(header_line).items()))
+            index_name = meta.get("_index", default_index)
+            index = self.server.indices.setdefault(index_name, FakeIndex())
+            result = index.index(str(meta.get("_id")), json.loads(source_line))
+            status = 201 if result == "created" else 200
+            items.append({action: {"_index": index_name, "_id": str(meta.get("_id")),
+                                   "result": result, "status": status}})
+        return {"took": 1, "errors": False, "items": items}
+
+    def _msearch(self, raw: bytes, default_index: str | None) -> dict:
+        lines = [line for line in raw.decode("utf-8").splitlines() if line.strip()]
+        responses = []
+        for header_line, body_line in zip(lines[::2], lines[1::2]):
+            index_name = json.loads(header_line).get("index", default_index)
+            result = self.server.search(index_name, json.loads(body_line))
+            responses.append(result if result is not None else {
+                "error": {"type": "index_not_found_exception"}, "status": 404
+            })
+            if result is not None:
+                result["status"] = 200
+        return {"took": 1, "responses": responses}
+
+    do_GET = do_POST = do_PUT = do_HEAD = do_DELETE = _route
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_elasticsearch(
+    host: str = "127.0.0.1", port: int = 0, latency: float = 0.0
+) -> FakeElasticsearchServer:
+    """
+    Запускает замену Elasticsearch в фоновом потоке.
+
+    Args:
+        host (str): Адрес.
+        port (int): Порт (0 — любой свободный).
+        latency (float): Искусственная задержка каждого ответа, секунды.
+
+    Returns:
+        FakeElasticsearchServer: Сервер; адрес для клиента — server.url,
+        остановка — server.shutdown().
+    """
+    server = FakeElasticsearchServer((host, port), latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
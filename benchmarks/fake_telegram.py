@@ -0,0 +1,76 @@
+"""
+Сессия aiogram без сети: отвечает на запросы Bot API так, как ответил бы Telegram.
+
+Ответы проходят через BaseSession.check_response, то есть десериализуются
+в объекты aiogram так же, как настоящие. Задержку ответа можно задать.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия Bot API, которая не ходит в сеть.
+
+    Атрибуты:
+      - calls: Counter вызовов по имени метода Bot API (sendMessage, sendPhoto, ...).
+      - history: последние запросы (имя метода, chat_id, объект метода).
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, history_size: int = 1000):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self.history = deque(maxlen=history_size)
+        self._message_id = 0
+
+    def _result(self, method: TelegramMethod):
+        if method.__returning__ is not Message:
+            return True
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", 0) or 0
+        result = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if getattr(method, "text", None) is not None:
+            result["text"] = method.text
+        if getattr(method, "photo", None) is not None:
+            file_id = f"fake-photo-{self._message_id}"
+            result["photo"] = [{
+                "file_id": file_id, "file_unique_id": file_id, "width": 512, "height": 512
+            }]
+            if method.caption:
+                result["caption"] = method.caption
+        return result
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None
+    ):
+        name = method.__api_method__
+        self.calls[name] += 1
+        self.history.append((name, getattr(method, "chat_id", None), method))
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        content = json.dumps({"ok": True, "result": self._result(method)})
+        return self.check_response(bot, method, 200, content).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                             raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
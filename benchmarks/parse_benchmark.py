@@ -0,0 +1,154 @@
+"""
+Бенчмарк разбора статей memepedia: страниц в секунду для разных бэкендов
+разбора (parsing.HTML_PARSERS) и для повторного разбора архива (data_base/html_archive.py)
+в одном процессе и в пуле процессов.
+
+Страницы синтетические, но по объёму и разметке близки к настоящим
+(меню, скрипты, сайдбар, комментарии вокруг статьи). Перед замером
+проверяется, что все бэкенды извлекают одинаковые записи.
+
+Запуск из корня репозитория:
+    python -m benchmarks.parse_benchmark --pages 300 --processes 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bs4 import FeatureNotFound
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "data_base"))
+
+from crawler import UrlRegistry, reparse_archive  # noqa: E402
+from html_archive import HtmlArchive  # noqa: E402
+from parsing import HTML_PARSERS, extract_meme  # noqa: E402
+
+WORDS = ["мем", "кот", "шаблон", "реакция", "интернет", "пользователи", "картинка", "шутка",
+         "видео", "персонаж", "фраза", "тренд", "соцсети", "подпись", "оригинал", "версия"]
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_article_page(index: int, rng: random.Random) -> str:
+    """Синтетическая страница статьи ~50–70 КБ в разметке memepedia.ru."""
+    menu = "".join(
+        f'<li class="menu-item"><a href="/category/{i}/">{rng.choice(WORDS)}</a></li>'
+        for i in range(120)
+    )
+    scripts = "".join(
+        f"<script>window.dataLayer=window.dataLayer||[];dataLayer.push({{'e':{i}}});</script>"
+        for i in range(20)
+    )
+    paragraphs = "".join(f"<p>{_sentence(rng, 40)}</p>" for _ in range(12))
+    sidebar = "".join(
+        f'<div class="widget"><a href="/post-{i}/"><img src="/thumb/{i}.jpg" alt="">'
+        f"<span>{_sentence(rng, 6)}</span></a></div>"
+        for i in range(40)
+    )
+    comments = "".join(
+        f'<li class="comment"><div class="comment-body"><b>user{i}</b> {_sentence(rng)}</div></li>'
+        for i in range(60)
+    )
+    return (
+        f"<!DOCTYPE html><html><head><title>Мем {index}</title>{scripts}</head><body>"
+        f'<header><nav><ul class="menu">{menu}</ul></nav></header>'
+        f'<main><article><h1 itemprop="headline">Мем номер {index}</h1>'
+        f'<figure class="s-post-media-img post-thumbnail post-media-b">'
+        f'<img src="https://memepedia.ru/wp-content/uploads/{index}.jpg"></figure>'
+        f'<div itemprop="articleBody"><p>{_sentence(rng, 30)}</p>{paragraphs}</div></article>'
+        f'<aside>{sidebar}</aside><ol class="comments">{comments}</ol></main>'
+        f"<footer>{_sentence(rng)}</footer></body></html>"
+    )
+
+
+def available_parsers() -> list:
+    parsers = []
+    for name in HTML_PARSERS:
+        try:
+            extract_meme("<p></p>", name)
+        except (FeatureNotFound, ImportError):
+            print(f"[i] Бэкенд {name} не установлен, пропускаем")
+            continue
+        parsers.append(name)
+    return parsers
+
+
+def run(pages: int = 300, processes: int | None = None, seed: int = 0) -> dict:
+    """
+    Замеряет разбор pages страниц.
+
+    Returns:
+        dict: {сценарий: {"pages_per_sec": ..., "seconds": ...}} и размеры архива.
+    """
+    rng = random.Random(seed)
+    html_pages = [make_article_page(i, rng) for i in range(pages)]
+    parsers = available_parsers()
+    results = {}
+
+    reference = [extract_meme(html, "html.parser") for html in html_pages[:20]]
+    for name in parsers:
+        if [extract_meme(html, name) for html in html_pages[:20]] != reference:
+            raise AssertionError(f"Бэкенд {name} извлекает другие записи")
+
+    for name in parsers:
+        started = time.perf_counter()
+        for html in html_pages:
+            extract_meme(html, name)
+        elapsed = time.perf_counter() - started
+        results[f"extract[{name}]"] = {"pages_per_sec": pages / elapsed, "seconds": elapsed}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        archive = HtmlArchive(os.path.join(workdir, "archive"))
+        registry = UrlRegistry(os.path.join(workdir, "registry.json"))
+        started = time.perf_counter()
+        for i, html in enumerate(html_pages):
+            url = f"https://memepedia.ru/mem-{i}/"
+            registry.get_id(url)
+            archive.append(url, html)
+        elapsed = time.perf_counter() - started
+        archive.close()
+        raw_bytes = sum(len(html.encode("utf-8")) for html in html_pages)
+        archived_bytes = sum(
+            os.path.getsize(os.path.join(archive.directory, name))
+            for name in os.listdir(archive.directory) if name.endswith(".seg")
+        )
+        results["archive_append"] = {"pages_per_sec": pages / elapsed, "seconds": elapsed}
+
+        workers = processes or os.cpu_count() or 1
+        for name in parsers:
+            for count in sorted({1, workers}):
+                started = time.perf_counter()
+                reparse_archive(archive, registry, processes=count, parser=name)
+                elapsed = time.perf_counter() - started
+                results[f"reparse[{name}, {count} проц.]"] = {
+                    "pages_per_sec": pages / elapsed, "seconds": elapsed,
+                }
+
+    results["_archive"] = {"raw_mb": raw_bytes / 2**20, "archived_mb": archived_bytes / 2**20}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора статей и архива HTML")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--processes", type=int, default=None,
+                        help="процессов для повторного разбора (по умолчанию по числу ядер)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = run(pages=args.pages, processes=args.processes, seed=args.seed)
+    sizes = results.pop("_archive")
+    print(f"[i] Архив: {sizes['raw_mb']:.1f} МБ HTML -> {sizes['archived_mb']:.1f} МБ на диске")
+    print(f"{'сценарий':<34} {'стр/с':>9} {'секунд':>8}")
+    for name, row in results.items():
+        print(f"{name:<34} {row['pages_per_sec']:>9.1f} {row['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Бенчмарк задержки поиска без внешних сервисов.
+
+ElasticsearchManager работает с настоящим клиентом elasticsearch-py, но против
+локальной замены ES (benchmarks/fake_es.py) и заглушки embeddings API
+(embedding_stub_server.py); задержки обоих настраиваются. Замеряются
+search и search_with_hybrid для трёх типов запросов:
+  - text         — запрос находится текстовым поиском;
+  - knn_fallback — текстовый поиск пуст, запрос уходит в KNN (с эмбеддингом запроса);
+  - emoji        — запрос из эмодзи (перевод в текст + KNN);
+и загрузка базы в индекс (sync_db_to_elasticsearch).
+
+Запуск из корня репозитория:
+    python -m benchmarks.search_benchmark --save-baseline benchmarks/baselines/search.json
+    python -m benchmarks.search_benchmark --compare benchmarks/baselines/search.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch
+
+from benchmarks.common import compare_with_baseline, print_table, run_load, save_baseline
+from benchmarks.fake_es import start_fake_elasticsearch
+from elasticsearch_utils import ElasticsearchManager
+from embedding_providers import OpenAIEmbeddingProvider
+from embedding_stub_server import fake_embedding, start_stub_server
+
+SYLLABLES = ["ко", "ты", "ма", "ре", "ше", "ла", "но", "ви", "ду", "па", "ги", "зо", "мэ", "ха"]
+EMOJI_QUERIES = ["😂", "🐱", "🔥😭", "🤡"]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def build_dataset(db_path: str, docs: int, dim: int, seed: int = 0) -> list:
+    """
+    Создаёт базу с синтетическими мемами и эмбеддингами описаний.
+
+    Args:
+        db_path (str): Путь к новой базе SQLite.
+        docs (int): Число мемов.
+        dim (int): Размерность эмбеддингов.
+        seed (int): Зерно генератора (один и тот же набор данных между запусками).
+
+    Returns:
+        list: Словарь слов, из которых составлены тексты (для текстовых запросов).
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted({_word(rng) for _ in range(max(50, docs // 4))})
+    rows = []
+    for meme_id in range(1, docs + 1):
+        name = " ".join(rng.choices(vocabulary, k=2))
+        tags = ", ".join(rng.choices(vocabulary, k=3))
+        description = " ".join(rng.choices(vocabulary, k=12))
+        rows.append((
+            meme_id, f"https://example.com/{meme_id}.jpg", name, description, tags,
+            json.dumps(fake_embedding(description, dim)),
+        ))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE memes (id INTEGER PRIMARY KEY, image TEXT, name TEXT, "
+            "description TEXT, tags TEXT, embedding TEXT, rendition TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO memes (id, image, name, description, tags, embedding) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return vocabulary
+
+
+def build_queries(vocabulary: list, seed: int = 0) -> dict:
+    """
+    Готовит запросы трёх типов.
+
+    Запросы knn_fallback состоят из латиницы и не совпадают со словарём
+    (кириллица) даже с нечёткостью, поэтому текстовый поиск по ним пуст.
+    """
+    rng = random.Random(seed + 1)
+    return {
+        "text": [" ".join(rng.sample(vocabulary, 2)) for _ in range(20)],
+        "knn_fallback": [
+            "".join(rng.choice("qwxzjv") for _ in range(8)) for _ in range(20)
+        ],
+        "emoji": EMOJI_QUERIES,
+    }
+
+
+def run(
+    docs: int = 2000,
+    dim: int = 1536,
+    iterations: int = 100,
+    concurrency: int = 1,
+    es_latency_ms: float = 2.0,
+    embed_latency_ms: float = 30.0,
+    k: int = 5,
+    hybrid_k: int = 100,
+    sync_repeats: int = 3,
+    seed: int = 0,
+) -> dict:
+    """
+    Поднимает замену ES и заглушку эмбеддингов, загружает данные и замеряет сценарии.
+
+    Args:
+        docs (int): Число синтетических мемов.
+        dim (int): Размерность эмбеддингов.
+        iterations (int): Замеряемых вызовов на сценарий.
+        concurrency (int): Потоков, вызывающих поиск одновременно.
+        es_latency_ms (float): Задержка каждого ответа замены ES, мс.
+        embed_latency_ms (float): Задержка каждого ответа embeddings API, мс.
+        k (int): k для search (как в кнопке «Ещё мемы» по умолчанию).
+        hybrid_k (int): k для search_with_hybrid (бот запрашивает 100).
+        sync_repeats (int): Сколько раз замерять sync_db_to_elasticsearch.
+        seed (int): Зерно генератора данных и запросов.
+
+    Returns:
+        dict: {сценарий: сводка benchmarks.common.summarize()}.
+    """
+    es_server = start_fake_elasticsearch(latency=es_latency_ms / 1000)
+    stub_server = start_stub_server(dim=dim, latency=embed_latency_ms / 1000)
+    stub_host, stub_port = stub_server.server_address[:2]
+    tmp_dir = tempfile.TemporaryDirectory()
+    try:
+        db_path = os.path.join(tmp_dir.name, "memes.db")
+        vocabulary = build_dataset(db_path, docs, dim, seed)
+        provider = OpenAIEmbeddingProvider(
+            dim=dim, api_key="stub", base_url=f"http://{stub_host}:{stub_port}/v1"
+        )
+        manager = ElasticsearchManager(
+            db_path=db_path,
+            index_name="bench_index",
+            embedding_dim=dim,
+            provider=provider,
+            es=Elasticsearch(es_server.url, request_timeout=30),
+        )
+        manager.initialize_elasticsearch()
+
+        results = {}
+        results["sync_db_to_elasticsearch"] = run_load(
+            manager.sync_db_to_elasticsearch, [()], sync_repeats, warmup=0
+        )
+        results["sync_db_to_elasticsearch"]["docs_per_sec"] = round(
+            docs * results["sync_db_to_elasticsearch"]["throughput"], 1
+        )
+
+        for kind, queries in build_queries(vocabulary, seed).items():
+            results[f"search/{kind}"] = run_load(
+                manager.search, [(q, k) for q in queries], iterations, concurrency
+            )
+            results[f"search_with_hybrid/{kind}"] = run_load(
+                manager.search_with_hybrid, [(q, hybrid_k) for q in queries],
+                iterations, concurrency
+            )
+        return results
+    finally:
+        es_server.shutdown()
+        stub_server.shutdown()
+        tmp_dir.cleanup()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк задержки поиска мемов")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--es-latency-ms", type=float, default=2.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--hybrid-k", type=int, default=100)
+    parser.add_argument("--sync-repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", default=None, help="сохранить результаты в JSON")
+    parser.add_argument("--compare", default=None, help="сравнить с базовым JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение")
+    args = parser.parse_args()
+
+    # Клиенты ES и OpenAI и сам поиск логируют каждый запрос — на замеры это не должно влиять
+    logging.disable(logging.INFO)
+
+    params = {
+        key: value for key, value in vars(args).items()
+        if key not in ("save_baseline", "compare", "tolerance")
+    }
+    started = time.perf_counter()
+    results = run(**params)
+    print(f"[i] Прогон занял {time.perf_counter() - started:.1f} с")
+    print_table(results)
+
+    if args.save_baseline:
+        meta = {"params": params, "python": platform.python_version(),
+                "machine": platform.machine(), "cpus": os.cpu_count()}
+        save_baseline(args.save_baseline, results, meta)
+        print(f"[✓] Базовый замер сохранён в {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare_with_baseline(results, args.compare, args.tolerance)
+        if regressions:
+            print("[!] Регрессии относительно базового замера:")
+            for line in regressions:
+                print(f"    {line}")
+            return 1
+        print("[✓] Регрессий нет.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,16 +3,53 @@ import os
 import random
 import sqlite3
 import asyncio 
+import threading
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher, F, types
-from aiogram.filters import Command
+from aiogram import BaseMiddleware, Bot, Dispatcher, F, types
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Message, ReplyKeyboardRemove
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    BufferedInputFile,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultPhoto,
+    Message,
+    ReplyKeyboardRemove,
+)
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
-from config import Texts
-from elasticsearch_utils import ElasticsearchManager
+from config import (
+    ADMIN_IDS,
+    INLINE_CACHE_TIME,
+    INLINE_RESULTS,
+    METRICS_HOST,
+    METRICS_PORT,
+    SIMILAR_COUNT,
+    TRACE_SLOW_MS,
+    Texts,
+)
+from image_cache import get_image_cache
+from event_log import get_event_log
+from import_memes import ensure_schema
+from inline_search import file_ids, get_inline_search
+from metrics import MEME_SENDS, SEND_FAILURES, TAG_QUERIES, start_metrics_server
+from neighbor_graph import get_neighbor_graph
+from s3_storage import get_url_resolver
+from search_service import get_search_service, hot_queries
+from tag_index import get_tag_index
+from tracing import (
+    PROFILE_MODES,
+    SamplingProfiler,
+    arm_profiling,
+    claim_profiling,
+    operation,
+    render_tree,
+    span,
+    stage,
+    start_trace,
+)
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +60,77 @@ bot = Bot(token=API_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware обновлений: открывает трассу на каждое обновление.
+
+    Обновления дольше TRACE_SLOW_MS логируются с деревом отрезков. Если администратор
+    включил профилирование (/profile), обновление профилируется, а после последнего
+    из заказанных отчёт отправляется файлом в чат администратора.
+    """
+
+    async def __call__(self, handler, event: types.Update, data: dict):
+        user = data.get("event_from_user")
+        profile = claim_profiling()
+        profiler = None
+        context = start_trace(
+            "update", update_id=event.update_id, user_id=user.id if user else None
+        )
+        try:
+            with context as trace:
+                if profile is not None:
+                    trace.profile_mode = profile.mode
+                    if profile.mode == "cpu":
+                        profiler = SamplingProfiler(threading.get_ident()).start()
+                return await handler(event, data)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            await self._finish(context.trace, profile, profiler, data["bot"])
+
+    @staticmethod
+    async def _finish(trace, profile, profiler, bot: Bot) -> None:
+        duration_ms = trace.root.duration * 1000
+        tree = render_tree(trace.root)
+        if duration_ms >= TRACE_SLOW_MS:
+            logger.warning(f"Медленное обновление ({duration_ms:.0f} мс):\n{tree}")
+        if profile is None:
+            return
+        report = [tree]
+        if profiler is not None:
+            report += ["", profiler.report()]
+        for name, lines in trace.es_profiles:
+            report += ["", f"ES profile ({name}):", *(f"  {line}" for line in lines)]
+        if profile.add_report("\n".join(report)):
+            await bot.send_document(
+                profile.chat_id,
+                BufferedInputFile(profile.render().encode("utf-8"), filename="profile.txt"),
+                caption=f"Профилирование ({profile.mode}): {profile.count} запросов"
+            )
+
+
+class HandlerSpanMiddleware(BaseMiddleware):
+    """Внутренний middleware сообщений: отрезок трассы с именем обработчика."""
+
+    async def __call__(self, handler, event: Message, data: dict):
+        with span(data["handler"].callback.__name__):
+            return await handler(event, data)
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot API: отрезок трассы на каждый исходящий вызов."""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        with span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+
+dp.update.outer_middleware(TracingMiddleware())
+dp.message.middleware(HandlerSpanMiddleware())
+dp.inline_query.middleware(HandlerSpanMiddleware())
+bot.session.middleware(TelegramTracingMiddleware())
+
 class MemeStates(StatesGroup):
     """
     Класс состояний конечного автомата (FSM) для управления этапами диалога с пользователем:
@@ -44,7 +152,8 @@ async def send_meme_with_description(chat_id: int, meme_data: tuple) -> bool:
         chat_id (int): Идентификатор чата Telegram, куда отправлять мем.
         meme_data (tuple): Кортеж из четырёх элементов:
             - meme_id (int): id мема в базе (не используется напрямую)
-            - image (str): ссылка на изображение мема (URL)
+            - image (str): ключ объекта в хранилище или ссылка на изображение мема (URL);
+              из базы приходит облегчённая копия (rendition), если она есть
             - name (str): название мема (отправляется в подписи к фото)
             - description (str): текстовое описание мема (отправляется отдельным сообщением)
 
@@ -53,25 +162,69 @@ async def send_meme_with_description(chat_id: int, meme_data: tuple) -> bool:
               False — если при отправке возникла ошибка (например, невалидная ссылка).
 
     Функция нужна для компактной и единой логики отправки мемов, чтобы не дублировать код по всему проекту.
+    Ключ объекта превращается в действующую presigned-ссылку в момент отправки (s3_storage).
+    Если Telegram не смог скачать картинку по ссылке, она отправляется файлом из локального кеша.
+    file_id отправленного фото запоминается для инлайн-ответов, результат отправки
+    записывается в журнал событий (event_log).
     """
     meme_id, image, name, description = meme_data
+    result = "ok"
     try:
-        await bot.send_photo(
-            chat_id=chat_id,
-            photo=image,
-            caption=name[:1000]
-        )
-        if description:
-            await bot.send_message(
-                chat_id=chat_id,
-                text=f"Описание: {description[:1000]}",
-                parse_mode='HTML'
-            )
+        with stage("telegram_send", meme_id=meme_id):
+            photo_url = get_url_resolver().resolve(image)
+            try:
+                sent = await bot.send_photo(
+                    chat_id=chat_id,
+                    photo=photo_url,
+                    caption=name[:1000]
+                )
+            except TelegramBadRequest:
+                if not photo_url.startswith('http'):
+                    raise
+                result = "fallback"
+                data = await get_image_cache().aget(photo_url)
+                sent = await bot.send_photo(
+                    chat_id=chat_id,
+                    photo=BufferedInputFile(data, filename=f"{meme_id}.jpg"),
+                    caption=name[:1000]
+                )
+            file_ids.remember(meme_id, sent)
+            if description:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=f"Описание: {description[:1000]}",
+                    parse_mode='HTML'
+                )
+        MEME_SENDS.labels(result).inc()
+        get_event_log().record("send", chat_id=chat_id, meme_id=meme_id, result=result)
         return True
     except Exception as e:
+        MEME_SENDS.labels("failed").inc()
+        SEND_FAILURES.labels(type(e).__name__).inc()
+        get_event_log().record("send", chat_id=chat_id, meme_id=meme_id, result="failed",
+                               error=type(e).__name__)
         logger.error(f"Ошибка отправки мема {meme_id}: {e}")
         return False
 
+def load_memes(meme_ids: list) -> list:
+    """
+    Загружает из SQLite данные мемов для отправки.
+
+    Args:
+        meme_ids (list): id мемов.
+
+    Returns:
+        list: Кортежи (id, картинка — облегчённая копия или оригинал, name, description).
+    """
+    with stage("sqlite_rehydrate", ids=len(meme_ids)), sqlite3.connect('memes.db') as conn:
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(meme_ids))
+        cursor.execute(f"""
+            SELECT id, COALESCE(rendition, image), name, description FROM memes 
+            WHERE id IN ({placeholders})
+        """, meme_ids)
+        return cursor.fetchall()
+
 async def send_meme_by_id(chat_id: int, meme_id: int):
     """
     Находит и отправляет мем по его номеру из базы, с автоматической коррекцией некорректных номеров.
@@ -87,6 +240,7 @@ async def send_meme_by_id(chat_id: int, meme_id: int):
         1. Корректирует meme_id, чтобы он всегда был от 1 до 1122 (если пользователь ввёл 0 или слишком большое число).
         2. Ищет мем с этим id в базе данных SQLite ('memes.db').
         3. Если мем найден — вызывает send_meme_with_description, иначе пишет пользователю "Мем не найден!".
+        4. Записывает запрос в журнал событий (event_log).
 
     Эта функция нужна для удобной выдачи мемов по номеру и обработки ошибок пользователя.
     """
@@ -94,10 +248,12 @@ async def send_meme_by_id(chat_id: int, meme_id: int):
     with sqlite3.connect('memes.db') as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT id, image, name, description FROM memes WHERE id = ?",
+            "SELECT id, COALESCE(rendition, image), name, description FROM memes WHERE id = ?",
             (actual_id,)
         )
         meme = cursor.fetchone()
+    get_event_log().record("lookup", chat_id=chat_id, meme_id=actual_id,
+                           result="found" if meme else "not_found", requested=meme_id)
     if meme:
         await send_meme_with_description(chat_id, meme)
     else:
@@ -218,6 +374,64 @@ async def cmd_help(message: types.Message, state: FSMContext):
     await message.answer(Texts.help_message, parse_mode='HTML')
     await ask_for_action(message, state)
 
+@dp.message(Command("tags"))
+async def cmd_tags(message: types.Message, command: CommandObject):
+    """
+    Обрабатывает команду /tags [начало тега].
+    Подсказывает самые частые теги, начинающиеся с введённого текста
+    (без аргумента — самые частые теги вообще). Ответ строится по индексу
+    тегов в памяти, без запроса к Elasticsearch.
+
+    Args:
+        message (types.Message): Сообщение с командой.
+        command (CommandObject): Разобранная команда с аргументами.
+
+    Returns:
+        None
+    """
+    with stage("tag_index"):
+        suggestions = get_tag_index().complete(command.args or "")
+    if not suggestions:
+        await message.answer(Texts.no_tags_found)
+        return
+    await message.answer(
+        Texts.tags_found.format("\n".join(f"{tag} ({count})" for tag, count in suggestions))
+    )
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: types.Message, command: CommandObject):
+    """
+    Обрабатывает команду администратора /profile [N] [cpu|es].
+    Включает профилирование следующих N запросов (по умолчанию 5):
+    cpu — сэмплирующий профилировщик стека, es — profile: true в запросах Elasticsearch.
+    Отчёт (дерево отрезков и профиль каждого запроса) приходит файлом в этот чат.
+
+    Args:
+        message (types.Message): Сообщение с командой.
+        command (CommandObject): Разобранная команда с аргументами.
+
+    Returns:
+        None
+    """
+    if message.from_user is None or message.from_user.id not in ADMIN_IDS:
+        await message.answer(Texts.admin_only)
+        return
+    count, mode = 5, "cpu"
+    for arg in (command.args or "").split():
+        if arg.isdigit():
+            count = int(arg)
+        elif arg in PROFILE_MODES:
+            mode = arg
+        else:
+            await message.answer(Texts.profile_usage)
+            return
+    try:
+        arm_profiling(mode, count, message.chat.id)
+    except ValueError:
+        await message.answer(Texts.profile_usage)
+        return
+    await message.answer(Texts.profile_armed.format(mode, count))
+
 async def ask_for_action(message: types.Message, state: FSMContext):
     """
     Отправляет пользователю меню дальнейших действий после показа мемов.
@@ -229,10 +443,12 @@ async def ask_for_action(message: types.Message, state: FSMContext):
     Returns:
         None
 
-    Меню даёт кнопки: "Показать ещё", "Новая тема", "Завершить поиск". Используется во всех ключевых точках сценария.
+    Меню даёт кнопки: "Показать ещё", "Похожие", "Новая тема", "Завершить поиск".
+    Используется во всех ключевых точках сценария.
     """
     builder = ReplyKeyboardBuilder()
     builder.button(text=Texts.more_memes)
+    builder.button(text=Texts.similar_memes)
     builder.button(text=Texts.new_theme)
     builder.button(text=Texts.end_search)
     await message.answer(
@@ -270,6 +486,7 @@ async def process_topic(message: types.Message, state: FSMContext):
     await state.set_state(MemeStates.waiting_for_count)
 
 @dp.message(MemeStates.waiting_for_count)
+@operation("process_count")
 async def process_count(message: types.Message, state: FSMContext):
     """
     Обрабатывает ввод количества мемов по выбранной теме.
@@ -284,14 +501,20 @@ async def process_count(message: types.Message, state: FSMContext):
 
     Детали:
         - Если введено не число, число < 1, либо > 20 — просит ввести корректное число.
-        - Запускает гибридный поиск (сначала text, потом knn) по теме.
+        - Если тема — известный тег (или несколько тегов через запятую), мемы берутся
+          из индекса тегов без Elasticsearch.
+        - Иначе запускает гибридный поиск (сначала text, потом knn) по теме в пуле потоков
+          через общий SearchService (кеш результатов и эмбеддингов запросов; одинаковые
+          одновременные темы ищутся один раз).
         - Находит реальные мемы в базе и фильтрует уже показанные пользователю.
+        - Записывает тему и число найденных мемов в журнал событий (event_log).
         - Если ничего не найдено — уведомляет пользователя.
         - Если мемов меньше, чем просили — показывает сколько удалось найти.
         - После отправки мемов — предлагает дальнейшие действия.
 
     Использует: 
-        - es_manager.search_with_hybrid
+        - get_tag_index().match_query
+        - get_search_service().ahybrid
         - shown_memes — чтобы не повторять уже показанные пользователю мемы.
     """
     try:
@@ -309,25 +532,21 @@ async def process_count(message: types.Message, state: FSMContext):
     user_data = await state.get_data()
     topic = user_data['topic']
 
-    es_manager = ElasticsearchManager()
-
-    search_results = es_manager.search_with_hybrid(topic, k=100, alpha=0.5)
+    with stage("tag_index"):
+        tag_ids = get_tag_index().match_query(topic)
+    if tag_ids is not None:
+        TAG_QUERIES.labels("hit").inc()
+        source = "tags"
+        meme_ids = random.sample(tag_ids, min(len(tag_ids), 100))
+    else:
+        source = "es"
+        TAG_QUERIES.labels("miss").inc()
+        meme_ids = await get_search_service().ahybrid(topic, 100, 0.5)
 
-    meme_ids = [int(r['id']) for r in search_results]
-
-    if not meme_ids:
-        await message.answer(Texts.no_memes_found)
-        await state.set_state(MemeStates.waiting_for_topic)
-        return
-    
-    with sqlite3.connect('memes.db') as conn:
-        cursor = conn.cursor()
-        placeholders = ','.join(['?'] * len(meme_ids))
-        cursor.execute(f"""
-            SELECT id, image, name, description FROM memes 
-            WHERE id IN ({placeholders})
-        """, meme_ids)
-        all_matching_memes = cursor.fetchall()
+    all_matching_memes = load_memes(meme_ids) if meme_ids else []
+    get_event_log().record("search", chat_id=message.chat.id, query=topic,
+                           results=len(all_matching_memes), result=source,
+                           requested=requested_count)
 
     if not all_matching_memes:
         await message.answer(Texts.no_memes_found)
@@ -351,11 +570,12 @@ async def process_count(message: types.Message, state: FSMContext):
     shown_memes.extend([m[0] for m in selected_memes])
     await state.update_data(shown_memes=shown_memes)
 
-    sent_count = 0
+    sent_ids = []
     for meme in selected_memes:
         success = await send_meme_with_description(message.chat.id, meme)
         if success:
-            sent_count += 1
+            sent_ids.append(meme[0])
+    sent_count = len(sent_ids)
 
     if sent_count < requested_count:
         if sent_count == 0:
@@ -371,10 +591,49 @@ async def process_count(message: types.Message, state: FSMContext):
     await state.update_data(
         last_topic=topic,
         last_count=sent_count,
+        last_sent=sent_ids,
         total_memes=len(all_matching_memes)
     )
     await ask_for_action(message, state)
 
+async def send_similar_memes(message: types.Message, state: FSMContext):
+    """
+    Отправляет мемы, похожие на последние показанные.
+
+    Args:
+        message (types.Message): Сообщение пользователя (кнопка "Похожие").
+        state (FSMContext): Контекст состояния FSM пользователя.
+
+    Returns:
+        None
+
+    Соседи берутся из заранее посчитанного графа (neighbor_graph.py) обращением
+    к словарю в памяти, без запроса к Elasticsearch. Уже показанные мемы
+    пропускаются; отправленные становятся опорой для следующего нажатия.
+    """
+    user_data = await state.get_data()
+    shown_memes = user_data.get('shown_memes', [])
+    with stage("neighbors"):
+        similar_ids = get_neighbor_graph().similar(
+            user_data.get('last_sent', []), exclude=shown_memes, limit=SIMILAR_COUNT
+        )
+    memes = {m[0]: m for m in load_memes(similar_ids)} if similar_ids else {}
+    if not memes:
+        await message.answer(Texts.no_similar_memes)
+        await ask_for_action(message, state)
+        return
+
+    sent_ids = []
+    for meme_id in similar_ids:
+        if meme_id in memes and await send_meme_with_description(message.chat.id, memes[meme_id]):
+            sent_ids.append(meme_id)
+    await state.update_data(
+        shown_memes=shown_memes + [meme_id for meme_id in similar_ids if meme_id in memes],
+        last_sent=sent_ids or user_data.get('last_sent', []),
+    )
+    await message.answer(Texts.memes_found.format(len(sent_ids)))
+    await ask_for_action(message, state)
+
 @dp.message(MemeStates.waiting_for_action)
 async def process_action(message: types.Message, state: FSMContext):
     """
@@ -389,6 +648,7 @@ async def process_action(message: types.Message, state: FSMContext):
 
     Логика:
         - "Показать ещё" — считает уже просмотренные мемы и предлагает ввести число для показа новых.
+        - "Похожие" — отправляет соседей последних показанных мемов из графа похожих мемов.
         - "Новая тема" или "Поиск по теме" — сбрасывает просмотренные мемы, запрашивает новую тему.
         - "Завершить поиск" — завершает сессию поиска, сбрасывает состояние.
         - Любой другой ввод — просит воспользоваться кнопками.
@@ -409,6 +669,9 @@ async def process_action(message: types.Message, state: FSMContext):
         )
         await state.set_state(MemeStates.waiting_for_count)
 
+    elif message.text == Texts.similar_memes:
+        await send_similar_memes(message, state)
+
     elif message.text in [Texts.new_theme, Texts.start_search]:
         await state.update_data(shown_memes=[])
         await message.answer(Texts.enter_topic, reply_markup=ReplyKeyboardRemove())
@@ -420,10 +683,119 @@ async def process_action(message: types.Message, state: FSMContext):
     else:
         await message.answer(Texts.use_buttons)
 
+def search_inline_memes(query: str) -> list:
+    """
+    Поиск для инлайн-режима (выполняется в пуле потоков SearchService).
+
+    Запрос из известных тегов решается индексом тегов, остальные — одним
+    поиском SearchService.search (текст, при пустом результате — KNN).
+
+    Args:
+        query (str): Нормализованный запрос.
+
+    Returns:
+        list: id мемов, не больше INLINE_RESULTS.
+    """
+    if not query:
+        return []
+    tag_ids = get_tag_index().match_query(query)
+    if tag_ids is not None:
+        TAG_QUERIES.labels("hit").inc()
+        return random.sample(tag_ids, min(len(tag_ids), INLINE_RESULTS))
+    TAG_QUERIES.labels("miss").inc()
+    return get_search_service().search(query, k=INLINE_RESULTS)
+
+
+def build_inline_results(memes: list) -> list:
+    """
+    Превращает мемы в результаты инлайн-ответа.
+
+    Мем, который бот уже отправлял, отдаётся по file_id (Telegram не скачивает
+    картинку заново), остальные — по ссылке на облегчённую копию или оригинал.
+    Мемы без картинки пропускаются.
+
+    Args:
+        memes (list): Кортежи (id, картинка, name, description) в порядке выдачи.
+
+    Returns:
+        list: InlineQueryResultCachedPhoto / InlineQueryResultPhoto.
+    """
+    results = []
+    for meme_id, image, name, _ in memes:
+        file_id = file_ids.get(meme_id)
+        if file_id:
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(meme_id), photo_file_id=file_id, caption=name[:1000]
+            ))
+            continue
+        url = get_url_resolver().resolve(image) if image else None
+        if url and url.startswith('http'):
+            results.append(InlineQueryResultPhoto(
+                id=str(meme_id), photo_url=url, thumbnail_url=url,
+                title=name, caption=name[:1000]
+            ))
+    return results
+
+
+@dp.inline_query()
+@operation("inline_query")
+async def inline_query_handler(inline_query: types.InlineQuery):
+    """
+    Отвечает на инлайн-запрос (@bot запрос) фотографиями мемов.
+
+    Args:
+        inline_query (types.InlineQuery): Инлайн-запрос пользователя.
+
+    Returns:
+        None
+
+    Запросы приходят на каждое нажатие клавиши: ответы кешируются по префиксам,
+    устаревшие запросы пользователя не ищутся (inline_search.InlineSearch),
+    а поиск ограничен бюджетом INLINE_BUDGET_MS. Полный ответ Telegram кеширует
+    на INLINE_CACHE_TIME секунд, неполный (результаты более короткого префикса) —
+    на секунду, чтобы следующий запрос получил уже найденные мемы.
+    """
+    answer = await get_inline_search(search_inline_memes, get_search_service().executor).resolve(
+        inline_query.from_user.id, inline_query.query
+    )
+    if answer is None:
+        return
+    meme_ids, complete = answer
+    memes = {m[0]: m for m in load_memes(list(meme_ids))} if meme_ids else {}
+    results = build_inline_results([memes[i] for i in meme_ids if i in memes])
+    await inline_query.answer(
+        results, cache_time=INLINE_CACHE_TIME if complete else 1, is_personal=False
+    )
+
+async def warm_up_search_cache() -> None:
+    """
+    Прогревает кеши поиска популярными темами из журнала событий (или WARMUP_QUERIES_FILE).
+
+    Темы, которые решаются индексом тегов, пропускаются: им Elasticsearch не нужен.
+    По окончании SearchService.ready выставляется, и /ready начинает отвечать 200.
+    """
+    try:
+        queries = await asyncio.to_thread(hot_queries)
+    except Exception as e:
+        logger.error(f"Не удалось прочитать популярные темы: {e}")
+        queries = []
+    queries = [q for q in queries if get_tag_index().match_query(q) is None]
+    stats = await get_search_service().warm_up(queries)
+    logger.info(f"Прогрев кешей поиска: {stats['queries']} тем, ошибок {stats['failed']}, "
+                f"{stats['seconds']} с")
+
+
 async def main():    
     """
     Основная асинхронная функция запуска Telegram-бота.
-    В начале инициализирует Elasticsearch и индекс мемов.
+    В начале создаёт индекс мемов в Elasticsearch (до синхронизации, чтобы векторные поля
+    получили явный mapping) и заливает в него данные из SQLite.
+    Если задан METRICS_PORT, поднимает эндпоинт /metrics в формате Prometheus.
+    Добавляет в базу недостающие колонки (облегчённые копии картинок — rendition),
+    загружает граф похожих мемов и индекс тегов и запускает фоновое обновление
+    presigned-ссылок на картинки и запись журнала событий (остаток буфера
+    сбрасывается при остановке).
+    Кеши поиска прогреваются популярными темами в фоне, не задерживая старт приёма сообщений.
     Далее запускает цикл приёма и обработки входящих сообщений через long polling.
 
     Args:
@@ -435,13 +807,32 @@ async def main():
     Эта функция служит точкой входа для всего приложения.
     """
     logger.info("Инициализация зависимостей...")
-    es_manager = ElasticsearchManager()
-    
-    es_manager.sync_db_to_elasticsearch()
+    with sqlite3.connect('memes.db') as conn:
+        ensure_schema(conn)
+    logger.info(f"Граф похожих мемов: {len(get_neighbor_graph())} мемов")
+    logger.info(f"Индекс тегов: {len(get_tag_index())} тегов")
+    es_manager = get_search_service().manager
+
     es_manager.initialize_elasticsearch()
+    es_manager.sync_db_to_elasticsearch()
+    if METRICS_PORT:
+        await start_metrics_server()
+        logger.info(f"Метрики Prometheus: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    # Ссылки на фоновые задачи хранятся: цикл событий держит задачи только слабыми ссылками
+    background = [
+        asyncio.create_task(get_url_resolver().run_refresher()),
+        asyncio.create_task(warm_up_search_cache()),
+    ]
+    event_flusher = asyncio.create_task(get_event_log().run_flusher())
     logger.info("Инициализация завершена. Запуск бота...")
 
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in background:
+            task.cancel()
+        event_flusher.cancel()
+        get_event_log().flush()
 
 if __name__ == '__main__':
     import asyncio
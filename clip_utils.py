@@ -0,0 +1,122 @@
+import threading
+from functools import lru_cache
+
+from config import CLIP_INFERENCE_MODE, CLIP_TEXT_CACHE_SIZE, TORCH_THREADS
+from metrics import register_cache
+
+MODEL_NAME = "ViT-B-32"
+PRETRAINED = "laion2b_s34b_b79k"
+CLIP_DIM = 512
+
+# Режимы инференса на CPU:
+#   fp32        — исходная модель в eager-режиме;
+#   int8        — динамическая int8-квантизация всех nn.Linear;
+#   traced      — граф, полученный torch.jit.trace и замороженный torch.jit.freeze;
+#   int8-traced — квантизация + трассировка.
+# Сравнить скорость и совпадение векторов с fp32 можно через benchmark_clip.py.
+INFERENCE_MODES = ("fp32", "int8", "traced", "int8-traced")
+
+_models = {}
+_load_lock = threading.Lock()
+
+
+def _quantize(model):
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _trace(model, tokenizer):
+    """
+    Трассирует encode_image и encode_text в один ScriptModule.
+
+    Пример для трассировки берётся с батчем 2, чтобы размер батча
+    остался в графе переменным.
+    """
+    import torch
+
+    image_size = model.visual.image_size
+    if isinstance(image_size, int):
+        image_size = (image_size, image_size)
+    example_image = torch.zeros(2, 3, *image_size)
+    example_text = tokenizer(["", ""])
+    with torch.no_grad():
+        traced = torch.jit.trace_module(
+            model, {"encode_image": example_image, "encode_text": example_text}
+        )
+    return torch.jit.freeze(traced, preserved_attrs=["encode_image", "encode_text"])
+
+
+def load_clip(mode: str | None = None):
+    """
+    Лениво загружает модель OpenCLIP в нужном режиме инференса (один раз на процесс и режим).
+
+    torch и open_clip импортируются только здесь, поэтому модули, которые
+    лишь ссылаются на clip_utils (бот, ElasticsearchManager), не требуют их
+    установки, пока CLIP-поиск не используется.
+
+    Args:
+        mode (str | None): Один из INFERENCE_MODES; по умолчанию CLIP_INFERENCE_MODE.
+
+    Returns:
+        tuple: (model, preprocess, tokenizer). У model есть методы encode_image и encode_text.
+
+    Raises:
+        ValueError: Неизвестный режим инференса.
+    """
+    mode = mode or CLIP_INFERENCE_MODE
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Неизвестный режим инференса CLIP: {mode}")
+    if mode not in _models:
+        with _load_lock:
+            if mode not in _models:
+                import torch
+                import open_clip
+
+                torch.set_num_threads(TORCH_THREADS)
+                model, _, preprocess = open_clip.create_model_and_transforms(
+                    model_name=MODEL_NAME,
+                    pretrained=PRETRAINED
+                )
+                model.eval()
+                tokenizer = open_clip.get_tokenizer(MODEL_NAME)
+                if mode.startswith("int8"):
+                    model = _quantize(model)
+                if mode.endswith("traced"):
+                    model = _trace(model, tokenizer)
+                _models[mode] = (model, preprocess, tokenizer)
+    return _models[mode]
+
+
+@lru_cache(maxsize=CLIP_TEXT_CACHE_SIZE)
+def _encode_text_cached(text: str) -> tuple:
+    import torch
+
+    model, _, tokenizer = load_clip()
+    with torch.inference_mode():
+        features = model.encode_text(tokenizer([text]))
+        features = features / features.norm(dim=-1, keepdim=True)
+    return tuple(features[0].tolist())
+
+
+def encode_text(text: str) -> list:
+    """
+    Кодирует текст запроса текстовым энкодером CLIP на CPU.
+
+    Результаты кешируются (LRU на CLIP_TEXT_CACHE_SIZE запросов), повторные запросы
+    не запускают модель.
+
+    Args:
+        text (str): Текст запроса.
+
+    Returns:
+        list: Нормированный вектор длины CLIP_DIM.
+    """
+    return list(_encode_text_cached(" ".join(text.lower().split())))
+
+
+register_cache(
+    "clip_text",
+    lambda: {"hit": _encode_text_cached.cache_info().hits,
+             "miss": _encode_text_cached.cache_info().misses},
+)
@@ -19,6 +19,7 @@ class Texts:
 /start - начать новый поиск
 /help - помощь по боту
 /random_meme - случайный мем по числу
+/tags - популярные теги (можно указать начало тега)
 
 🎲 <b>Быстрые действия:</b>
 1. "🔍 Начать поиск" для поиска по теме
@@ -44,6 +45,7 @@ class Texts:
 """
 
     more_memes = "🔍 Ещё мемы"
+    similar_memes = "🧩 Похожие"
     new_theme = "🔄 Новая тема"
     end_search = "❌ Закончить"
     start_search = "🔍 Начать поиск"
@@ -54,14 +56,105 @@ class Texts:
     memes_found = "Мемов найдено: {}"
     no_memes_found = "По вашему запросу ничего не найдено, пожалуйста, выберите другую тему"
     all_memes_viewed = "Вы уже просмотрели все мемы по этой теме. Начните новый поиск."
+    no_similar_memes = "Похожих мемов больше нет. Попробуйте другую тему."
+    tags_found = "Теги (число мемов):\n{}\n\nТег можно ввести как тему поиска."
+    no_tags_found = "Таких тегов нет"
     search_completed = "Поиск завершён. Напишите /start для нового поиска."
     max_memes_limit = "Установлено максимальное значение - 20 мемов"
     positive_number = "Число должно быть положительным"
     enter_number = "Пожалуйста, введите число"
     use_buttons = "Пожалуйста, используйте кнопки для выбора действия"
     enter_number_for_meme = "Введите число: "
+    admin_only = "Команда доступна только администраторам"
+    profile_usage = "Использование: /profile [N] [cpu|es]"
+    profile_armed = "Профилирование ({}) следующих {} запросов включено, отчёт придёт в этот чат."
 
 
 ES_HOST = os.getenv("ES_HOST", "localhost")
 ES_PORT = int(os.getenv("ES_PORT", 9200))
 ES_INDEX = os.getenv("ES_INDEX", "first_index")
+# Общий дисковый кеш картинок (image_cache.py): каталог, потолок размера в мегабайтах
+# и сколько секунд запись считается свежей без обращения к серверу
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", ".image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", 2048)) * 1024 * 1024
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", 24 * 3600))
+# Потоков torch для CLIP на CPU (clip_utils.py); 0 — по числу ядер
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", 0)) or os.cpu_count() or 1
+# Сколько текстовых запросов CLIP держать в LRU-кеше эмбеддингов
+CLIP_TEXT_CACHE_SIZE = int(os.getenv("CLIP_TEXT_CACHE_SIZE", 4096))
+# Режим инференса CLIP на CPU: fp32, int8, traced или int8-traced (см. clip_utils.INFERENCE_MODES)
+CLIP_INFERENCE_MODE = os.getenv("CLIP_INFERENCE_MODE", "fp32")
+# Провайдер эмбеддингов (embedding_providers.py): "openai" — эмбеддинги описаний через API,
+# "clip" — локальный CLIP по картинкам, "hashing" — детерминированный офлайн-провайдер
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+# Эндпоинт метрик Prometheus (metrics.py) в процессе бота; METRICS_PORT=0 отключает его
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+# Обновления дольше TRACE_SLOW_MS логируются с деревом отрезков трассы (tracing.py)
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", 1000))
+# Telegram id администраторов через запятую: им доступна команда /profile
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+# Объектное хранилище S3 (MinIO-совместимое) с картинками мемов
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "s3.ru1.storage.beget.cloud")
+S3_BUCKET = os.getenv("S3_BUCKET", "25e18a90d3c1-memes-base")
+# Регион задаётся явно: иначе клиент узнаёт его сетевым запросом перед первой подписью
+S3_REGION = os.getenv("S3_REGION", "ru-1")
+S3_SECURE = os.getenv("S3_SECURE", "1") != "0"
+# Срок жизни presigned-ссылок на картинки и запас до истечения, когда ссылка переподписывается
+PRESIGN_TTL = int(os.getenv("PRESIGN_TTL", 24 * 3600))
+PRESIGN_REFRESH_MARGIN = int(os.getenv("PRESIGN_REFRESH_MARGIN", 3600))
+# Облегчённые копии картинок для Telegram (make_renditions.py): формат JPEG или WEBP,
+# длинная сторона, начальное качество и потолок размера файла
+RENDITION_FORMAT = os.getenv("RENDITION_FORMAT", "JPEG").upper()
+RENDITION_MAX_SIDE = int(os.getenv("RENDITION_MAX_SIDE", 1280))
+RENDITION_QUALITY = int(os.getenv("RENDITION_QUALITY", 85))
+RENDITION_MAX_BYTES = int(os.getenv("RENDITION_MAX_BYTES", 512 * 1024))
+# Граф похожих мемов (neighbor_graph.py): соседей на мем и сколько похожих показывать за раз
+NEIGHBORS_K = int(os.getenv("NEIGHBORS_K", 20))
+SIMILAR_COUNT = int(os.getenv("SIMILAR_COUNT", 5))
+# Инлайн-режим (@bot запрос, inline_search.py): результатов в ответе, cache_time ответа
+# в Telegram, пауза на дребезг набора и бюджет задержки ответа, кеш результатов по префиксам
+INLINE_RESULTS = int(os.getenv("INLINE_RESULTS", 20))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 300))
+INLINE_DEBOUNCE_MS = float(os.getenv("INLINE_DEBOUNCE_MS", 250))
+INLINE_BUDGET_MS = float(os.getenv("INLINE_BUDGET_MS", 800))
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", 4096))
+INLINE_CACHE_TTL = int(os.getenv("INLINE_CACHE_TTL", 600))
+# Журнал действий пользователей (event_log.py): хранилище "sqlite", "jsonl" или "off",
+# файл базы или каталог JSONL, размер буфера в памяти, пачка записи, период сброса
+# и размер JSONL-файла, после которого он ротируется
+EVENT_LOG_SINK = os.getenv("EVENT_LOG_SINK", "sqlite")
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH") or None
+EVENT_LOG_CAPACITY = int(os.getenv("EVENT_LOG_CAPACITY", 10000))
+EVENT_LOG_BATCH = int(os.getenv("EVENT_LOG_BATCH", 500))
+EVENT_LOG_FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", 2))
+EVENT_LOG_ROTATE_BYTES = int(os.getenv("EVENT_LOG_ROTATE_BYTES", 64 * 1024 * 1024))
+# Кеши поиска (search_service.py): результаты поиска по теме и эмбеддинги запросов
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 900))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 24 * 3600))
+# Прогрев кешей при старте: сколько популярных тем из журнала событий за WARMUP_DAYS
+# (или из файла WARMUP_QUERIES_FILE, по теме в строке) и сколько поисков одновременно
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", 50))
+WARMUP_DAYS = float(os.getenv("WARMUP_DAYS", 7))
+WARMUP_QUERIES_FILE = os.getenv("WARMUP_QUERIES_FILE") or None
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 4))
+# Бюджет задержки гибридного поиска, после которого возвращаются частичные результаты;
+# через сколько мс без ответа ES отправляется дублирующий запрос (0 — не отправлять);
+# потоков для этапов поиска
+SEARCH_BUDGET_MS = float(os.getenv("SEARCH_BUDGET_MS", 2500))
+SEARCH_HEDGE_MS = float(os.getenv("SEARCH_HEDGE_MS", 300))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", 16))
+# Предохранители зависимостей (resilience.py): ошибок подряд до размыкания
+# и пауза до пробного вызова, секунды
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+# Микробатчинг поисковых запросов в Elasticsearch одним _msearch (micro_batch.py):
+# окно сбора попутных запросов (0 — каждый запрос отдельно) и наибольшая пачка
+ES_MSEARCH_WINDOW_MS = float(os.getenv("ES_MSEARCH_WINDOW_MS", 3))
+ES_MSEARCH_MAX_BATCH = int(os.getenv("ES_MSEARCH_MAX_BATCH", 32))
+# Микробатчинг эмбеддингов запросов к OpenAI: окно сбора текстов одновременных поисков
+# (0 — каждый текст отдельным запросом) и наибольшее число текстов в одном запросе
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", 5))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", 64))
@@ -4,3 +4,6 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Позволяет направить клиент на локальную заглушку (embedding_stub_server.py) или прокси
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
@@ -0,0 +1,411 @@
+"""
+Асинхронный краулер memepedia.ru: замена последовательному parsing.py.
+
+Страницы списков и статей загружаются через один пул соединений aiohttp
+с ограничением числа одновременных запросов и паузой между запросами к
+одному хосту. Реестр URL → id (crawl_registry.json) хранит id, ETag,
+Last-Modified и последнюю запись каждой статьи, поэтому:
+  - id статьи не меняется между запусками;
+  - статьи запрашиваются условно (If-None-Match / If-Modified-Since),
+    и при ответе 304 страница не скачивается и не разбирается заново;
+  - выходной файл пересобирается целиком из реестра.
+
+Скачанные статьи сохраняются в архив сырого HTML (html_archive.py), и после
+правки селекторов в parsing.py записи можно пересобрать без сети:
+    python crawler.py --reparse --processes 4 --parser lxml
+
+Запуск из каталога data_base:
+    python crawler.py --pages 10
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from html_archive import HtmlArchive, read_entry
+from parsing import HTML_PARSER, extract_meme, extract_post_links, load_tags
+
+BASE_URL = "https://memepedia.ru/category/memes/pic/page/"
+OUTPUT_PATH = "memes_base.json"
+REGISTRY_PATH = "crawl_registry.json"
+ARCHIVE_DIR = "html_archive"
+TAGS_PATH = "tags_full.txt"
+INDEX_NAME = "first_index"
+
+CONCURRENCY = 8          # одновременных запросов
+HOST_INTERVAL = 0.25     # секунд между запросами к одному хосту
+REQUEST_TIMEOUT = 30     # секунд на запрос
+MAX_RETRIES = 3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USER_AGENT = "memes-bot-crawler/1.0"
+
+
+class HostRateLimiter:
+    """
+    Вежливое ограничение частоты: не чаще одного запроса в interval секунд на хост.
+    """
+
+    def __init__(self, interval: float = HOST_INTERVAL):
+        self.interval = interval
+        self._locks = {}
+        self._next_slot = {}
+
+    async def wait(self, host: str) -> None:
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_slot.get(host, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_slot[host] = loop.time() + self.interval
+
+
+class UrlRegistry:
+    """
+    Постоянный реестр статей: URL → {id, etag, last_modified, record}.
+
+    Новые URL получают следующий свободный id; удалённые со страниц статьи
+    остаются в реестре, чтобы их id не достался другой статье.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        self.urls = {}
+        self.next_id = 1
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.urls = data.get("urls", {})
+            self.next_id = data.get("next_id", 1)
+
+    def get_id(self, url: str) -> int:
+        """Возвращает id статьи, выдавая новый для ранее не встречавшегося URL."""
+        entry = self.urls.get(url)
+        if entry is None:
+            entry = self.urls[url] = {"id": self.next_id}
+            self.next_id += 1
+        return entry["id"]
+
+    def entry(self, url: str) -> dict:
+        return self.urls[url]
+
+    def records(self) -> list:
+        """Последние записи статей, упорядоченные по id."""
+        entries = sorted(self.urls.values(), key=lambda e: e["id"])
+        return [e["record"] for e in entries if "record" in e]
+
+    def save(self) -> None:
+        """Атомарно сохраняет реестр (через временный файл и os.replace)."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"next_id": self.next_id, "urls": self.urls}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def apply_meme(entry: dict, meme: dict, tags: dict, stats: dict) -> None:
+    """
+    Обновляет запись статьи в реестре по результату разбора и считает её в stats
+    (new, changed или unchanged).
+    """
+    record = {
+        "id": str(entry["id"]),
+        "name": meme["name"],
+        "images": meme["image"],
+        "description": meme["description"],
+        "tags": tags.get(entry["id"], '-'),
+    }
+    if "record" not in entry:
+        stats["new"] += 1
+    elif entry["record"] != record:
+        stats["changed"] += 1
+    else:
+        stats["unchanged"] += 1
+    entry["record"] = record
+
+
+class MemeCrawler:
+    """
+    Обходит страницы списков и статьи мемов с ограниченной конкурентностью.
+
+    Атрибуты:
+      - stats: fetched (скачано статей), not_modified (304), unchanged (200, но запись
+        не изменилась), new, changed, failed, list_pages.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, registry: UrlRegistry | None = None,
+                 tags: dict | None = None, concurrency: int = CONCURRENCY,
+                 host_interval: float = HOST_INTERVAL, archive: HtmlArchive | None = None,
+                 parser: str = HTML_PARSER):
+        self.base_url = base_url
+        self.archive = archive
+        self.parser = parser
+        self.registry = registry if registry is not None else UrlRegistry()
+        self.tags = tags or {}
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(host_interval)
+        self.stats = dict.fromkeys(
+            ("list_pages", "fetched", "not_modified", "unchanged", "new", "changed", "failed"), 0
+        )
+        self._semaphore = None
+        self._session = None
+
+    async def _fetch(self, url: str, headers: dict | None = None):
+        """
+        GET с повторами для 429/5xx и сетевых ошибок (4xx не повторяются).
+
+        Returns:
+            tuple: (status, text, headers ответа); text пуст для не-200.
+
+        Raises:
+            aiohttp.ClientError: Ответ 4xx/5xx или сетевая ошибка после MAX_RETRIES попыток.
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(1, MAX_RETRIES + 1):
+            delay = None
+            try:
+                async with self._semaphore:
+                    await self.limiter.wait(host)
+                    async with self._session.get(url, headers=headers or {}) as response:
+                        if response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                            retry_after = response.headers.get("Retry-After", "")
+                            delay = float(retry_after) if retry_after.isdigit() else None
+                        else:
+                            text = await response.text() if response.status == 200 else ""
+                            status, response_headers = response.status, response.headers
+                            break
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+            if delay is None:
+                delay = 2 ** attempt * random.uniform(0.5, 1)
+            await asyncio.sleep(delay)
+        if status >= 400:
+            raise aiohttp.ClientError(f"HTTP {status} для {url}")
+        return status, text, response_headers
+
+    async def _crawl_list_page(self, page: int) -> list:
+        url = f"{self.base_url}{page}"
+        try:
+            _, html, _ = await self._fetch(url)
+        except Exception as e:
+            print(f"[!] Не удалось загрузить страницу списка {url}: {e}")
+            return []
+        self.stats["list_pages"] += 1
+        return extract_post_links(html, self.parser)
+
+    async def _crawl_article(self, url: str) -> None:
+        entry = self.registry.entry(url)
+        headers = {}
+        # Страницу, которой нет в архиве, запрашиваем целиком, чтобы она туда попала
+        if "record" in entry and (self.archive is None or url in self.archive):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            status, html, response_headers = await self._fetch(url, headers)
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"[!] Не удалось загрузить {url}: {e}")
+            return
+        if status == 304:
+            self.stats["not_modified"] += 1
+            return
+
+        self.stats["fetched"] += 1
+        entry["etag"] = response_headers.get("ETag")
+        entry["last_modified"] = response_headers.get("Last-Modified")
+        if self.archive is not None:
+            self.archive.append(url, html, etag=entry["etag"])
+        # Разбор HTML — чистый CPU, не держим им event loop
+        meme = await asyncio.to_thread(extract_meme, html, self.parser)
+        apply_meme(entry, meme, self.tags, self.stats)
+
+    async def crawl(self, pages) -> dict:
+        """
+        Обходит страницы списков pages и все найденные на них статьи.
+
+        id новым статьям выдаются в порядке страниц и статей на странице
+        (как в parsing.py), независимо от порядка завершения запросов.
+
+        Args:
+            pages: Номера страниц списка (например, range(1, 11)).
+
+        Returns:
+            dict: Статистика обхода (см. stats).
+        """
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers={"User-Agent": USER_AGENT}
+        ) as session:
+            self._session = session
+            link_lists = await asyncio.gather(*(self._crawl_list_page(p) for p in pages))
+            urls, seen = [], set()
+            for links in link_lists:
+                for url in links:
+                    if url not in seen:
+                        seen.add(url)
+                        self.registry.get_id(url)
+                        urls.append(url)
+            await asyncio.gather(*(self._crawl_article(url) for url in urls))
+        self._session = None
+        return self.stats
+
+
+def _parse_archived(job: tuple) -> dict:
+    directory, entry, parser = job
+    return extract_meme(read_entry(directory, entry), parser)
+
+
+def reparse_archive(archive: HtmlArchive, registry: UrlRegistry, tags: dict | None = None,
+                    processes: int | None = None, parser: str = HTML_PARSER) -> dict:
+    """
+    Пересобирает записи реестра из архива сырого HTML, без сети.
+
+    Страницы распаковываются и разбираются в пуле процессов: разбор HTML
+    упирается в CPU, и потоки из-за GIL здесь не помогают.
+
+    Args:
+        archive (HtmlArchive): Архив страниц.
+        registry (UrlRegistry): Реестр статей; записи обновляются на месте.
+        tags (dict | None): Теги по id.
+        processes (int | None): Число процессов (None — по числу ядер, 1 — без пула).
+        parser (str): Бэкенд BeautifulSoup.
+
+    Returns:
+        dict: Статистика: reparsed, new, changed, unchanged, missing (нет в архиве).
+    """
+    urls = [url for url in registry.urls if url in archive]
+    jobs = [(archive.directory, archive.entry(url), parser) for url in urls]
+    stats = {"reparsed": len(urls), "new": 0, "changed": 0, "unchanged": 0,
+             "missing": len(registry.urls) - len(urls)}
+    if processes == 1:
+        memes = map(_parse_archived, jobs)
+    else:
+        workers = processes or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            memes = list(pool.map(_parse_archived, jobs,
+                                  chunksize=max(1, len(jobs) // (workers * 4))))
+    for url, meme in zip(urls, memes):
+        apply_meme(registry.entry(url), meme, tags or {}, stats)
+    return stats
+
+
+def write_bulk_file(records: list, path: str = OUTPUT_PATH, index: str = INDEX_NAME) -> None:
+    """
+    Атомарно записывает записи в bulk-формате Elasticsearch (заголовок + документ).
+
+    Args:
+        records (list): Записи мемов с полем id.
+        path (str): Выходной файл.
+        index (str): Имя индекса в заголовках.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            header = {"index": {"_index": index, "_id": int(record["id"])}}
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+async def main(pages: int = 10, base_url: str = BASE_URL, output_path: str = OUTPUT_PATH,
+               registry_path: str = REGISTRY_PATH, tags_path: str = TAGS_PATH,
+               concurrency: int = CONCURRENCY, host_interval: float = HOST_INTERVAL,
+               archive_dir: str = ARCHIVE_DIR, parser: str = HTML_PARSER) -> dict:
+    """
+    Полный цикл: обход, сохранение реестра и пересборка выходного файла.
+
+    Args:
+        archive_dir (str): Каталог архива сырого HTML; пустая строка — не сохранять.
+        parser (str): Бэкенд BeautifulSoup.
+
+    Returns:
+        dict: Статистика обхода.
+    """
+    registry = UrlRegistry(registry_path)
+    archive = HtmlArchive(archive_dir) if archive_dir else None
+    crawler = MemeCrawler(
+        base_url, registry, load_tags(tags_path), concurrency=concurrency,
+        host_interval=host_interval, archive=archive, parser=parser,
+    )
+    started = time.perf_counter()
+    try:
+        stats = await crawler.crawl(range(1, pages + 1))
+    finally:
+        if archive is not None:
+            archive.close()
+    registry.save()
+    write_bulk_file(registry.records(), output_path)
+    print(
+        f"[✓] Готово за {time.perf_counter() - started:.1f} с: новых {stats['new']}, "
+        f"изменённых {stats['changed']}, без изменений {stats['unchanged']}, "
+        f"304 {stats['not_modified']}, ошибок {stats['failed']}"
+    )
+    return stats
+
+
+def reparse_main(output_path: str = OUTPUT_PATH, registry_path: str = REGISTRY_PATH,
+                 tags_path: str = TAGS_PATH, archive_dir: str = ARCHIVE_DIR,
+                 processes: int | None = None, parser: str = HTML_PARSER) -> dict:
+    """
+    Режим --reparse: пересборка записей из архива и выходного файла без сети.
+
+    Returns:
+        dict: Статистика (см. reparse_archive).
+    """
+    registry = UrlRegistry(registry_path)
+    archive = HtmlArchive(archive_dir)
+    started = time.perf_counter()
+    stats = reparse_archive(archive, registry, load_tags(tags_path), processes, parser)
+    elapsed = time.perf_counter() - started
+    registry.save()
+    write_bulk_file(registry.records(), output_path)
+    print(
+        f"[✓] Пересобрано {stats['reparsed']} страниц за {elapsed:.1f} с "
+        f"({stats['reparsed'] / elapsed if elapsed else 0:.0f} стр/с): "
+        f"изменённых {stats['changed']}, без изменений {stats['unchanged']}, "
+        f"нет в архиве {stats['missing']}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Асинхронный сбор мемов с memepedia.ru")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--registry", default=REGISTRY_PATH)
+    parser.add_argument("--tags", default=TAGS_PATH)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--host-interval", type=float, default=HOST_INTERVAL,
+                        help="секунд между запросами к одному хосту")
+    parser.add_argument("--archive", default=ARCHIVE_DIR,
+                        help="каталог архива сырого HTML ('' — не сохранять)")
+    parser.add_argument("--parser", default=HTML_PARSER, help="html.parser или lxml")
+    parser.add_argument("--reparse", action="store_true",
+                        help="пересобрать записи из архива без сети")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="процессов для --reparse (по умолчанию по числу ядер)")
+    args = parser.parse_args()
+    if args.reparse:
+        reparse_main(
+            output_path=args.output, registry_path=args.registry, tags_path=args.tags,
+            archive_dir=args.archive, processes=args.processes, parser=args.parser,
+        )
+    else:
+        asyncio.run(main(
+            pages=args.pages, base_url=args.base_url, output_path=args.output,
+            registry_path=args.registry, tags_path=args.tags, concurrency=args.concurrency,
+            host_interval=args.host_interval, archive_dir=args.archive, parser=args.parser,
+        ))
@@ -0,0 +1,143 @@
+"""
+Локальный архив сырых HTML-страниц для повторного разбора без сети.
+
+Страницы сжимаются zlib и дописываются в конец файла-сегмента
+(segment-000001.seg, ...); при превышении MAX_SEGMENT_BYTES начинается
+новый сегмент. Индекс index.jsonl — тоже только дописываемый: строка на
+каждую сохранённую версию страницы (url, сегмент, смещение, длина, sha1).
+Актуальна последняя строка для URL. Данные пишутся раньше строки индекса,
+поэтому оборванная запись не попадает в индекс.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+
+INDEX_NAME = "index.jsonl"
+MAX_SEGMENT_BYTES = 256 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+
+def read_entry(directory: str, entry: dict) -> str:
+    """
+    Читает и распаковывает страницу по записи индекса.
+
+    Отдельная функция (а не метод), чтобы её можно было вызывать в дочерних
+    процессах, не передавая туда сам архив.
+
+    Args:
+        directory (str): Каталог архива.
+        entry (dict): Запись индекса (segment, offset, length).
+
+    Returns:
+        str: HTML страницы.
+    """
+    with open(os.path.join(directory, entry["segment"]), "rb") as f:
+        f.seek(entry["offset"])
+        data = f.read(entry["length"])
+    return zlib.decompress(data).decode("utf-8")
+
+
+class HtmlArchive:
+    """
+    Архив страниц: append() сохраняет новую версию, get() читает последнюю.
+
+    Повторное сохранение неизменившейся страницы (тот же sha1) ничего не пишет.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = MAX_SEGMENT_BYTES):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._latest = {}
+        self._segment = None
+        self._segment_file = None
+        self._load_index()
+
+    def _load_index(self) -> None:
+        index_path = os.path.join(self.directory, INDEX_NAME)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Оборванная последняя строка после сбоя — данные без индекса не нужны
+                    continue
+                self._latest[entry["url"]] = entry
+                if self._segment is None or entry["segment"] > self._segment:
+                    self._segment = entry["segment"]
+
+    def _new_segment(self) -> None:
+        if self._segment_file is not None:
+            self._segment_file.close()
+        existing = [n for n in os.listdir(self.directory) if n.endswith(".seg")]
+        self._segment = f"segment-{len(existing) + 1:06d}.seg"
+        self._segment_file = open(os.path.join(self.directory, self._segment), "ab")
+
+    def _writable_segment(self, size: int):
+        """Текущий сегмент, или новый, если запись size байт превысит лимит."""
+        if self._segment_file is None:
+            if self._segment is None:
+                self._new_segment()
+            else:
+                self._segment_file = open(os.path.join(self.directory, self._segment), "ab")
+        position = self._segment_file.tell()
+        if position and position + size > self.max_segment_bytes:
+            self._new_segment()
+        return self._segment_file
+
+    def append(self, url: str, html: str, **meta) -> dict:
+        """
+        Сохраняет страницу, если она отличается от последней сохранённой версии.
+
+        Args:
+            url (str): Адрес страницы.
+            html (str): Тело ответа.
+            **meta: Дополнительные поля записи индекса (etag, status, ...).
+
+        Returns:
+            dict: Запись индекса актуальной версии.
+        """
+        raw = html.encode("utf-8")
+        digest = hashlib.sha1(raw).hexdigest()
+        latest = self._latest.get(url)
+        if latest is not None and latest["sha1"] == digest:
+            return latest
+
+        data = zlib.compress(raw, COMPRESSION_LEVEL)
+        segment_file = self._writable_segment(len(data))
+        offset = segment_file.tell()
+        segment_file.write(data)
+        segment_file.flush()
+
+        entry = {
+            "url": url, "segment": self._segment, "offset": offset, "length": len(data),
+            "sha1": digest, "fetched_at": time.time(), **meta,
+        }
+        with open(os.path.join(self.directory, INDEX_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._latest[url] = entry
+        return entry
+
+    def entry(self, url: str) -> dict | None:
+        return self._latest.get(url)
+
+    def get(self, url: str) -> str | None:
+        """Последняя сохранённая версия страницы или None."""
+        entry = self._latest.get(url)
+        return read_entry(self.directory, entry) if entry is not None else None
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._latest
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def close(self) -> None:
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
@@ -5,7 +5,16 @@ import requests
 
 current_id = 0
 
-def load_tags() -> dict:
+# Бэкенд разбора HTML:
+#   "html.parser" — BeautifulSoup со встроенным парсером;
+#   "lxml"        — BeautifulSoup с парсером lxml;
+#   "lxml.html"   — lxml и XPath без BeautifulSoup, на порядок быстрее (нужен пакет lxml).
+HTML_PARSER = "html.parser"
+HTML_PARSERS = ("html.parser", "lxml", "lxml.html")
+ARTICLE_FIGURE_CLASS = "s-post-media-img post-thumbnail post-media-b"
+LIST_CONTAINER_CLASS = "bb-col col-content"
+
+def load_tags(path: str = "tags_full.txt") -> dict:
     """
     Загружает словарь тегов из файла tags_full.txt.
     Читает файл построчно, извлекает ID и соответствующие теги,
@@ -14,7 +23,7 @@ def load_tags() -> dict:
 
     tags_dict = {}
     try:
-        with open("tags_full.txt", "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             for line in f:
                 if ':' in line:
                     id_str, tags_line = line.strip().split(':', 1)
@@ -23,6 +32,115 @@ def load_tags() -> dict:
         print("Ошибка при загрузке тегов:", e)
     return tags_dict
 
+def _lxml_text(element) -> str:
+    # То же, что get_text(strip=True) в BeautifulSoup: обрезанные куски текста подряд
+    pieces = (piece.strip() for piece in element.xpath(".//text()[not(parent::script)]"))
+    return "".join(piece for piece in pieces if piece)
+
+def _lxml_document(html: str):
+    import lxml.html
+
+    if not html.strip():
+        return None
+    return lxml.html.fromstring(html)
+
+def _extract_meme_lxml(html: str) -> dict:
+    meme = {"name": '-', "description": '-', "image": '-'}
+    doc = _lxml_document(html)
+    if doc is None:
+        return meme
+
+    headline = doc.xpath('(//*[@itemprop="headline"])[1]')
+    if headline:
+        meme["name"] = _lxml_text(headline[0])
+
+    first_p = doc.xpath('(//*[@itemprop="articleBody"])[1]/descendant::p[1]')
+    if first_p:
+        meme["description"] = _lxml_text(first_p[0])
+
+    img = doc.xpath(f'(//figure[@class="{ARTICLE_FIGURE_CLASS}"])[1]/descendant::img[1]')
+    if img and img[0].get("src"):
+        meme["image"] = img[0].get("src")
+
+    return meme
+
+def _extract_post_links_lxml(html: str) -> list:
+    doc = _lxml_document(html)
+    if doc is None:
+        return []
+    container = doc.xpath(f'(//div[@class="{LIST_CONTAINER_CLASS}"])[1]')
+    if not container:
+        return []
+    links = []
+    posts = container[0].xpath(
+        './/article[contains(concat(" ", normalize-space(@class), " "), " post ")]'
+    )
+    for post in posts:
+        a_tag = post.xpath("descendant::a[@href][1]")
+        if a_tag:
+            links.append(a_tag[0].get("href"))
+    return links
+
+def extract_meme(html: str, parser: str = HTML_PARSER) -> dict:
+    """
+    Извлекает данные мема из HTML страницы статьи.
+
+    Args:
+        html (str): HTML страницы мема.
+        parser (str): Бэкенд разбора (см. HTML_PARSERS).
+
+    Returns:
+        dict: name, description, image; отсутствующие поля равны '-'.
+    """
+    if parser == "lxml.html":
+        return _extract_meme_lxml(html)
+
+    meme = {"name": '-', "description": '-', "image": '-'}
+    soup = bs(html, parser)
+
+    headline = soup.find(attrs={"itemprop": "headline"})
+    if headline:
+        meme["name"] = headline.get_text(strip=True)
+
+    article = soup.find(attrs={"itemprop": "articleBody"})
+    if article:
+        first_p = article.find("p")
+        if first_p:
+            meme["description"] = first_p.get_text(strip=True)
+
+    figure = soup.find("figure", class_=ARTICLE_FIGURE_CLASS)
+    if figure:
+        img = figure.find("img")
+        if img and img.get("src"):
+            meme["image"] = img["src"]
+
+    return meme
+
+def extract_post_links(html: str, parser: str = HTML_PARSER) -> list:
+    """
+    Извлекает ссылки на статьи со страницы списка мемов.
+
+    Args:
+        html (str): HTML страницы списка.
+        parser (str): Бэкенд разбора (см. HTML_PARSERS).
+
+    Returns:
+        list: Ссылки в порядке следования на странице.
+    """
+    if parser == "lxml.html":
+        return _extract_post_links_lxml(html)
+
+    soup = bs(html, parser)
+    container = soup.find('div', class_=LIST_CONTAINER_CLASS)
+    if container is None:
+        return []
+    links = []
+    for post in container.find_all("article", class_="post"):
+        a_tag = post.find("a", href=True)
+        if a_tag:
+            links.append(a_tag['href'])
+    return links
+
 def parse_data(u: str) -> tuple:
 
     """
@@ -40,23 +158,8 @@ def parse_data(u: str) -> tuple:
 
     try:
         page = requests.get(u)
-        soup = bs(page.text, "html.parser")
-
-        headline = soup.find(attrs={"itemprop": "headline"})
-        if headline:
-            name = headline.get_text(strip=True)
-
-        article = soup.find(attrs={"itemprop": "articleBody"})
-        if article:
-            first_p = article.find("p")
-            if first_p:
-                description = first_p.get_text(strip=True)
-
-        figure = soup.find("figure", class_="s-post-media-img post-thumbnail post-media-b")
-        if figure:
-            img = figure.find("img")
-            if img and img.get("src"):
-                image = img["src"]
+        meme = extract_meme(page.text)
+        name, description, image = meme["name"], meme["description"], meme["image"]
 
     except Exception as e:
         print("Ошибка при парсинге:", e)
@@ -91,16 +194,10 @@ def parse_href(url: str, tags_dict: dict) -> None:
     """
 
     response = requests.get(url)
-    html = response.text
-    soup = bs(html, 'html.parser')
-    container = soup.find('div', class_="bb-col col-content")
-    posts = container.find_all("article", class_="post")
     with open("memes_base.json", "a", encoding="utf-8") as f:
-        for post in posts:
-            a_tag = post.find("a", href=True)
-            if a_tag:
-                index_meta, record = parse_data(a_tag['href'])
-                f.write(f"{index_meta}\n{record}\n")
+        for link in extract_post_links(response.text):
+            index_meta, record = parse_data(link)
+            f.write(f"{index_meta}\n{record}\n")
         f.write("\n")
         
 
@@ -4,9 +4,12 @@ import logging
 import emoji
 from typing import List, Dict, Any
 from elasticsearch import Elasticsearch, helpers
-from openai import OpenAI
-from config_openai import OPENAI_API_KEY
 from config import ES_HOST, ES_PORT
+from embedding_providers import EmbeddingProvider, get_embedding_provider
+from metrics import KNN_FALLBACKS, SYNC_DOCUMENTS
+from micro_batch import MicroBatcher
+from tracing import es_profile_requested, operation, record_es_profile, stage
+import clip_utils
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,7 +21,7 @@ class ElasticsearchManager:
 
     Содержит методы для:
       - Приоритетного текстового поиска по тегам и описанию.
-      - KNN-поиска по эмбеддингам 
+      - KNN-поиска по эмбеддингам описаний или картинок (через провайдера эмбеддингов)
       - Перевода смайликов в текст
     """
 
@@ -26,27 +29,33 @@ class ElasticsearchManager:
         self,
         db_path: str = 'memes.db',
         index_name: str = 'memes_index',
-        embedding_model: str = 'text-embedding-3-small',
-        embedding_dim: int = 1536
+        embedding_dim: int = 1536,
+        clip_dim: int = clip_utils.CLIP_DIM,
+        provider: EmbeddingProvider | None = None,
+        es: Elasticsearch | None = None
     ):
         """
-        Инициализирует соединение с Elasticsearch и клиент OpenAI.
+        Инициализирует соединение с Elasticsearch и провайдера эмбеддингов.
 
         Args:
             db_path (str): Путь до SQLite базы данных с мемами (файл .db).
             index_name (str): Имя индекса в Elasticsearch для хранения мемов.
-            embedding_model (str): Название модели OpenAI для создания эмбеддингов текста.
             embedding_dim (int): Размерность векторов эмбеддинга, используемая в индексе.
+            clip_dim (int): Размерность CLIP-эмбеддингов картинок (поле clip_embedding).
+            provider (EmbeddingProvider | None): Чем кодировать запросы для KNN;
+                по умолчанию провайдер из EMBEDDING_PROVIDER.
+            es (Elasticsearch | None): Готовый клиент (например, для бенчмарков);
+                по умолчанию создаётся клиент к ES_HOST:ES_PORT.
 
         Raises:
             ConnectionError: Если не удалось подключиться к Elasticsearch.
         """
         self.db_path = db_path
         self.index_name = index_name
-        self.embedding_model = embedding_model
         self.embedding_dim = embedding_dim
+        self.clip_dim = clip_dim
 
-        self.es = Elasticsearch(
+        self.es = es or Elasticsearch(
             hosts=[f"http://{ES_HOST}:{ES_PORT}"],
             request_timeout=30,
             max_retries=3,
@@ -56,9 +65,10 @@ class ElasticsearchManager:
             raise ConnectionError("Не удалось подключиться к Elasticsearch")
         logger.info("Подключение к Elasticsearch успешно")
 
-        # Клиент OpenAI для эмбеддингов
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        self.provider = provider or get_embedding_provider()
+        self.batcher = None
 
+    @operation("search_with_hybrid")
     def search_with_hybrid(self, query: str, k: int = 20, alpha: float = 0.2) -> List[Dict[str, Any]]:
         """
         Выполняет гибридный поиск: сначала текстовый, а при нехватке результатов — KNN-поиск.
@@ -85,11 +95,13 @@ class ElasticsearchManager:
             if len(text_results) >= k:
                 return text_results[:k]
 
+            KNN_FALLBACKS.labels("search_with_hybrid").inc()
             knn_results = self._search_knn(query, k)
             text_ids = {str(doc['id']) for doc in text_results}
             filtered = [doc for doc in knn_results if str(doc['id']) not in text_ids]
             return text_results + filtered[: k - len(text_results)]
         else:
+            KNN_FALLBACKS.labels("search_with_hybrid").inc()
             return self._search_knn(query, k)
 
     def _is_emoji_only(self, s: str) -> bool:
@@ -122,15 +134,24 @@ class ElasticsearchManager:
         """
         Создаёт индекс в Elasticsearch, если он ещё не существует.
 
+        Если индекс уже есть, но в нём нет поля clip_embedding, поле добавляется в mapping.
+
         Mappings:
           - db_id: integer
           - name, description, tags: text
           - image: keyword
-          - image_embedding: dense_vector для KNN-поиска
+          - image_embedding: dense_vector эмбеддингов описаний (OpenAI) для KNN-поиска
+          - clip_embedding: dense_vector CLIP-эмбеддингов картинок для KNN-поиска
 
         Returns:
             None
         """
+        clip_field = {
+            "type": "dense_vector",
+            "dims": self.clip_dim,
+            "index": True,
+            "similarity": "cosine"
+        }
         if not self.es.indices.exists(index=self.index_name):
             mapping = {
                 "mappings": {
@@ -145,11 +166,19 @@ class ElasticsearchManager:
                             "dims": self.embedding_dim,
                             "index": True,
                             "similarity": "cosine"
-                        }
+                        },
+                        "clip_embedding": clip_field
                     }
                 }
             }
             self.es.indices.create(index=self.index_name, body=mapping)
+        else:
+            current = self.es.indices.get_mapping(index=self.index_name)
+            properties = current[self.index_name]['mappings'].get('properties', {})
+            if 'clip_embedding' not in properties:
+                self.es.indices.put_mapping(
+                    index=self.index_name, properties={"clip_embedding": clip_field}
+                )
 
     def _search_text_fields(self, query: str, k: int) -> List[Dict[str, Any]]:
         """
@@ -166,38 +195,134 @@ class ElasticsearchManager:
             При любой ошибке логирует ошибку и возвращает пустой список.
         """
         try:
-            resp = self.es.search(
-                index=self.index_name,
-                body={
-                    "size": k,
-                    "query": {
-                        "multi_match": {
-                            "query": query,
-                            "fields": ["tags", "description", "name"],
-                            "fuzziness": 1 if len(query) > 3 else 0
-                        }
-                    }
-                }
-            )
-            return [
-                {"id": h['_source'].get('db_id') or h['_source'].get('id'),
-                 "score": h['_score'],
-                 **{f: h['_source'].get(f) for f in ['name', 'image', 'description', 'tags']}
-                }
-                for h in resp['hits']['hits']
-            ]
+            return self.search_text(query, k)
         except Exception as e:
             logger.error(f"Ошибка текстового поиска: {e}")
             return []
 
+    def _client(self, timeout: float | None) -> Elasticsearch:
+        """Клиент ES; с timeout — одна попытка не дольше timeout секунд."""
+        if timeout is None:
+            return self.es
+        return self.es.options(request_timeout=max(timeout, 0.001), max_retries=0)
+
+    def enable_msearch_batching(self, window: float, max_batch: int) -> None:
+        """
+        Включает микробатчинг: запросы search_text и search_vector из разных потоков,
+        пришедшие в пределах window секунд, уходят в Elasticsearch одним _msearch.
+
+        Args:
+            window (float): Окно сбора запросов, секунды.
+            max_batch (int): Наибольшее число запросов в одном _msearch.
+        """
+        self.batcher = MicroBatcher("es_msearch", self.msearch, window, max_batch)
+
+    def msearch(self, bodies: list, timeout: float | None = None) -> list:
+        """
+        Выполняет несколько поисков одним запросом _msearch.
+
+        Args:
+            bodies (list): Тела поисковых запросов.
+            timeout (float | None): Таймаут всего _msearch, секунды (самый короткий
+                оставшийся бюджет среди запросов пачки).
+
+        Returns:
+            list: Ответы в порядке запросов; на месте неудачного поиска — исключение.
+        """
+        searches = []
+        for body in bodies:
+            searches += [{"index": self.index_name}, body]
+        responses = self._client(timeout).msearch(searches=searches)["responses"]
+        return [
+            RuntimeError(f"Ошибка поиска в _msearch: {r['error']}") if "error" in r else r
+            for r in responses
+        ]
+
+    def _execute(self, body: Dict[str, Any], timeout: float | None) -> Dict[str, Any]:
+        """Выполняет поиск: через _msearch-батчер, если он включён, иначе отдельным запросом."""
+        if self.batcher is not None:
+            return self.batcher.submit(body, timeout).result(timeout)
+        return self._client(timeout).search(index=self.index_name, body=body)
+
+    def search_text(self, query: str, k: int, timeout: float | None = None) -> List[Dict[str, Any]]:
+        """
+        Текстовый поиск по полям tags, description и name без перехвата ошибок.
+
+        Args:
+            query (str): Строка запроса.
+            k (int): Количество возвращаемых результатов.
+            timeout (float | None): Таймаут запроса, секунды (без повторов);
+                по умолчанию — настройки клиента.
+
+        Returns:
+            List[Dict[str, Any]]: Список найденных документов с оценкой и метаданными.
+        """
+        body = {
+            "size": k,
+            "query": {
+                "multi_match": {
+                    "query": query,
+                    "fields": ["tags", "description", "name"],
+                    "fuzziness": 1 if len(query) > 3 else 0
+                }
+            }
+        }
+        if es_profile_requested():
+            body["profile"] = True
+        with stage("es_text", k=k) as span:
+            resp = self._execute(body, timeout)
+            results = self._hits_to_results(resp)
+            if span is not None:
+                span.set(hits=len(results))
+        record_es_profile("es_text", resp)
+        return results
+
+    @staticmethod
+    def _hits_to_results(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Переводит ответ Elasticsearch в список результатов поиска.
+        """
+        return [
+            {"id": h['_source'].get('db_id') or h['_source'].get('id'),
+             "score": h['_score'],
+             **{f: h['_source'].get(f) for f in ['name', 'image', 'description', 'tags']}
+            }
+            for h in resp['hits']['hits']
+        ]
+
+    def _embed_query(self, query: str, timeout: float | None = None) -> tuple:
+        """
+        Кодирует запрос в вектор провайдером эмбеддингов.
+
+        Args:
+            query (str): Текст запроса.
+            timeout (float | None): С timeout — одна попытка не дольше timeout секунд.
+
+        Returns:
+            tuple: (имя векторного поля в индексе, вектор запроса).
+        """
+        provider = self.provider
+        if timeout is not None:
+            provider = provider.with_options(timeout=max(timeout, 0.001), max_retries=0)
+        with stage("embedding", provider=self.provider.name):
+            return provider.field, provider.embed_one(query)
+
+    def embedding_text(self, query: str) -> str:
+        """Текст запроса для эмбеддинга: запрос только из emoji переводится в слова."""
+        if self._is_emoji_only(query):
+            query = self._translate_emoji_to_text(query)
+            logger.info(f"Translate emoji for embedding: '{query}'")
+        return query
+
     def _search_knn(self, query: str, k: int) -> List[Dict[str, Any]]:
         """
         Выполняет KNN-поиск по эмбеддингам.
 
         Логика:
           1. Если запрос только emoji — переводит в текст.
-          2. Создает эмбеддинг с помощью OpenAI.
-          3. Запускает KNN-запрос в Elasticsearch по полю image_embedding.
+          2. Создает эмбеддинг запроса провайдером (OpenAI и hashing — поле image_embedding,
+             локальный текстовый энкодер CLIP — поле clip_embedding).
+          3. Запускает KNN-запрос в Elasticsearch по соответствующему полю.
 
         Args:
             query (str): Запрос (текст или emoji).
@@ -206,36 +331,48 @@ class ElasticsearchManager:
         Returns:
             List[Dict[str, Any]]: Список документов с оценкой и метаданными.
         """
-        if self._is_emoji_only(query):
-            query = self._translate_emoji_to_text(query)
-            logger.info(f"Translate emoji for embedding: '{query}'")
-        emb = self.client.embeddings.create(model=self.embedding_model, input=query).data[0].embedding
-        print('Длина эмбеддинга для KNN:', len(emb))
+        field, emb = self._embed_query(self.embedding_text(query))
         try:
-            resp = self.es.search(
-                index=self.index_name,
-                body={
-                    "size": k,
-                    "query": {
-                        "knn": {
-                            "field": "image_embedding",
-                            "query_vector": emb,
-                            "num_candidates": 100
-                        }
-                    }
-                }
-            )
-            return [
-                {"id": h['_source'].get('db_id') or h['_source'].get('id'),
-                 "score": h['_score'],
-                 **{f: h['_source'].get(f) for f in ['name', 'image', 'description', 'tags']}
-                }
-                for h in resp['hits']['hits']
-            ]
+            return self.search_vector(field, emb, k)
         except Exception as e:
             logger.error(f"Ошибка KNN-поиска: {e}")
             return []
 
+    def search_vector(self, field: str, vector: List[float], k: int,
+                      timeout: float | None = None) -> List[Dict[str, Any]]:
+        """
+        KNN-запрос в Elasticsearch по готовому вектору без перехвата ошибок.
+
+        Args:
+            field (str): Векторное поле индекса.
+            vector (List[float]): Вектор запроса.
+            k (int): Количество возвращаемых кандидатов.
+            timeout (float | None): Таймаут запроса, секунды (без повторов).
+
+        Returns:
+            List[Dict[str, Any]]: Список документов с оценкой и метаданными.
+        """
+        body = {
+            "size": k,
+            "query": {
+                "knn": {
+                    "field": field,
+                    "query_vector": vector,
+                    "num_candidates": 100
+                }
+            }
+        }
+        if es_profile_requested():
+            body["profile"] = True
+        with stage("es_knn", k=k, field=field, dim=len(vector)) as span:
+            resp = self._execute(body, timeout)
+            results = self._hits_to_results(resp)
+            if span is not None:
+                span.set(hits=len(results))
+        record_es_profile("es_knn", resp)
+        return results
+
+    @operation("search")
     def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """
         Основной метод поиска: текстовый или KNN в зависимости от типа запроса.
@@ -254,20 +391,23 @@ class ElasticsearchManager:
         if self._is_emoji_only(query):
             translated = self._translate_emoji_to_text(query)
             logger.info(f"Emoji-запрос: '{query}' -> '{translated}'")
+            KNN_FALLBACKS.labels("search").inc()
             return self._search_knn(translated, k)
 
         text_results = self._search_text_fields(query, k)
         if text_results:
             return text_results
+        KNN_FALLBACKS.labels("search").inc()
         return self._search_knn(query, k)
 
+    @operation("sync_db_to_elasticsearch")
     def sync_db_to_elasticsearch(self) -> None:
         """
         Синхронизирует данные из локальной SQLite БД в индекс Elasticsearch.
 
         Чтение:
           - Подключается к базе memes.db.
-          - Выбирает записи с заполненным JSON-эмбеддингом.
+          - Выбирает записи с заполненным JSON-эмбеддингом описания и/или картинки (CLIP).
           - Пропускает некорректные эмбеддинги.
 
         Загрузка:
@@ -278,32 +418,42 @@ class ElasticsearchManager:
             None
         """
         actions = []
-        print('Открываем базу:', self.db_path)
-        with sqlite3.connect(self.db_path) as conn:
+        logger.info(f"Открываем базу: {self.db_path}")
+        with stage("sync_sqlite_read"), \
+                sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             count = 0
+            columns = {r['name'] for r in conn.execute("PRAGMA table_info(memes)")}
+            clip_column = 'image_embedding' if 'image_embedding' in columns else 'NULL'
             for row in conn.execute(
-                "SELECT id, name, description, tags, image, embedding FROM memes WHERE embedding IS NOT NULL"
+                f"SELECT id, name, description, tags, image, embedding, "
+                f"{clip_column} AS clip_embedding FROM memes "
+                f"WHERE embedding IS NOT NULL OR {clip_column} IS NOT NULL"
             ):
                 try:
-                    emb = json.loads(row['embedding'])
+                    emb = json.loads(row['embedding']) if row['embedding'] else None
+                    clip_emb = json.loads(row['clip_embedding']) if row['clip_embedding'] else None
                 except Exception as e:
-                    print('Ошибка при чтении embedding:', e)
+                    logger.warning(f"Ошибка при чтении embedding мема {row['id']}: {e}")
                     continue
                 doc = {
                     "db_id": row['id'],
                     "name": row['name'],
                     "description": row['description'],
                     "tags": row['tags'],
-                    "image": row['image'],
-                    "image_embedding": emb
+                    "image": row['image']
                 }
+                if emb is not None:
+                    doc["image_embedding"] = emb
+                if clip_emb is not None:
+                    doc["clip_embedding"] = clip_emb
                 actions.append({"_index": self.index_name, "_id": row['id'], "_source": doc})
                 count += 1
-            print('Всего мемов для заливки:', count)
+            logger.info(f"Всего мемов для заливки: {count}")
         if actions:
-            print('Начинаем bulk...')
-            helpers.bulk(self.es, actions)
-            print(f"Загружено {len(actions)} документов")
+            with stage("sync_es_bulk", documents=len(actions)):
+                helpers.bulk(self.es, actions)
+            SYNC_DOCUMENTS.inc(len(actions))
+            logger.info(f"Загружено {len(actions)} документов")
         else:
-            print('Нет документов для загрузки!')
+            logger.warning("Нет документов для загрузки")
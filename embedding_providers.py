@@ -0,0 +1,180 @@
+import copy
+import hashlib
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import List
+
+from openai import OpenAI
+
+import clip_utils
+from config import EMBEDDING_PROVIDER
+from config_openai import EMBEDDING_MODEL, OPENAI_API_KEY, OPENAI_BASE_URL
+
+
+class EmbeddingProvider(ABC):
+    """
+    Общий интерфейс источника эмбеддингов текста.
+
+    Атрибуты:
+      - name: короткое имя провайдера (значение EMBEDDING_PROVIDER).
+      - dim: размерность векторов.
+      - field: векторное поле индекса Elasticsearch, с которым сравниваются
+        векторы этого провайдера (image_embedding — эмбеддинги описаний,
+        clip_embedding — CLIP-эмбеддинги картинок).
+    """
+
+    name: str = ""
+    dim: int = 0
+    field: str = "image_embedding"
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Возвращает эмбеддинги для списка текстов в том же порядке.
+
+        Args:
+            texts (List[str]): Непустые строки.
+
+        Returns:
+            List[List[float]]: Векторы длины dim.
+        """
+
+    def embed_one(self, text: str) -> List[float]:
+        """Эмбеддинг одного текста."""
+        return self.embed([text])[0]
+
+    def with_options(self, **options) -> "EmbeddingProvider":
+        """
+        Провайдер с другими настройками сетевого клиента (timeout, max_retries).
+
+        Локальные провайдеры сеть не используют и возвращают себя.
+        """
+        return self
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    Эмбеддинги OpenAI (по умолчанию text-embedding-3-small, 1536 измерений).
+
+    Длинные списки текстов делятся на запросы по batch_size входов.
+    """
+
+    name = "openai"
+    field = "image_embedding"
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        dim: int = 1536,
+        api_key: str | None = OPENAI_API_KEY,
+        base_url: str | None = OPENAI_BASE_URL,
+        max_retries: int = 2,
+        batch_size: int = 2048
+    ):
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=max_retries)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(
+                model=self.model, input=texts[start:start + self.batch_size]
+            )
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return vectors
+
+    def with_options(self, **options) -> "OpenAIEmbeddingProvider":
+        """Копия провайдера с client.with_options(**options), клиент и пул соединений общие."""
+        provider = copy.copy(self)
+        provider.client = self.client.with_options(**options)
+        return provider
+
+
+class ClipTextEmbeddingProvider(EmbeddingProvider):
+    """
+    Текстовый энкодер CLIP, работающий локально на CPU.
+
+    Векторы сравниваются с CLIP-эмбеддингами картинок (поле clip_embedding).
+    """
+
+    name = "clip"
+    dim = clip_utils.CLIP_DIM
+    field = "clip_embedding"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [clip_utils.encode_text(text) for text in texts]
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Детерминированные эмбеддинги без сети и моделей (feature hashing).
+
+    Слова и символьные триграммы хешируются в dim корзин со знаком,
+    вектор нормируется. Похожие по написанию тексты получают близкие векторы,
+    поэтому провайдер годится для офлайн-прогонов, тестов и бенчмарков.
+    Размерность по умолчанию совпадает с OpenAI, чтобы векторы помещались в то же поле индекса.
+    """
+
+    name = "hashing"
+    field = "image_embedding"
+    _word_re = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 1536, trigram_weight: float = 0.5):
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+
+    def _features(self, text: str):
+        for word in self._word_re.findall(text.lower()):
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], self.trigram_weight
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for feature, weight in self._features(text):
+                h = int.from_bytes(
+                    hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little"
+                )
+                vector[h % self.dim] += weight if h >> 63 else -weight
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    ClipTextEmbeddingProvider.name: ClipTextEmbeddingProvider,
+    HashingEmbeddingProvider.name: HashingEmbeddingProvider,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_embedding_provider(name: str | None = None) -> EmbeddingProvider:
+    """
+    Возвращает общий для процесса экземпляр провайдера.
+
+    Args:
+        name (str | None): "openai", "clip" или "hashing"; по умолчанию EMBEDDING_PROVIDER.
+
+    Returns:
+        EmbeddingProvider: Провайдер (создаётся один раз на процесс).
+
+    Raises:
+        ValueError: Неизвестное имя провайдера.
+    """
+    name = name or EMBEDDING_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Неизвестный провайдер эмбеддингов: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = PROVIDERS[name]()
+        return _instances[name]
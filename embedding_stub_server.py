@@ -0,0 +1,142 @@
+import argparse
+import hashlib
+import json
+import math
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text: str, dim: int) -> list:
+    """
+    Строит детерминированный псевдо-эмбеддинг текста.
+
+    Вектор зависит только от текста и размерности, поэтому повторные
+    запуски дают одинаковые результаты.
+
+    Args:
+        text (str): Входной текст.
+        dim (int): Размерность вектора.
+
+    Returns:
+        list: Нормированный вектор длины dim.
+    """
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.blake2b(f"{counter}:{text}".encode("utf-8"), digest_size=64).digest()
+        values.extend(v / 2**31 for v in struct.unpack("<16i", digest))
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+class EmbeddingStubHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик, имитирующий эндпоинт POST /v1/embeddings OpenAI.
+
+    Параметры заглушки (задержка, размерность, частота 429) хранятся в атрибутах сервера.
+    """
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+
+        with server.lock:
+            server.request_count += 1
+            request_number = server.request_count
+
+        if server.rate_limit_every and request_number % server.rate_limit_every == 0:
+            self._send_json(429, {"error": {"message": "rate limit", "type": "requests"}})
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        with server.lock:
+            server.input_count += len(inputs)
+
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text, server.dim)}
+            for i, text in enumerate(inputs)
+        ]
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model", "stub"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+    def _send_json(self, status: int, body: dict) -> None:
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    dim: int = 1536,
+    latency: float = 0.0,
+    rate_limit_every: int = 0,
+) -> ThreadingHTTPServer:
+    """
+    Запускает заглушку эмбеддингов в фоновом потоке.
+
+    Args:
+        host (str): Адрес для прослушивания.
+        port (int): Порт (0 — выбрать свободный).
+        dim (int): Размерность возвращаемых векторов.
+        latency (float): Искусственная задержка ответа в секундах.
+        rate_limit_every (int): Отвечать 429 на каждый N-й запрос (0 — никогда).
+
+    Returns:
+        ThreadingHTTPServer: Запущенный сервер; base_url для клиента OpenAI —
+        f"http://{host}:{server.server_address[1]}/v1". Остановка — server.shutdown().
+    """
+    server = ThreadingHTTPServer((host, port), EmbeddingStubHandler)
+    server.daemon_threads = True
+    server.dim = dim
+    server.latency = latency
+    server.rate_limit_every = rate_limit_every
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.input_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная заглушка OpenAI embeddings API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = start_stub_server(args.host, args.port, args.dim, args.latency, args.rate_limit_every)
+    print(f"[i] Заглушка эмбеддингов: OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from config import (
+    EVENT_LOG_BATCH,
+    EVENT_LOG_CAPACITY,
+    EVENT_LOG_FLUSH_INTERVAL,
+    EVENT_LOG_PATH,
+    EVENT_LOG_ROTATE_BYTES,
+    EVENT_LOG_SINK,
+)
+from inline_search import normalize_query
+from metrics import CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+# Поля событий, которые хранятся в отдельных колонках SQLite; остальные — JSON в data
+COLUMNS = ("ts", "kind", "chat_id", "query", "meme_id", "results", "result")
+
+
+class SQLiteEventSink:
+    """Пишет события в таблицу events базы SQLite."""
+
+    def __init__(self, path: str = "events.db"):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                ts REAL NOT NULL,
+                kind TEXT NOT NULL,
+                chat_id INTEGER,
+                query TEXT,
+                meme_id INTEGER,
+                results INTEGER,
+                result TEXT,
+                data TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_kind_ts ON events (kind, ts)")
+        return conn
+
+    def write(self, events: list) -> None:
+        rows = []
+        for event in events:
+            extra = {k: v for k, v in event.items() if k not in COLUMNS}
+            rows.append(tuple(event.get(k) for k in COLUMNS)
+                        + (json.dumps(extra, ensure_ascii=False) if extra else None,))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO events ({', '.join(COLUMNS)}, data) "
+                    f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                    rows,
+                )
+        finally:
+            conn.close()
+
+    def read(self, since: float = 0):
+        if not os.path.exists(self.path):
+            return
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(COLUMNS)}, data FROM events WHERE ts >= ? ORDER BY ts",
+                (since,),
+            )
+            for row in cursor:
+                event = {k: v for k, v in zip(COLUMNS, row) if v is not None}
+                if row[-1]:
+                    event.update(json.loads(row[-1]))
+                yield event
+        finally:
+            conn.close()
+
+
+class JsonlEventSink:
+    """
+    Пишет события построчно в <directory>/events.jsonl.
+
+    Когда файл дорастает до max_bytes, он переименовывается в
+    events-<UTC-время>.jsonl и запись продолжается в новый файл.
+    """
+
+    def __init__(self, directory: str = "events", max_bytes: int = EVENT_LOG_ROTATE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @property
+    def current(self) -> str:
+        return os.path.join(self.directory, "events.jsonl")
+
+    def _rotate(self) -> None:
+        # Микросекунды в имени: файлы сортируются по времени ротации
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        os.replace(self.current, os.path.join(self.directory, f"events-{stamp}.jsonl"))
+
+    def write(self, events: list) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.current, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            size = f.tell()
+        if size >= self.max_bytes:
+            self._rotate()
+
+    def files(self) -> list:
+        """Файлы журнала от старых к новым."""
+        if not os.path.isdir(self.directory):
+            return []
+        rotated = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("events-") and name.endswith(".jsonl")
+        )
+        names = rotated + (["events.jsonl"] if os.path.exists(self.current) else [])
+        return [os.path.join(self.directory, name) for name in names]
+
+    def read(self, since: float = 0):
+        for path in self.files():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event.get("ts", 0) >= since:
+                        yield event
+
+
+def make_sink(kind: str = EVENT_LOG_SINK, path: str | None = EVENT_LOG_PATH):
+    """
+    Создаёт хранилище журнала по названию.
+
+    Args:
+        kind (str): "sqlite", "jsonl" или "off".
+        path (str | None): Файл базы или каталог JSONL; по умолчанию events.db / events.
+
+    Returns:
+        SQLiteEventSink | JsonlEventSink | None: None — журнал отключён.
+    """
+    kind = (kind or "off").lower()
+    if kind == "sqlite":
+        return SQLiteEventSink(path or "events.db")
+    if kind == "jsonl":
+        return JsonlEventSink(path or "events")
+    if kind == "off":
+        return None
+    raise ValueError(f"Неизвестное хранилище журнала событий: {kind}")
+
+
+class EventLog:
+    """
+    Журнал действий пользователей: кольцевой буфер в памяти и пакетная запись.
+
+    record() только добавляет словарь в буфер и никогда не ждёт ввода-вывода;
+    при переполнении вытесняются самые старые события (счётчик dropped).
+    Фоновая задача run_flusher раз в interval секунд забирает буфер пачками
+    по batch_size и пишет их в хранилище в пуле потоков.
+    """
+
+    def __init__(self, sink=None, capacity: int = EVENT_LOG_CAPACITY,
+                 batch_size: int = EVENT_LOG_BATCH):
+        """
+        Args:
+            sink: Хранилище с методом write(events); None — события не собираются.
+            capacity (int): Размер кольцевого буфера.
+            batch_size (int): Событий в одной записи.
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._buffer = deque(maxlen=capacity)
+
+    def record(self, kind: str, **fields) -> None:
+        """
+        Добавляет событие в буфер.
+
+        Args:
+            kind (str): Тип события: search, send, lookup.
+            **fields: Поля события (chat_id, query, meme_id, results, result, ...).
+        """
+        if self.sink is None:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self.recorded += 1
+        self._buffer.append({"ts": time.time(), "kind": kind, **fields})
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def _drain(self) -> list:
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    def _write(self, batch: list) -> None:
+        try:
+            self.sink.write(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Ошибка записи журнала событий ({len(batch)} событий): {e}")
+
+    def flush(self) -> None:
+        """Синхронно записывает всё, что накопилось в буфере (при остановке бота)."""
+        while batch := self._drain():
+            self._write(batch)
+
+    async def aflush(self) -> None:
+        """Записывает накопленные события пачками, не блокируя цикл событий."""
+        while batch := self._drain():
+            await asyncio.to_thread(self._write, batch)
+
+    async def run_flusher(self, interval: float = EVENT_LOG_FLUSH_INTERVAL) -> None:
+        """Фоновая задача: раз в interval секунд сбрасывает буфер в хранилище."""
+        if self.sink is None:
+            return
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.aflush()
+        finally:
+            self.flush()
+
+    def stats(self) -> dict:
+        return {"recorded": self.recorded, "written": self.written,
+                "dropped": self.dropped, "failed": self.failed}
+
+
+def aggregate_queries(events, top: int = 20) -> dict:
+    """
+    Офлайн-сводка по событиям поиска.
+
+    Args:
+        events: События журнала (SQLiteEventSink.read / JsonlEventSink.read).
+        top (int): Сколько запросов вернуть в каждом списке.
+
+    Returns:
+        dict: popular — самые частые темы поиска, zero_result — самые частые
+            темы без результатов (пары (тема, число запросов)); searches —
+            всего поисков; failed_sends — неудачные отправки по meme_id.
+    """
+    popular, zero, failed = Counter(), Counter(), Counter()
+    searches = 0
+    for event in events:
+        kind = event.get("kind")
+        if kind == "search":
+            searches += 1
+            query = normalize_query(event.get("query") or "")
+            popular[query] += 1
+            if not event.get("results"):
+                zero[query] += 1
+        elif kind == "send" and event.get("result") == "failed":
+            failed[event.get("meme_id")] += 1
+    return {
+        "searches": searches,
+        "popular": popular.most_common(top),
+        "zero_result": zero.most_common(top),
+        "failed_sends": failed.most_common(top),
+    }
+
+
+_event_log = None
+
+
+def get_event_log() -> EventLog:
+    """Возвращает общий для процесса журнал (хранилище из EVENT_LOG_SINK)."""
+    global _event_log
+    if _event_log is None:
+        _event_log = EventLog(make_sink())
+    return _event_log
+
+
+def _event_samples() -> dict:
+    if _event_log is None:
+        return {}
+    return {(result,): value for result, value in _event_log.stats().items()}
+
+
+EVENTS = CallbackMetric(
+    "meme_events_total",
+    "События журнала действий: recorded, written, dropped (вытеснены из буфера), failed",
+    ("result",),
+    _event_samples,
+    metric_type="counter",
+)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Сводка по журналу событий бота")
+    parser.add_argument("--sink", default=EVENT_LOG_SINK, choices=["sqlite", "jsonl"])
+    parser.add_argument("--path", default=EVENT_LOG_PATH,
+                        help="файл базы (sqlite) или каталог (jsonl)")
+    parser.add_argument("--days", type=float, default=7, help="за сколько последних дней")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else 0
+    report = aggregate_queries(make_sink(args.sink, args.path).read(since), args.top)
+    print(f"[i] Поисков за {args.days:g} дн.: {report['searches']}")
+    print("[+] Популярные темы:")
+    for query, count in report["popular"]:
+        print(f"    {count:6d}  {query}")
+    print("[+] Темы без результатов:")
+    for query, count in report["zero_result"]:
+        print(f"    {count:6d}  {query}")
+    if report["failed_sends"]:
+        print("[!] Мемы с ошибками отправки:")
+        for meme_id, count in report["failed_sends"]:
+            print(f"    {count:6d}  #{meme_id}")
@@ -1,27 +1,196 @@
-from openai import OpenAI
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
 import sqlite3
 import json
-from config_openai import OPENAI_API_KEY
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from embedding_providers import EmbeddingProvider, get_embedding_provider
 
 DB_PATH = 'memes.db'
-EMBEDDING_MODEL = "text-embedding-3-small"
-LIMIT = 5
+CHECKPOINT_PATH = 'embeddings_checkpoint.json'
+
+BATCH_SIZE = 64         # описаний в одном запросе к embeddings API
+MAX_WORKERS = 4         # одновременных запросов к API
+COMMIT_EVERY = 512      # строк между коммитами (и сохранениями чекпоинта)
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+PROGRESS_EVERY = 5.0    # секунд между строками прогресса
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
 
 def get_embedding(text: str) -> list:
     try:
-        response = client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text,
-        )
-        return response.data[0].embedding
+        return get_embedding_provider().embed_one(text)
     except Exception as e:
         print(f"[!] Ошибка при получении эмбеддинга: {e}")
         return None
 
-def main():
-    conn = sqlite3.connect(DB_PATH)
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """
+    Считает паузу перед повтором: Retry-After от сервера либо экспонента с джиттером.
+    """
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def get_embeddings(texts: list, provider: EmbeddingProvider | None = None) -> list:
+    """
+    Получает эмбеддинги для пачки текстов одним вызовом провайдера.
+
+    При ошибках лимитов и сетевых сбоях повторяет запрос с экспоненциальной
+    задержкой (не более MAX_RETRIES раз).
+
+    Args:
+        texts (list): Список непустых строк.
+        provider (EmbeddingProvider | None): Провайдер; по умолчанию из EMBEDDING_PROVIDER.
+
+    Returns:
+        list: Эмбеддинги в том же порядке, что и texts.
+
+    Raises:
+        Exception: Последняя ошибка API, если повторы не помогли,
+            или любая неповторяемая ошибка.
+    """
+    provider = provider or get_embedding_provider()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return provider.embed(texts)
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff_delay(attempt, e)
+            print(f"[!] {type(e).__name__}, повтор через {delay:.1f} с")
+            time.sleep(delay)
+
+
+def load_checkpoint(path: str) -> dict:
+    """
+    Читает чекпоинт прерванного запуска.
+
+    Returns:
+        dict: {"last_id": int, "reembed": bool}; last_id = 0, если чекпоинта нет.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {"last_id": int(data.get("last_id", 0)), "reembed": bool(data.get("reembed"))}
+    except (FileNotFoundError, ValueError):
+        return {"last_id": 0, "reembed": False}
+
+
+def save_checkpoint(path: str, last_id: int, reembed: bool) -> None:
+    """Атомарно записывает чекпоинт (через временный файл)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"last_id": last_id, "reembed": reembed}, f)
+    os.replace(tmp_path, path)
+
+
+def _pending_condition(reembed: bool) -> str:
+    """Условие WHERE для строк, ждущих эмбеддинга, с id больше параметра."""
+    condition = "description IS NOT NULL AND id > ?"
+    if not reembed:
+        condition += " AND embedding IS NULL"
+    return condition
+
+
+def _iter_batches(conn: sqlite3.Connection, start_id: int, reembed: bool, limit: int | None):
+    """
+    Постранично (по id) выбирает описания для обработки.
+
+    Yields:
+        tuple: (max_id пачки, [(id, text), ...]); пустые описания отбрасываются,
+        но их id учитываются в max_id.
+    """
+    condition = _pending_condition(reembed)
+    last_id = start_id
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = BATCH_SIZE if remaining is None else min(BATCH_SIZE, remaining)
+        rows = conn.execute(
+            f"SELECT id, description FROM memes WHERE {condition} ORDER BY id LIMIT ?",
+            (last_id, size),
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        yield last_id, [(meme_id, desc.strip()) for meme_id, desc in rows if desc.strip()]
+
+
+def _print_progress(done: int, failed: int, total: int, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    eta = (total - done - failed) / rate if rate else float('inf')
+    percent = 100 * (done + failed) / total if total else 100.0
+    print(
+        f"[i] {done + failed}/{total} ({percent:.1f}%), ошибок: {failed}, "
+        f"{rate:.1f} эмб/с, осталось ~{eta:.0f} с"
+    )
+
+
+def main(
+    db_path: str = DB_PATH,
+    limit: int | None = None,
+    reembed: bool = False,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    provider_name: str | None = None,
+) -> dict:
+    """
+    Заполняет колонку embedding пачками с ограниченной конкурентностью.
+
+    Алгоритм:
+        1. Добавляет колонку embedding, если её нет.
+        2. Продолжает с id из чекпоинта, если предыдущий запуск был прерван.
+        3. Отправляет по BATCH_SIZE описаний в запрос, держа не более MAX_WORKERS
+           запросов одновременно.
+        4. Пишет результаты через executemany и коммитит каждые COMMIT_EVERY строк,
+           после коммита сохраняет чекпоинт (id, до которого всё записано).
+        5. Если просмотр дошёл до конца таблицы, удаляет чекпоинт: мемы, для которых
+           запрос не удался, остаются с embedding IS NULL и будут обработаны
+           следующим запуском. Если запуск остановлен по limit, чекпоинт остаётся,
+           и следующий запуск продолжит с места остановки.
+
+    Args:
+        db_path (str): Путь к базе SQLite.
+        limit (int | None): Максимум строк за запуск (None — все).
+        reembed (bool): Пересчитать эмбеддинги и для уже заполненных строк.
+        checkpoint_path (str): Файл чекпоинта.
+        provider_name (str | None): Провайдер эмбеддингов ("openai", "hashing");
+            по умолчанию EMBEDDING_PROVIDER.
+
+    Returns:
+        dict: Статистика запуска: processed, failed, elapsed, rate.
+
+    Raises:
+        ValueError: Провайдер кодирует запросы для другого поля индекса (например, clip).
+    """
+    # Повторы делает get_embeddings с паузами; повторы клиента OpenAI их бы умножили
+    provider = get_embedding_provider(provider_name).with_options(max_retries=0)
+    if provider.field != 'image_embedding':
+        raise ValueError(
+            f"Провайдер '{provider.name}' не подходит для эмбеддингов описаний "
+            f"(поле {provider.field}); для картинок используйте generate_image_embeddings.py"
+        )
+
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     try:
@@ -31,31 +200,118 @@ def main():
     except sqlite3.OperationalError:
         print("[i] Колонка 'embedding' уже существует.")
 
-    cursor.execute("""
-        SELECT id, description FROM memes 
-        WHERE embedding IS NULL AND description IS NOT NULL 
-        LIMIT ?
-    """, (LIMIT,))
-    rows = cursor.fetchall()
-
-    print(f"[i] Найдено {len(rows)} мемов для обработки.")
-
-    for meme_id, desc in rows:
-        text = desc.strip()
-        if not text:
-            continue
-
-        embedding = get_embedding(text)
-        if embedding:
-            cursor.execute(
-                "UPDATE memes SET embedding = ? WHERE id = ?",
-                (json.dumps(embedding), meme_id)
-            )
-            conn.commit()
-            print(f"[+] Мем {meme_id} обновлён.")
+    checkpoint = load_checkpoint(checkpoint_path)
+    start_id = checkpoint["last_id"] if checkpoint["reembed"] == reembed else 0
+    if start_id:
+        print(f"[i] Продолжаем с чекпоинта: id > {start_id}")
+
+    condition = _pending_condition(reembed)
+    total = conn.execute(f"SELECT COUNT(*) FROM memes WHERE {condition}", (start_id,)).fetchone()[0]
+    if limit is not None:
+        total = min(total, limit)
+    print(f"[i] Найдено {total} мемов для обработки.")
+
+    started = time.perf_counter()
+    last_report = started
+    done = failed = pending_rows = 0
 
+    # Порядковые номера пачек нужны для «водяного знака»: чекпоинт может сдвинуться
+    # только до id, перед которым все пачки уже завершены.
+    batch_max_ids = {}
+    finished = set()
+    next_to_confirm = 0
+    watermark = start_id
+
+    batches = _iter_batches(conn, start_id, reembed, limit)
+    in_flight = {}
+    seq = 0
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < MAX_WORKERS * 2:
+                try:
+                    max_id, items = next(batches)
+                except StopIteration:
+                    exhausted = True
+                    break
+                batch_max_ids[seq] = max_id
+                if items:
+                    future = executor.submit(
+                        get_embeddings, [text for _, text in items], provider
+                    )
+                    in_flight[future] = (seq, items)
+                else:
+                    finished.add(seq)
+                seq += 1
+
+            if not in_flight:
+                break
+
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                batch_seq, items = in_flight.pop(future)
+                finished.add(batch_seq)
+                try:
+                    embeddings = future.result()
+                except Exception as e:
+                    failed += len(items)
+                    print(f"[!] Ошибка при получении эмбеддингов для пачки: {e}")
+                    continue
+                cursor.executemany(
+                    "UPDATE memes SET embedding = ? WHERE id = ?",
+                    [(json.dumps(emb), meme_id) for (meme_id, _), emb in zip(items, embeddings)],
+                )
+                done += len(items)
+                pending_rows += len(items)
+
+            while next_to_confirm in finished:
+                watermark = batch_max_ids.pop(next_to_confirm)
+                finished.discard(next_to_confirm)
+                next_to_confirm += 1
+
+            if pending_rows >= COMMIT_EVERY:
+                conn.commit()
+                save_checkpoint(checkpoint_path, watermark, reembed)
+                pending_rows = 0
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY:
+                _print_progress(done, failed, total, started)
+                last_report = now
+
+    conn.commit()
+    # Остались строки после последней просмотренной — запуск остановил limit
+    more = conn.execute(
+        f"SELECT 1 FROM memes WHERE {_pending_condition(reembed)} LIMIT 1", (watermark,)
+    ).fetchone()
     conn.close()
+    if more is None:
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+    else:
+        save_checkpoint(checkpoint_path, watermark, reembed)
+
+    elapsed = time.perf_counter() - started
+    _print_progress(done, failed, total, started)
     print("[✓] Готово.")
+    return {
+        "processed": done,
+        "failed": failed,
+        "elapsed": elapsed,
+        "rate": done / elapsed if elapsed else 0.0,
+    }
+
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пакетная генерация эмбеддингов описаний мемов")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--reembed", action="store_true", help="пересчитать все эмбеддинги")
+    parser.add_argument("--provider", default=None, help="openai или hashing (офлайн)")
+    args = parser.parse_args()
+    main(
+        db_path=args.db, limit=args.limit, reembed=args.reembed, provider_name=args.provider
+    )
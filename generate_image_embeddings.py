@@ -1,57 +1,199 @@
+import os
+import queue
 import sqlite3
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlparse
+
 import requests
 from PIL import Image
-from io import BytesIO
 import torch
-import open_clip
 
-model, _, preprocess = open_clip.create_model_and_transforms(
-    model_name='ViT-B-32',
-    pretrained='laion2b_s34b_b79k'
-)
-model.eval()
+from clip_utils import TORCH_THREADS, load_clip
+from config import S3_BUCKET
+from image_cache import ImageCache, get_image_cache
+from make_renditions import fetch_original
+from s3_storage import get_minio_client, to_object_key
 
 DB_PATH = "memes.db"
-BATCH_PAUSE = 50      
-PAUSE_SECONDS = 15    
 
+DOWNLOAD_WORKERS = 16        # одновременных скачиваний
+PREPROCESS_WORKERS = os.cpu_count() or 4
+BATCH_SIZE = 32              # изображений в одном вызове encode_image
+BATCH_TIMEOUT = 2.0          # секунд ждать неполную пачку, прежде чем кодировать её
+IN_FLIGHT = BATCH_SIZE * 4   # изображений между скачиванием и моделью (ограничение памяти)
+WRITE_EVERY = 256            # строк между коммитами
+MAX_RETRIES = 4
+
+
+class AdaptivePacer:
+    """
+    Адаптивная пауза между запросами к одному хосту.
+
+    Вместо фиксированных пауз: при 429/5xx задержка для хоста удваивается
+    (или берётся из Retry-After), при успешных ответах — плавно уменьшается до нуля.
+    """
+
+    def __init__(self, max_delay: float = 30.0, initial_backoff: float = 0.5):
+        self.max_delay = max_delay
+        self.initial_backoff = initial_backoff
+        self._delays = {}
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        """Резервирует ближайший разрешённый момент для запроса к хосту и ждёт его."""
+        with self._lock:
+            delay = self._delays.get(host, 0.0)
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + delay
+        if slot > now:
+            time.sleep(slot - now)
 
-def get_clip_image_embedding(url: str) -> list | None:
+    def success(self, host: str) -> None:
+        with self._lock:
+            delay = self._delays.get(host, 0.0) * 0.8
+            self._delays[host] = delay if delay > 0.01 else 0.0
+
+    def backoff(self, host: str, retry_after: float | None = None) -> float:
+        with self._lock:
+            delay = max(self._delays.get(host, 0.0) * 2, self.initial_backoff)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            delay = min(delay, self.max_delay)
+            self._delays[host] = delay
+            return delay
+
+
+def download_image(
+    session: requests.Session, pacer: AdaptivePacer, cache: ImageCache, url: str
+) -> bytes:
     """
-    Получает эмбеддинг изображения с помощью модели OpenCLIP.
+    Получает изображение через общий кеш с учётом адаптивной паузы и повторов.
+
+    Свежие записи кеша отдаются без обращения к сети и без паузы.
 
     Args:
+        session (requests.Session): Общая сессия с пулом соединений.
+        pacer (AdaptivePacer): Регулятор частоты запросов.
+        cache (ImageCache): Дисковый кеш изображений.
         url (str): Ссылка на изображение.
 
     Returns:
-        list | None: Список эмбеддингов изображения, либо None в случае ошибки.
+        bytes: Содержимое файла.
+
+    Raises:
+        requests.RequestException: Если скачать не удалось после MAX_RETRIES попыток.
     """
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        image = Image.open(BytesIO(response.content)).convert("RGB")
-        image_tensor = preprocess(image).unsqueeze(0)
+    cached = cache.peek(url)
+    if cached is not None:
+        return cached
+
+    host = urlparse(url).netloc
+    for attempt in range(MAX_RETRIES + 1):
+        pacer.wait(host)
+        try:
+            data = cache.get(url, session=session)
+            pacer.success(host)
+            return data
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 0
+            if status != 429 and status < 500 or attempt == MAX_RETRIES:
+                raise
+            retry_after = e.response.headers.get("Retry-After")
+            delay = pacer.backoff(
+                host, float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+            print(f"[⏸] {host} ответил {status}, пауза {delay:.1f} с")
+        except (requests.ConnectionError, requests.Timeout):
+            pacer.backoff(host)
+            if attempt == MAX_RETRIES:
+                raise
+    raise requests.HTTPError(f"Не удалось скачать {url}")
+
+
+def preprocess_image(data: bytes, preprocess) -> torch.Tensor:
+    """Декодирует изображение и применяет преобразования CLIP."""
+    image = Image.open(BytesIO(data)).convert("RGB")
+    return preprocess(image)
 
-        with torch.no_grad():
-            embedding = model.encode_image(image_tensor).squeeze().tolist()
 
-        return embedding
-    except Exception as e:
-        print(f"[!] Ошибка обработки {url}: {e}")
-        return None
+def encode_batch(model, tensors: list) -> list:
+    """
+    Кодирует пачку подготовленных изображений одним вызовом encode_image.
+
+    Returns:
+        list: Список эмбеддингов (list[float]) в порядке входных тензоров.
+    """
+    with torch.inference_mode():
+        return model.encode_image(torch.stack(tensors)).tolist()
+
+
+def _produce(memes: list, preprocess, results: queue.Queue, slots: threading.Semaphore,
+             bucket_name: str = S3_BUCKET, client=None) -> None:
+    """
+    Стадии скачивания и предобработки: пул загрузчиков передаёт байты пулу
+    предобработки, готовые тензоры складываются в очередь results.
+    Ключи объектов читаются из бакета (как в make_renditions.fetch_original),
+    внешние ссылки скачиваются через кеш с адаптивной паузой.
+    В конце в очередь кладётся None.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=DOWNLOAD_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    pacer = AdaptivePacer()
+    cache = get_image_cache()
+
+    def fetch(image: str) -> bytes:
+        if to_object_key(image, bucket_name) is not None:
+            return fetch_original(image, bucket_name, client, cache)[0]
+        return download_image(session, pacer, cache, image)
+
+    def on_preprocessed(meme_id, url, future):
+        try:
+            results.put((meme_id, url, future.result(), None))
+        except Exception as e:
+            results.put((meme_id, url, None, e))
 
+    with ThreadPoolExecutor(PREPROCESS_WORKERS) as preprocessors, \
+            ThreadPoolExecutor(DOWNLOAD_WORKERS) as downloaders:
 
-def main():
+        def on_downloaded(meme_id, url, future):
+            try:
+                data = future.result()
+            except Exception as e:
+                results.put((meme_id, url, None, e))
+                return
+            preprocessors.submit(preprocess_image, data, preprocess).add_done_callback(
+                lambda f: on_preprocessed(meme_id, url, f)
+            )
+
+        for meme_id, url in memes:
+            slots.acquire()
+            downloaders.submit(fetch, url).add_done_callback(
+                lambda f, meme_id=meme_id, url=url: on_downloaded(meme_id, url, f)
+            )
+
+    session.close()
+    results.put(None)
+
+
+def main(db_path: str = DB_PATH, bucket_name: str = S3_BUCKET, client=None) -> None:
     """
     Основная функция:
     Добавляет колонку image_embedding в базу (если её нет).
-    Получает список мемов без эмбеддинга.
-    Для каждого мема получает эмбеддинг и сохраняет в базу.
-    Делает паузы каждые BATCH_PAUSE итераций.
+    Получает список мемов без эмбеддинга: с ключом объекта в бакете
+    (после переноса картинок в S3) или со сторонней ссылкой.
+    Скачивание и предобработка идут в фоновых пулах потоков параллельно с работой модели;
+    модель получает изображения пачками по BATCH_SIZE, результаты пишутся
+    через executemany и коммитятся каждые WRITE_EVERY строк.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     try:
@@ -61,32 +203,77 @@ def main():
     except sqlite3.OperationalError:
         print("[i] Колонка image_embedding уже существует.")
 
-    cursor.execute("SELECT id, image FROM memes WHERE image IS NOT NULL AND image_embedding IS NULL")
-    memes = cursor.fetchall()
-    print(f"[i] Обработка {len(memes)} мемов...")
+    cursor.execute(
+        "SELECT id, image FROM memes WHERE image IS NOT NULL AND image_embedding IS NULL"
+    )
+    memes = [
+        (meme_id, image) for meme_id, image in cursor.fetchall()
+        if to_object_key(image, bucket_name) or image.startswith("http")
+    ]
+    print(f"[i] Обработка {len(memes)} мемов, потоков torch: {TORCH_THREADS}...")
+    if not memes:
+        conn.close()
+        return
 
-    for i, (meme_id, url) in enumerate(memes, 1):
-        print(f"→ Мем {meme_id} [{url}]")
+    model, preprocess, _ = load_clip()
+    results = queue.Queue()
+    slots = threading.Semaphore(IN_FLIGHT)
+    if client is None and any(to_object_key(image, bucket_name) for _, image in memes):
+        client = get_minio_client()
+    producer = threading.Thread(
+        target=_produce, args=(memes, preprocess, results, slots, bucket_name, client),
+        daemon=True,
+    )
+    producer.start()
 
-        embedding = get_clip_image_embedding(url)
-        if embedding:
-            cursor.execute(
-                "UPDATE memes SET image_embedding = ? WHERE id = ?",
-                (json.dumps(embedding), meme_id)
-            )
-            conn.commit()
-            print(f"[✓] Мем {meme_id} обновлён.")
-        else:
-            print(f"[✗] Пропуск мема {meme_id}.")
+    started = time.perf_counter()
+    batch, pending_rows = [], []
+    done = failed = 0
+    finished = False
 
-        if i % BATCH_PAUSE == 0:
-            print(f"[⏸] Обработано {i} мемов — пауза {PAUSE_SECONDS} секунд...\n")
-            time.sleep(PAUSE_SECONDS)
+    while not finished or batch:
+        if not finished:
+            try:
+                item = results.get(timeout=BATCH_TIMEOUT)
+            except queue.Empty:
+                item = False
+            if item is None:
+                finished = True
+            elif item:
+                slots.release()
+                meme_id, url, tensor, error = item
+                if error is not None:
+                    failed += 1
+                    print(f"[✗] Пропуск мема {meme_id} ({url}): {error}")
+                else:
+                    batch.append((meme_id, tensor))
 
-        time.sleep(0.5)  
+        if batch and (len(batch) >= BATCH_SIZE or finished or item is False):
+            try:
+                embeddings = encode_batch(model, [tensor for _, tensor in batch])
+            except Exception as e:
+                # Битый тензор или нехватка памяти на одной пачке не останавливают весь прогон:
+                # мемы пачки остаются без эмбеддинга и попадут в следующий запуск
+                failed += len(batch)
+                ids = ", ".join(str(meme_id) for meme_id, _ in batch)
+                print(f"[✗] Ошибка кодирования пачки (мемы {ids}): {e}")
+            else:
+                pending_rows.extend(
+                    (json.dumps(emb), meme_id) for (meme_id, _), emb in zip(batch, embeddings)
+                )
+                done += len(batch)
+            batch = []
+            elapsed = time.perf_counter() - started
+            print(f"[✓] Обработано {done}/{len(memes)} ({done / elapsed:.1f} изобр/с)")
+
+        if pending_rows and (len(pending_rows) >= WRITE_EVERY or finished):
+            cursor.executemany("UPDATE memes SET image_embedding = ? WHERE id = ?", pending_rows)
+            conn.commit()
+            pending_rows = []
 
+    producer.join()
     conn.close()
-    print("[✓] Всё готово.")
+    print(f"[✓] Всё готово: {done} обновлено, {failed} пропущено.")
 
 if __name__ == "__main__":
     main()
@@ -1,78 +1,132 @@
-from minio import Minio
 import json
 import os
+import sqlite3
 
-minio_client = Minio(
-    "s3.ru1.storage.beget.cloud",
-    access_key=os.getenv("MINIO_ACCESS_KEY"),
-    secret_key=os.getenv("MINIO_SECRET_KEY"),
-    secure=True
-)
+from config import S3_BUCKET
+from import_memes import content_hash
+from import_to_s3 import MANIFEST_PATH, UploadManifest
+from s3_storage import to_object_key
 
-def get_object_urls(bucket_name: str) -> dict:
-    """
-    Получает URL объектов из MinIO хранилища и возвращает их в виде словаря.
-    Получает список всех объектов в указанном бакете, сортирует их по имени
-    и генерирует публичные URL для доступа к каждому объекту.
+MEMES_PATH = os.path.join("data_base", "memes_base.json")
+DB_PATH = "memes.db"
+
+
+def image_to_key(image: str, keys: dict, bucket_name: str = S3_BUCKET) -> str:
     """
-    try:
-        objects = minio_client.list_objects(bucket_name, recursive=True)
-        sorted_objects = sorted(objects, key=lambda x: x.object_name)
-        
-        storage_links = {}
-        for obj in sorted_objects:
-            url = minio_client.presigned_get_object(bucket_name, obj.object_name)
-            file_number = obj.object_name.split('.')[0]
-            storage_links[file_number] = url
-        
-        return storage_links
-    
-    except Exception as e:
-        print(f"Ошибка при получении URL из хранилища: {e}")
-        return {}
-
-def update_json_with_links(json_file_path: str, storage_links: dict) -> bool:
+    Заменяет ссылку на картинку постоянным ключом объекта в хранилище.
+
+    Исходная ссылка ищется в манифесте загрузки (import_to_s3.py), старая
+    presigned-ссылка на объект бакета превращается в ключ объекта.
+    Ссылки, которых нет в хранилище, остаются как есть.
+
+    Args:
+        image (str): Значение поля images / image.
+        keys (dict): Исходная ссылка → ключ объекта (UploadManifest.keys()).
+        bucket_name (str): Бакет с картинками.
+
+    Returns:
+        str: Ключ объекта или исходное значение.
     """
-    Обновляет JSON файл, добавляя ссылки на изображения из MinIO.
-    Читает JSON файл построчно, находит записи с соответствующими ID
-    и добавляет/обновляет поле 'images' с presigned URL из storage_links.
+    if image in keys:
+        return keys[image]
+    return to_object_key(image, bucket_name) or image
+
+
+def update_json_with_keys(json_file_path: str, keys: dict) -> int:
     """
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
+    Переписывает поле 'images' в файле мемов на ключи объектов.
+
+    Файл читается построчно и заменяется атомарно; заголовки bulk-формата
+    и прочие строки переносятся без изменений.
 
-        updated_lines = []
-        for line in lines:
+    Args:
+        json_file_path (str): Файл мемов (JSONL или bulk-формат ES).
+        keys (dict): Исходная ссылка → ключ объекта.
+
+    Returns:
+        int: Сколько записей изменено.
+    """
+    changed = 0
+    tmp_path = f"{json_file_path}.tmp"
+    with open(json_file_path, 'r', encoding='utf-8') as src, \
+            open(tmp_path, 'w', encoding='utf-8') as dst:
+        for line in src:
             if line.startswith('{"id":'):
                 data = json.loads(line)
-                meme_id = data['id']
-                if meme_id in storage_links:
-                    data['images'] = storage_links[meme_id]
-                updated_lines.append(json.dumps(data, ensure_ascii=False))
-            else:
-                updated_lines.append(line.strip())
-        
-        with open(json_file_path, 'w', encoding='utf-8') as f:
-            for line in updated_lines:
-                f.write(line + '\n')
-        
-        return True
-    
-    except Exception as e:
-        print(f"Ошибка при обновлении JSON: {e}")
-        return False
-
-def main() -> None:
+                image = data.get('images')
+                if image:
+                    key = image_to_key(image, keys)
+                    if key != image:
+                        data['images'] = key
+                        changed += 1
+                        line = json.dumps(data, ensure_ascii=False) + '\n'
+            dst.write(line)
+    os.replace(tmp_path, json_file_path)
+    return changed
+
+
+def update_db_with_keys(db_path: str, keys: dict) -> int:
     """
-    Основная функция для выполнения скрипта.
-    Получает ссылки на объекты из хранилища и обновляет JSON файл
-    этими ссылками. Выводит результат выполнения операций.
+    Переписывает колонку image в базе на ключи объектов (и пересчитывает content_hash).
+
+    Args:
+        db_path (str): База SQLite.
+        keys (dict): Исходная ссылка → ключ объекта.
+
+    Returns:
+        int: Сколько строк изменено.
     """
-    storage_links = get_object_urls(bucket_name="25e18a90d3c1-memes-base")
-    
-    if storage_links:
-        update_json_with_links(json_file_path=os.path.join("data_base", "memes_base.json"), storage_links=storage_links)
+    conn = sqlite3.connect(db_path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(memes)")}
+    has_hash = "content_hash" in columns
+    updates = []
+    for meme_id, name, image, description, tags in conn.execute(
+        "SELECT id, name, image, description, tags FROM memes"
+    ):
+        key = image_to_key(image, keys) if image else image
+        if key != image:
+            row_hash = content_hash((name, key, description, tags)) if has_hash else None
+            updates.append((key, row_hash, meme_id))
+    with conn:
+        if has_hash:
+            conn.executemany(
+                "UPDATE memes SET image = ?, content_hash = ? WHERE id = ?", updates
+            )
+        else:
+            conn.executemany(
+                "UPDATE memes SET image = ? WHERE id = ?", [(k, i) for k, _, i in updates]
+            )
+    conn.close()
+    return len(updates)
+
+
+def main(json_file_path: str = MEMES_PATH, db_path: str | None = DB_PATH,
+         manifest_path: str = MANIFEST_PATH) -> None:
+    """
+    Переводит файл мемов и базу с presigned-ссылок на постоянные ключи объектов.
+
+    Ссылки на картинки бот теперь подписывает сам в момент отправки
+    (s3_storage.PresignedUrlResolver), поэтому в данных хранятся только ключи,
+    а не ссылки, которые истекают через неделю.
+    """
+    keys = UploadManifest(manifest_path).keys()
+    print(f"[i] Ключей в манифесте загрузки: {len(keys)}")
+    changed = update_json_with_keys(json_file_path, keys)
+    print(f"[+] {json_file_path}: обновлено записей: {changed}")
+    if db_path and os.path.exists(db_path):
+        changed = update_db_with_keys(db_path, keys)
+        print(f"[+] {db_path}: обновлено строк: {changed}")
+    print("[✓] Готово.")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Замена ссылок на картинки постоянными ключами объектов S3"
+    )
+    parser.add_argument("--input", default=MEMES_PATH)
+    parser.add_argument("--db", default=DB_PATH, help="база SQLite ('' — не обновлять)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    args = parser.parse_args()
+    main(json_file_path=args.input, db_path=args.db, manifest_path=args.manifest)
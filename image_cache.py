@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+import requests
+
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL
+from metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(url: str) -> str:
+    """
+    Нормализует URL для ключа кеша.
+
+    Параметры подписи S3 (X-Amz-*) меняются при каждой генерации presigned-ссылки,
+    но указывают на тот же объект, поэтому в ключ не входят.
+    """
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith("x-amz-")]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+class ImageCache:
+    """
+    Общий дисковый кеш изображений мемов.
+
+    Содержимое хранится по SHA-256 (одинаковые картинки по разным ссылкам занимают
+    место один раз), индекс URL → хеш с ETag/Last-Modified лежит в SQLite рядом.
+    Устаревшие записи перепроверяются условным запросом (If-None-Match /
+    If-Modified-Since): при ответе 304 тело не скачивается. При превышении
+    max_bytes удаляются давно не использованные записи (LRU).
+
+    Кеш можно использовать из нескольких потоков и процессов одновременно.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = IMAGE_CACHE_DIR,
+        max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+        ttl: float = IMAGE_CACHE_TTL,
+        timeout: float = 10,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.db"), check_same_thread=False, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                checked_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def blob_path(self, sha256: str) -> str:
+        """Путь к файлу с содержимым по его хешу."""
+        return os.path.join(self.cache_dir, "objects", sha256[:2], sha256)
+
+    def _lookup(self, url: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, etag, last_modified, content_type, checked_at "
+                "FROM entries WHERE url = ?",
+                (cache_key(url),),
+            ).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return dict(zip(("sha256", "etag", "last_modified", "content_type", "checked_at"), row))
+
+    def _read(self, entry: dict) -> bytes:
+        with open(self.blob_path(entry["sha256"]), "rb") as f:
+            return f.read()
+
+    def _touch(self, url: str, checked: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            if checked:
+                self._conn.execute(
+                    "UPDATE entries SET accessed_at = ?, checked_at = ? WHERE url = ?",
+                    (now, now, cache_key(url)),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE url = ?", (now, cache_key(url))
+                )
+            self._conn.commit()
+
+    def _is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["checked_at"] < self.ttl
+
+    @staticmethod
+    def _conditional_headers(entry: dict | None) -> dict:
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _store(self, url: str, data: bytes, headers) -> None:
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT sha256 FROM entries WHERE url = ?", (cache_key(url),)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, size) VALUES (?, ?)", (sha256, len(data))
+            )
+            self._conn.execute(
+                """
+                INSERT INTO entries
+                    (url, sha256, etag, last_modified, content_type, checked_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    sha256 = excluded.sha256,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_type = excluded.content_type,
+                    checked_at = excluded.checked_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (
+                    cache_key(url),
+                    sha256,
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    headers.get("Content-Type"),
+                    now,
+                    now,
+                ),
+            )
+            # Содержимое по ссылке изменилось: старый файл больше не нужен, если на него
+            # не ссылаются другие записи
+            if previous and previous[0] != sha256:
+                self._drop_blob(previous[0])
+            self._conn.commit()
+            self._evict()
+
+    def _drop_blob(self, sha256: str) -> int:
+        """
+        Удаляет содержимое, на которое не ссылается ни одна запись.
+
+        Returns:
+            int: Сколько байт освобождено (0, если содержимое ещё используется).
+        """
+        if self._conn.execute(
+            "SELECT 1 FROM entries WHERE sha256 = ? LIMIT 1", (sha256,)
+        ).fetchone():
+            return 0
+        size = self._conn.execute("SELECT size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+        try:
+            os.remove(self.blob_path(sha256))
+        except FileNotFoundError:
+            pass
+        return size[0] if size else 0
+
+    def _evict(self) -> None:
+        """
+        Удаляет содержимое без записей, затем самые давно использованные записи,
+        пока кеш больше max_bytes.
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for (sha256,) in self._conn.execute(
+            "SELECT sha256 FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM entries)"
+        ).fetchall():
+            total -= self._drop_blob(sha256)
+        if total > self.max_bytes:
+            for url, sha256 in self._conn.execute(
+                "SELECT url, sha256 FROM entries ORDER BY accessed_at"
+            ).fetchall():
+                self._conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+                total -= self._drop_blob(sha256)
+                if total <= self.max_bytes:
+                    break
+        self._conn.commit()
+
+    def peek(self, url: str) -> bytes | None:
+        """
+        Возвращает содержимое из кеша без обращения к сети, если запись свежая.
+
+        Args:
+            url (str): Ссылка на изображение.
+
+        Returns:
+            bytes | None: Содержимое или None, если записи нет или она устарела.
+        """
+        entry = self._lookup(url)
+        if entry is None or not self._is_fresh(entry):
+            return None
+        self.hits += 1
+        self._touch(url)
+        return self._read(entry)
+
+    def get(self, url: str, session: requests.Session | None = None) -> bytes:
+        """
+        Возвращает изображение: из кеша, после условной перепроверки или скачав заново.
+
+        Args:
+            url (str): Ссылка на изображение.
+            session (requests.Session | None): Сессия для запросов (пул соединений вызывающего).
+
+        Returns:
+            bytes: Содержимое изображения.
+
+        Raises:
+            requests.RequestException: Ошибка сети или HTTP-статус >= 400.
+        """
+        entry = self._lookup(url)
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            self._touch(url)
+            return self._read(entry)
+
+        response = (session or requests).get(
+            url, headers=self._conditional_headers(entry), timeout=self.timeout
+        )
+        if response.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            self._touch(url, checked=True)
+            return self._read(entry)
+        response.raise_for_status()
+        self.misses += 1
+        self._store(url, response.content, response.headers)
+        return response.content
+
+    async def aget(self, url: str, session: aiohttp.ClientSession | None = None) -> bytes:
+        """
+        Асинхронный вариант get для хендлеров бота и asyncio-пайплайнов.
+
+        Работа с индексом и диском выполняется в пуле потоков, чтобы не блокировать цикл событий.
+
+        Raises:
+            aiohttp.ClientError: Ошибка сети или HTTP-статус >= 400.
+        """
+        entry = await asyncio.to_thread(self._lookup, url)
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            await asyncio.to_thread(self._touch, url)
+            return await asyncio.to_thread(self._read, entry)
+
+        own_session = session is None
+        if own_session:
+            session = aiohttp.ClientSession()
+        try:
+            async with session.get(
+                url,
+                headers=self._conditional_headers(entry),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as response:
+                if response.status == 304 and entry is not None:
+                    self.revalidated += 1
+                    await asyncio.to_thread(self._touch, url, True)
+                    return await asyncio.to_thread(self._read, entry)
+                response.raise_for_status()
+                data = await response.read()
+                headers = response.headers.copy()
+        finally:
+            if own_session:
+                await session.close()
+        self.misses += 1
+        await asyncio.to_thread(self._store, url, data, headers)
+        return data
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_default_cache = None
+
+
+def get_image_cache() -> ImageCache:
+    """Возвращает общий для процесса экземпляр кеша с настройками из окружения."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ImageCache()
+    return _default_cache
+
+
+def _default_cache_stats() -> dict:
+    if _default_cache is None:
+        return {}
+    return {
+        "hit": _default_cache.hits,
+        "miss": _default_cache.misses,
+        "revalidated": _default_cache.revalidated,
+    }
+
+
+register_cache("image", _default_cache_stats)
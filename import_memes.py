@@ -1,73 +1,226 @@
 import sqlite3
 import json
+import hashlib
+import time
+from itertools import islice
+from typing import Iterator, Tuple
 
-def update_database_from_jsonl(db_path: str, jsonl_path: str):
-    """
-    Читает JSONL файл и обновляет базу данных SQLite.
+DB_PATH = 'memes.db'
+JSON_PATH = './data_base/memes_base.json'
 
-    Создает таблицу 'memes', если она не существует, а затем
-    вставляет или обновляет записи на основе данных из файла.
+BATCH_SIZE = 5000       # записей в одной транзакции
+LOOKUP_CHUNK = 900      # id в одном SELECT ... IN (...) (лимит переменных старых SQLite)
+
+# Строки-заголовки bulk-формата Elasticsearch: {"index": {"_index": ..., "_id": ...}}
+BULK_ACTIONS = ("index", "create", "update", "delete")
+
+CONTENT_FIELDS = ("name", "image", "description", "tags")
+
+# Один декодер на весь импорт: json.loads на каждой строке заметно дороже
+_decode = json.JSONDecoder().decode
 
-    Args:
-        db_path (str): Путь к файлу базы данных SQLite.
-        jsonl_path (str): Путь к файлу с данными в формате JSON Lines.
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    cursor.execute('''
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Создаёт таблицу memes и добавляет колонки content_hash и rendition в старые базы."""
+    conn.execute('''
     CREATE TABLE IF NOT EXISTS memes (
         id INTEGER PRIMARY KEY,
         name TEXT,
         image TEXT,
         description TEXT,
         tags TEXT,
-        embedding TEXT
+        embedding TEXT,
+        content_hash TEXT,
+        rendition TEXT
     );
     ''')
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(memes)")}
+    for column in ("content_hash", "rendition"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE memes ADD COLUMN {column} TEXT")
+            print(f"[+] Колонка '{column}' добавлена.")
 
-    try:
-        with open(jsonl_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        print(f"[!] Ошибка: Файл не найден по пути {jsonl_path}")
-        conn.close()
-        return
 
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if not line:
+def _tune_connection(conn: sqlite3.Connection) -> None:
+    """
+    Прагмы для массовой записи: WAL не блокирует читателей (бота) на время импорта,
+    synchronous=NORMAL в WAL не теряет целостность, только последние транзакции
+    при сбое питания — импорт можно просто перезапустить.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 МБ страничного кеша
+
+
+def content_hash(row: tuple) -> str:
+    """
+    Хеш содержимого мема (name, image, description, tags).
+
+    Args:
+        row (tuple): Значения полей в порядке CONTENT_FIELDS.
+
+    Returns:
+        str: Шестнадцатеричный blake2b-хеш.
+    """
+    payload = "\x1f".join(map(str, row))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_memes(lines, stats: dict | None = None) -> Iterator[Tuple[int, tuple]]:
+    """
+    Потоково разбирает файл мемов: обычный JSONL или bulk-формат Elasticsearch.
+
+    Строки-заголовки bulk ({"index": {...}}) не считаются ошибками: их _id
+    используется как id документа, если в самом документе поля id нет.
+    Некорректные строки выводятся в лог и пропускаются.
+
+    Args:
+        lines: Итерируемый источник строк (открытый файл).
+        stats (dict | None): Если передан, в stats["errors"] считаются пропущенные строки.
+
+    Yields:
+        Tuple[int, tuple]: Номер строки и (id, name, image, description, tags).
+    """
+    pending_id = None
+    for line_no, line in enumerate(lines, start=1):
+        if not line or line.isspace():
             continue
         try:
-            meme = json.loads(line)
-            image = meme.get('images', '-')
-
-            cursor.execute('''
-                INSERT INTO memes (id, name, image, description, tags)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    name = excluded.name,
-                    image = excluded.image,
-                    description = excluded.description,
-                    tags = excluded.tags
-            ''', (
-                int(meme['id']),
+            meme = _decode(line)
+            if not isinstance(meme, dict):
+                raise ValueError("ожидался JSON-объект")
+            if len(meme) == 1:
+                action, meta = next(iter(meme.items()))
+                if action in BULK_ACTIONS and isinstance(meta, dict):
+                    pending_id = None if action == "delete" else meta.get("_id")
+                    continue
+            meme_id = meme["id"] if "id" in meme else pending_id
+            if meme_id is None:
+                raise KeyError("id")
+            pending_id = None
+            yield line_no, (
+                int(meme_id),
                 meme.get('name', ''),
-                image,
+                meme.get('images', '-'),
                 meme.get('description', ''),
-                meme.get('tags', '')
-            ))
+                meme.get('tags', ''),
+            )
+        except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+            pending_id = None
+            if stats is not None:
+                stats["errors"] += 1
+            print(f"[!] Ошибка парсинга или отсутствия ключа на строке {line_no}: {e}")
+
+
+def _existing_hashes(conn: sqlite3.Connection, ids: list) -> dict:
+    hashes = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[start:start + LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        hashes.update(conn.execute(
+            f"SELECT id, content_hash FROM memes WHERE id IN ({placeholders})", chunk
+        ))
+    return hashes
+
+
+def _apply_batch(conn: sqlite3.Connection, batch: list, stats: dict) -> None:
+    """
+    Записывает пачку одной транзакцией: новые строки — INSERT, изменившиеся — UPDATE,
+    строки с тем же content_hash не трогает. Колонки эмбеддингов не меняются,
+    облегчённая копия картинки (rendition) сбрасывается, если сменилась картинка.
+    """
+    # Повтор id внутри пачки: побеждает последняя запись, как при построчной вставке
+    rows = {}
+    for _, row in batch:
+        rows[row[0]] = row + (content_hash(row[1:]),)
+    stats["duplicates"] += len(batch) - len(rows)
+
+    existing = _existing_hashes(conn, list(rows))
+    inserts, updates = [], []
+    for meme_id, row in rows.items():
+        if meme_id not in existing:
+            inserts.append(row)
+        elif existing[meme_id] != row[-1]:
+            updates.append(row[1:] + (row[2], meme_id))
+        else:
+            stats["unchanged"] += 1
+
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(
+            "INSERT INTO memes (id, name, image, description, tags, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            inserts,
+        )
+        conn.executemany(
+            "UPDATE memes SET name = ?, image = ?, description = ?, tags = ?, content_hash = ?, "
+            "rendition = CASE WHEN image IS ? THEN rendition END WHERE id = ?",
+            updates,
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    stats["inserted"] += len(inserts)
+    stats["updated"] += len(updates)
+
+
+def update_database_from_jsonl(db_path: str, jsonl_path: str, batch_size: int = BATCH_SIZE):
+    """
+    Потоково импортирует файл мемов (JSONL или bulk-формат ES) в базу SQLite.
 
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Ошибка парсинга или отсутствия ключа на строке {i + 1}: {e}")
-        except Exception as e:
-            print(f"Неизвестная ошибка на строке {i + 1}: {e}")
+    Создает таблицу 'memes', если она не существует. Файл читается построчно,
+    записи пишутся пачками по batch_size через executemany, каждая пачка —
+    отдельная транзакция. Память не зависит от размера файла.
+
+    Args:
+        db_path (str): Путь к файлу базы данных SQLite.
+        jsonl_path (str): Путь к файлу с данными.
+        batch_size (int): Записей в одной транзакции.
+
+    Returns:
+        dict | None: Статистика: inserted, updated, unchanged, duplicates, errors,
+            elapsed; None, если файл не найден.
+    """
+    try:
+        f = open(jsonl_path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        print(f"[!] Ошибка: Файл не найден по пути {jsonl_path}")
+        return None
+
+    # isolation_level=None: транзакциями управляем сами (BEGIN/COMMIT на пачку)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0, "errors": 0}
+    started = time.perf_counter()
+    try:
+        _tune_connection(conn)
+        ensure_schema(conn)
+        with f:
+            records = iter_memes(f, stats)
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                _apply_batch(conn, batch, stats)
+    finally:
+        conn.close()
+
+    stats["elapsed"] = time.perf_counter() - started
+    print(
+        f"[✓] Готово: добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+        f"без изменений {stats['unchanged']}, ошибок {stats['errors']} "
+        f"за {stats['elapsed']:.2f} с"
+    )
+    return stats
 
-    conn.commit()
-    conn.close()
-    print("Готово: база обновлена")
 
 if __name__ == "__main__":
-    DB_PATH = 'memes.db'
-    JSON_PATH = './data_base/memes_base.json'
-    update_database_from_jsonl(db_path=DB_PATH, jsonl_path=JSON_PATH)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Импорт мемов из JSONL / bulk-файла в SQLite")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--input", default=JSON_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    update_database_from_jsonl(db_path=args.db, jsonl_path=args.input, batch_size=args.batch_size)
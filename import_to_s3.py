@@ -1,74 +1,199 @@
-from minio import Minio
-import requests
-import os
-from urllib.parse import urlparse
+import io
 import json
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from dotenv import load_dotenv
 
+from config import S3_BUCKET
+from image_cache import get_image_cache
+from import_memes import iter_memes
+from s3_storage import MULTIPART_PART_SIZE, get_minio_client, object_key, object_matches
+
 load_dotenv()
 
-minio_client = Minio(
-    "s3.ru1.storage.beget.cloud",
-    access_key=os.getenv("MINIO_ACCESS_KEY"),
-    secret_key=os.getenv("MINIO_SECRET_KEY"),
-    secure=True
-)
+MEMES_PATH = os.path.join("data_base", "memes_base.json")
+MANIFEST_PATH = "s3_manifest.jsonl"
+
+UPLOAD_WORKERS = 8      # одновременных скачиваний/загрузок
+PROGRESS_EVERY = 5.0    # секунд между строками прогресса
 
-def upload_with_minio(url: str, bucket_name: str, object_name: str) -> bool:
-    """
-    Загружает файл по URL в хранилище
-    Скачивает файл по указанному URL и загружает его в указанный бакет
-    с заданным именем объекта. Возвращает статус операции (True/False)
-    """
 
-    try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        minio_client.put_object(
-            bucket_name,
-            object_name,
-            response.raw,
-            length=int(response.headers.get('content-length', 0)),
-            content_type=response.headers.get('content-type')
-        )
-        return True
-    except Exception as e:
-        print(f"Ошибка при загрузке {url}: {e}")
-        return False
-
-def process_image_urls(file_path: str, bucket_name: str) -> None:
+class UploadManifest:
     """
-    Обрабатывает файл с URL изображений и загружает их в хранилище
-    Читает JSON-файл, содержащий URL изображений, извлекает ссылки на изображения
-    и загружает каждое изображение в указанный бакет. Имена объектов
-    формируются автоматически на основе порядка изображений в файле.
+    Журнал загрузок: строка JSON на каждый обработанный URL (done или failed).
+
+    Файл только дописывается; при чтении побеждает последняя строка для URL.
+    Прерванный запуск продолжается с места остановки: URL со статусом done
+    повторно не скачиваются и не проверяются, failed — повторяются.
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            image_urls = []
-            for line in f:
-                line = line.strip()
-                if line and line.startswith('{"id":'):
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
                     try:
-                        data = json.loads(line)
-                        if 'images' in data and data['images']:
-                            image_urls.append(data['images'])
+                        entry = json.loads(line)
                     except json.JSONDecodeError:
                         continue
-        
-        for index, url in enumerate(image_urls):
-            parsed = urlparse(url)
-            filename = os.path.basename(parsed.path)
-            ext = os.path.splitext(filename)[1] or '.jpg'
-            
-            object_name = f"{index}{ext}"
-            upload_with_minio(url, bucket_name, object_name)
-
-    except Exception as e:
-        print(f"Ошибка при обработке файла: {e}")
-
-process_image_urls(
-    file_path=os.path.join("data_base", "memes_base.json"),
-    bucket_name="25e18a90d3c1-memes-base"
-)
+                    self.entries[entry["url"]] = entry
+
+    def is_done(self, url: str) -> bool:
+        entry = self.entries.get(url)
+        return entry is not None and entry["status"] == "done"
+
+    def record(self, url: str, status: str, **fields) -> None:
+        entry = {"url": url, "status": status, **fields}
+        with self._lock:
+            self.entries[url] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def keys(self) -> dict:
+        """Соответствие URL → ключ объекта для успешно загруженных картинок."""
+        return {url: e["key"] for url, e in self.entries.items() if e["status"] == "done"}
+
+
+def read_image_urls(file_path: str) -> list:
+    """
+    Собирает уникальные ссылки на картинки из файла мемов (JSONL или bulk-формат ES).
+
+    Args:
+        file_path (str): Путь к файлу мемов.
+
+    Returns:
+        list: Ссылки в порядке первого появления.
+    """
+    urls = {}
+    with open(file_path, "r", encoding="utf-8") as f:
+        for _, (_, _, image, _, _) in iter_memes(f):
+            if image and image != '-' and image.startswith("http"):
+                urls.setdefault(image, None)
+    return list(urls)
+
+
+def upload_image(url: str, bucket_name: str, client=None, cache=None,
+                 part_size: int = MULTIPART_PART_SIZE) -> dict:
+    """
+    Загружает одну картинку в хранилище, если её там ещё нет.
+
+    Картинка берётся из общего кеша изображений (скачивается только при
+    необходимости), ключ объекта — хеш содержимого (s3_storage.object_key).
+
+    Args:
+        url (str): Исходная ссылка на картинку.
+        bucket_name (str): Бакет.
+        client: Клиент MinIO (по умолчанию общий из s3_storage).
+        cache: Кеш изображений (по умолчанию общий из image_cache).
+        part_size (int): Размер части multipart-загрузки.
+
+    Returns:
+        dict: key, size, uploaded (False — объект уже был в бакете).
+    """
+    client = client or get_minio_client()
+    data = (cache or get_image_cache()).get(url)
+    key = object_key(data, url)
+    if object_matches(client, bucket_name, key, data, part_size):
+        return {"key": key, "size": len(data), "uploaded": False}
+    client.put_object(
+        bucket_name,
+        key,
+        io.BytesIO(data),
+        length=len(data),
+        content_type=mimetypes.guess_type(key)[0] or 'application/octet-stream',
+        part_size=part_size,
+    )
+    return {"key": key, "size": len(data), "uploaded": True}
+
+
+def process_image_urls(file_path: str = MEMES_PATH, bucket_name: str = S3_BUCKET,
+                       manifest_path: str = MANIFEST_PATH, workers: int = UPLOAD_WORKERS,
+                       client=None, cache=None, part_size: int = MULTIPART_PART_SIZE) -> dict:
+    """
+    Загружает в хранилище все картинки из файла мемов.
+
+    Загрузки идут параллельно (не больше workers одновременно, в очереди —
+    не больше 2 * workers задач), каждый результат сразу пишется в манифест.
+
+    Args:
+        file_path (str): Файл мемов.
+        bucket_name (str): Бакет.
+        manifest_path (str): Манифест загрузок (UploadManifest).
+        workers (int): Число потоков.
+        client: Клиент MinIO (по умолчанию общий).
+        cache: Кеш изображений (по умолчанию общий).
+        part_size (int): Размер части multipart-загрузки.
+
+    Returns:
+        dict: uploaded, existing (уже были в бакете), resumed (done в манифесте),
+            failed, bytes, elapsed.
+    """
+    manifest = UploadManifest(manifest_path)
+    urls = read_image_urls(file_path)
+    pending = [url for url in urls if not manifest.is_done(url)]
+    stats = {"uploaded": 0, "existing": 0, "resumed": len(urls) - len(pending),
+             "failed": 0, "bytes": 0}
+    print(f"[i] Картинок: {len(urls)}, уже загружено по манифесту: {stats['resumed']}")
+
+    started = last_report = time.perf_counter()
+    queue = iter(pending)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for url in queue:
+                future = executor.submit(upload_image, url, bucket_name, client, cache, part_size)
+                in_flight[future] = url
+                if len(in_flight) >= workers * 2:
+                    break
+            if not in_flight:
+                break
+
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                url = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    manifest.record(url, "failed", error=f"{type(e).__name__}: {e}")
+                    print(f"[!] Ошибка при загрузке {url}: {e}")
+                    continue
+                stats["uploaded" if result["uploaded"] else "existing"] += 1
+                if result["uploaded"]:
+                    stats["bytes"] += result["size"]
+                manifest.record(url, "done", key=result["key"], size=result["size"])
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY:
+                done = stats["uploaded"] + stats["existing"] + stats["failed"]
+                print(f"[i] {done}/{len(pending)} обработано")
+                last_report = now
+
+    stats["elapsed"] = time.perf_counter() - started
+    print(
+        f"[✓] Готово: загружено {stats['uploaded']} ({stats['bytes'] / 2**20:.1f} МБ), "
+        f"уже в бакете {stats['existing']}, ошибок {stats['failed']} "
+        f"за {stats['elapsed']:.1f} с"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Загрузка картинок мемов в S3")
+    parser.add_argument("--input", default=MEMES_PATH)
+    parser.add_argument("--bucket", default=S3_BUCKET)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS)
+    args = parser.parse_args()
+    process_image_urls(
+        file_path=args.input, bucket_name=args.bucket, manifest_path=args.manifest,
+        workers=args.workers,
+    )
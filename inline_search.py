@@ -0,0 +1,213 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Callable
+
+from config import (
+    INLINE_BUDGET_MS,
+    INLINE_CACHE_SIZE,
+    INLINE_CACHE_TTL,
+    INLINE_DEBOUNCE_MS,
+)
+from metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Ключ кеша: нижний регистр и одиночные пробелы."""
+    return " ".join(query.casefold().split())
+
+
+class PrefixCache:
+    """
+    LRU-кеш результатов инлайн-поиска по нормализованному запросу со сроком жизни.
+
+    Запросы приходят на каждое нажатие клавиши, поэтому в кеше оказываются
+    все префиксы набранного текста; longest_prefix() отдаёт результаты
+    самого длинного закешированного префикса, когда на полный запрос
+    не хватает времени.
+    """
+
+    def __init__(self, max_entries: int = INLINE_CACHE_SIZE, ttl: float = INLINE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        ids, expires = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return ids
+
+    def put(self, key: str, ids: list) -> None:
+        self._entries[key] = (tuple(ids), time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def longest_prefix(self, key: str):
+        """Результаты самого длинного закешированного префикса key (без самого key)."""
+        for end in range(len(key) - 1, 0, -1):
+            ids = self.get(key[:end])
+            if ids:
+                return ids
+        return None
+
+
+class InlineSearch:
+    """
+    Быстрый путь ответа на инлайн-запросы.
+
+    1. Ответ из кеша по запросу — сразу, без паузы и поиска.
+    2. Иначе пауза debounce: если пользователь за это время набрал следующий
+       символ, устаревший запрос не ищется и не получает ответа.
+    3. Одинаковые запросы разных пользователей ждут один поиск (search
+       выполняется в пуле потоков executor).
+    4. Если поиск не уложился в budget (от прихода запроса), отдаются
+       результаты самого длинного закешированного префикса с пометкой
+       «неполный»; поиск доигрывает в фоне и заполняет кеш.
+    """
+
+    def __init__(self, search: Callable[[str], list], debounce: float = INLINE_DEBOUNCE_MS / 1000,
+                 budget: float = INLINE_BUDGET_MS / 1000, cache: PrefixCache | None = None,
+                 executor: Executor | None = None):
+        """
+        Args:
+            search (Callable): Синхронная функция запрос → список id мемов.
+            debounce (float): Пауза перед поиском, секунды.
+            budget (float): Бюджет задержки ответа, секунды.
+            cache (PrefixCache | None): Кеш результатов.
+            executor (Executor | None): Пул для search; None — пул цикла событий по умолчанию.
+        """
+        self.search = search
+        self.executor = executor
+        self.debounce = debounce
+        self.budget = budget
+        self.cache = cache or PrefixCache()
+        self.hits = 0
+        self.misses = 0
+        self.superseded = 0
+        self.partial = 0
+        self._latest = {}
+        self._inflight = {}
+
+    async def _run(self, key: str):
+        try:
+            ids = await asyncio.get_running_loop().run_in_executor(
+                self.executor, contextvars.copy_context().run, self.search, key
+            )
+        except Exception as e:
+            logger.error(f"Ошибка инлайн-поиска '{key}': {e}")
+            return None
+        finally:
+            self._inflight.pop(key, None)
+        self.cache.put(key, ids)
+        return tuple(ids)
+
+    async def resolve(self, user_id: int, query: str):
+        """
+        Находит мемы для инлайн-запроса пользователя.
+
+        Args:
+            user_id (int): Пользователь Telegram.
+            query (str): Текст запроса.
+
+        Returns:
+            tuple | None: (id мемов, полный ли ответ) или None, если запрос
+                устарел — пользователь уже набрал следующий.
+        """
+        started = time.monotonic()
+        key = normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached, True
+
+        token = object()
+        self._latest[user_id] = token
+        try:
+            await asyncio.sleep(self.debounce)
+            if self._latest.get(user_id) is not token:
+                self.superseded += 1
+                return None
+
+            self.misses += 1
+            task = self._inflight.get(key)
+            if task is None:
+                task = self._inflight[key] = asyncio.ensure_future(self._run(key))
+            remaining = self.budget - (time.monotonic() - started)
+            try:
+                ids = await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+            except asyncio.TimeoutError:
+                ids = None
+            if ids is None:
+                self.partial += 1
+                return self.cache.longest_prefix(key) or (), False
+            if self._latest.get(user_id) is not token:
+                self.superseded += 1
+                return None
+            return ids, True
+        finally:
+            if self._latest.get(user_id) is token:
+                del self._latest[user_id]
+
+    def stats(self) -> dict:
+        return {"hit": self.hits, "miss": self.misses, "superseded": self.superseded,
+                "partial": self.partial}
+
+
+class FileIdRegistry:
+    """
+    file_id фотографий, которые бот уже отправлял: id мема → file_id.
+
+    Инлайн-ответ с file_id (InlineQueryResultCachedPhoto) Telegram не скачивает
+    по ссылке заново.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def remember(self, meme_id: int, message) -> None:
+        """Запоминает file_id самого большого размера фото из отправленного сообщения."""
+        photos = getattr(message, "photo", None)
+        if isinstance(photos, list) and photos:
+            with self._lock:
+                self._ids[meme_id] = photos[-1].file_id
+
+    def get(self, meme_id: int) -> str | None:
+        return self._ids.get(meme_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+file_ids = FileIdRegistry()
+
+_default_search = None
+
+
+def get_inline_search(search: Callable[[str], list] | None = None,
+                      executor: Executor | None = None) -> InlineSearch:
+    """Возвращает общий для процесса InlineSearch (search и executor нужны при первом вызове)."""
+    global _default_search
+    if _default_search is None:
+        _default_search = InlineSearch(search, executor=executor)
+    return _default_search
+
+
+def _default_search_stats() -> dict:
+    return _default_search.stats() if _default_search is not None else {}
+
+
+register_cache("inline", _default_search_stats)
@@ -0,0 +1,287 @@
+import io
+import mimetypes
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+from config import (
+    RENDITION_FORMAT,
+    RENDITION_MAX_BYTES,
+    RENDITION_MAX_SIDE,
+    RENDITION_QUALITY,
+    S3_BUCKET,
+)
+from image_cache import get_image_cache
+from import_memes import DB_PATH, ensure_schema
+from s3_storage import get_minio_client, object_key, object_matches, to_object_key
+
+load_dotenv()
+
+RENDITION_SUFFIX = ".tg"     # ab/ab12...ef.png → ab/ab12...ef.tg.jpg
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+CHUNK_SIZE = 64              # картинок между записями в базу
+FETCH_WORKERS = 8            # одновременных скачиваний/загрузок
+MIN_QUALITY = 50             # ниже качество не опускается, дальше уменьшается размер
+SHRINK_STEP = 0.75
+
+
+def _flatten(image: Image.Image, fmt: str) -> Image.Image:
+    """Приводит режим к поддерживаемому форматом; прозрачность для JPEG — на белом фоне."""
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+    if has_alpha:
+        image = image.convert("RGBA")
+        if fmt == "WEBP":
+            return image
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render(data: bytes, fmt: str = RENDITION_FORMAT, max_side: int = RENDITION_MAX_SIDE,
+           quality: int = RENDITION_QUALITY, max_bytes: int = RENDITION_MAX_BYTES) -> bytes | None:
+    """
+    Готовит облегчённую копию картинки для отправки в Telegram.
+
+    Картинка поворачивается по EXIF, уменьшается до max_side по длинной стороне
+    и кодируется с качеством quality; если файл больше max_bytes, качество
+    снижается до MIN_QUALITY, затем уменьшается размер. У анимаций берётся
+    первый кадр (send_photo всё равно отправляет статичную картинку).
+
+    Args:
+        data (bytes): Исходное изображение.
+        fmt (str): "JPEG" или "WEBP".
+        max_side (int): Максимальная длинная сторона, пикселей.
+        quality (int): Начальное качество кодирования.
+        max_bytes (int): Потолок размера результата.
+
+    Returns:
+        bytes | None: Закодированная копия; None, если исходник уже JPEG
+            нужного размера и копия не нужна.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        if (fmt == "JPEG" and source.format == "JPEG" and max(source.size) <= max_side
+                and len(data) <= max_bytes):
+            return None
+        image = _flatten(ImageOps.exif_transpose(source), fmt)
+
+    side = max_side
+    while True:
+        if max(image.size) > side:
+            image.thumbnail((side, side), Image.Resampling.LANCZOS)
+        for q in range(quality, MIN_QUALITY - 1, -10):
+            out = io.BytesIO()
+            image.save(out, format=fmt, quality=q, optimize=fmt == "JPEG")
+            if out.tell() <= max_bytes:
+                return out.getvalue()
+        if side <= 64:
+            return out.getvalue()
+        side = int(max(image.size) * SHRINK_STEP)
+
+
+def _render_job(data: bytes, **params) -> tuple:
+    """Обёртка для пула процессов: ошибка возвращается, а не прерывает map."""
+    try:
+        return render(data, **params), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def rendition_key(source_key: str, fmt: str = RENDITION_FORMAT) -> str:
+    """Ключ облегчённой копии рядом с оригиналом: тот же путь, суффикс .tg и новое расширение."""
+    return f"{os.path.splitext(source_key)[0]}{RENDITION_SUFFIX}.{FORMAT_EXTENSIONS[fmt]}"
+
+
+def fetch_original(image: str, bucket_name: str, client, cache) -> tuple:
+    """
+    Получает исходную картинку мема.
+
+    Объект хранилища читается из бакета, внешняя ссылка — через общий кеш
+    изображений; для неё ключ строится по содержимому, как при загрузке в S3.
+
+    Returns:
+        tuple: (bytes, ключ оригинала).
+    """
+    key = to_object_key(image, bucket_name)
+    if key is None:
+        data = cache.get(image)
+        return data, object_key(data, image)
+    response = client.get_object(bucket_name, key)
+    try:
+        return response.read(), key
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _fetch(image: str, bucket_name: str, client, cache) -> tuple:
+    try:
+        return fetch_original(image, bucket_name, client, cache) + (None,)
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def _store(client, bucket_name: str, key: str, data: bytes) -> None:
+    """Загружает копию в бакет, если там ещё нет такого же объекта."""
+    if object_matches(client, bucket_name, key, data):
+        return
+    client.put_object(
+        bucket_name,
+        key,
+        io.BytesIO(data),
+        length=len(data),
+        content_type=mimetypes.guess_type(key)[0] or 'application/octet-stream',
+    )
+
+
+def _store_safe(client, bucket_name: str, key: str, data: bytes) -> str | None:
+    try:
+        _store(client, bucket_name, key, data)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _pending_images(conn: sqlite3.Connection, bucket_name: str, limit: int | None) -> dict:
+    """Картинки без облегчённой копии: ссылка или ключ → id мемов с этой картинкой."""
+    images = {}
+    for meme_id, image in conn.execute(
+        "SELECT id, image FROM memes WHERE image IS NOT NULL AND rendition IS NULL"
+    ):
+        if to_object_key(image, bucket_name) or image.startswith("http"):
+            images.setdefault(image, []).append(meme_id)
+    if limit is not None:
+        images = dict(list(images.items())[:limit])
+    return images
+
+
+def build_renditions(db_path: str = DB_PATH, bucket_name: str = S3_BUCKET,
+                     processes: int | None = None, workers: int = FETCH_WORKERS,
+                     fmt: str = RENDITION_FORMAT, max_side: int = RENDITION_MAX_SIDE,
+                     quality: int = RENDITION_QUALITY, max_bytes: int = RENDITION_MAX_BYTES,
+                     limit: int | None = None, client=None, cache=None) -> dict:
+    """
+    Готовит облегчённые копии картинок для мемов, у которых их ещё нет.
+
+    Скачивание и загрузка идут в пуле потоков, перекодирование — в пуле
+    процессов (processes=1 — в текущем процессе). Копия кладётся в бакет рядом
+    с оригиналом (rendition_key), её ключ пишется в колонку rendition; если
+    исходник уже подходит, в rendition записывается он сам. Ошибки оставляют
+    rendition пустым, и картинка обрабатывается при следующем запуске.
+
+    Args:
+        db_path (str): База SQLite.
+        bucket_name (str): Бакет для копий.
+        processes (int | None): Процессов перекодирования (по умолчанию — число ядер).
+        workers (int): Потоков скачивания и загрузки.
+        fmt, max_side, quality, max_bytes: Параметры render.
+        limit (int | None): Обработать не больше limit картинок.
+        client: Клиент MinIO (по умолчанию общий из s3_storage).
+        cache: Кеш изображений (по умолчанию общий из image_cache).
+
+    Returns:
+        dict: rendered, original (исходник подошёл), failed, bytes_in, bytes_out, elapsed.
+    """
+    client = client or get_minio_client()
+    cache = cache or get_image_cache()
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    images = _pending_images(conn, bucket_name, limit)
+    stats = {"rendered": 0, "original": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0}
+    print(f"[i] Картинок без облегчённой копии: {len(images)}")
+
+    job = partial(_render_job, fmt=fmt, max_side=max_side, quality=quality, max_bytes=max_bytes)
+    pool = ProcessPoolExecutor(processes) if processes != 1 else None
+    started = time.perf_counter()
+    pending = list(images)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            for start in range(0, len(pending), CHUNK_SIZE):
+                chunk = pending[start:start + CHUNK_SIZE]
+                fetched = list(threads.map(
+                    lambda image: _fetch(image, bucket_name, client, cache), chunk
+                ))
+                ready = [(image, data, key) for image, (data, key, error) in zip(chunk, fetched)
+                         if error is None]
+                for image, (_, _, error) in zip(chunk, fetched):
+                    if error is not None:
+                        stats["failed"] += 1
+                        print(f"[!] Не удалось получить {image}: {error}")
+
+                blobs = [data for _, data, _ in ready]
+                rendered = list(pool.map(job, blobs) if pool else map(job, blobs))
+
+                rows, uploads = [], []
+                for (image, data, key), (copy, error) in zip(ready, rendered):
+                    if error is not None:
+                        stats["failed"] += 1
+                        print(f"[!] Не удалось перекодировать {image}: {error}")
+                        continue
+                    stats["bytes_in"] += len(data)
+                    if copy is None:
+                        stats["original"] += 1
+                        stats["bytes_out"] += len(data)
+                        rendition = image
+                    else:
+                        rendition = rendition_key(key, fmt)
+                        uploads.append((rendition, copy, image))
+                    rows.extend((rendition, meme_id) for meme_id in images[image])
+
+                stored = list(threads.map(
+                    lambda item: _store_safe(client, bucket_name, item[0], item[1]), uploads
+                ))
+                failed = set()
+                for (rendition, copy, image), error in zip(uploads, stored):
+                    if error is not None:
+                        stats["failed"] += 1
+                        failed.add(rendition)
+                        print(f"[!] Не удалось загрузить {rendition}: {error}")
+                    else:
+                        stats["rendered"] += 1
+                        stats["bytes_out"] += len(copy)
+                rows = [row for row in rows if row[0] not in failed]
+
+                conn.executemany("UPDATE memes SET rendition = ? WHERE id = ?", rows)
+                conn.commit()
+                done = min(start + CHUNK_SIZE, len(pending))
+                print(f"[i] {done}/{len(pending)} обработано")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        conn.close()
+
+    stats["elapsed"] = time.perf_counter() - started
+    ratio = stats["bytes_out"] / stats["bytes_in"] if stats["bytes_in"] else 1.0
+    print(
+        f"[✓] Готово: копий {stats['rendered']}, исходник подошёл {stats['original']}, "
+        f"ошибок {stats['failed']}; объём {ratio:.0%} от исходного "
+        f"за {stats['elapsed']:.1f} с"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Облегчённые копии картинок мемов для Telegram")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--bucket", default=S3_BUCKET)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS)
+    parser.add_argument("--format", default=RENDITION_FORMAT, choices=sorted(FORMAT_EXTENSIONS))
+    parser.add_argument("--max-side", type=int, default=RENDITION_MAX_SIDE)
+    parser.add_argument("--quality", type=int, default=RENDITION_QUALITY)
+    parser.add_argument("--max-bytes", type=int, default=RENDITION_MAX_BYTES)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    build_renditions(
+        db_path=args.db, bucket_name=args.bucket, processes=args.processes,
+        workers=args.workers, fmt=args.format, max_side=args.max_side,
+        quality=args.quality, max_bytes=args.max_bytes, limit=args.limit,
+    )
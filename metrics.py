@@ -0,0 +1,405 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, Tuple
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Набор метрик процесса; render() отдаёт их в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    """
+    Общая часть метрик с метками.
+
+    Значения для каждого набора меток хранятся в отдельном «дочернем» объекте;
+    labels() возвращает его из словаря, поэтому на горячем пути нет ничего,
+    кроме поиска в словаре и обновления числа под блокировкой.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values, **kwargs):
+        """
+        Возвращает значение метрики для набора меток.
+
+        Args:
+            *values: Значения меток по порядку labelnames.
+            **kwargs: Или те же значения по именам.
+        """
+        # Быстрый путь: метки переданы строками по порядку — ключ уже готов
+        child = self._children.get(values) if not kwargs else None
+        if child is not None:
+            return child
+        key = tuple(str(v) for v in values) if values else tuple(
+            str(kwargs[n]) for n in self.labelnames
+        )
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидались метки {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> list:
+        raise NotImplementedError
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Монотонный счётчик (имя по соглашению Prometheus оканчивается на _total)."""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        """Увеличивает счётчик без меток."""
+        self.labels().inc(amount)
+
+    def samples(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        """Контекстный менеджер: записывает длительность блока в секундах."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами (по умолчанию — задержки в секундах)."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: tuple = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Записывает значение в гистограмму без меток."""
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def samples(self) -> list:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Метрика, значения которой читаются функцией в момент выдачи /metrics.
+
+    Подходит для счётчиков, которые уже ведёт сам объект (например, попадания в кеш).
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 callback: Callable[[], Dict[tuple, float]], metric_type: str = "gauge",
+                 registry: Registry = REGISTRY):
+        self.type = metric_type
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self.callback().items()
+        ]
+
+
+def timed(histogram_value):
+    """
+    Декоратор: записывает длительность каждого вызова функции (обычной или async).
+
+    Args:
+        histogram_value: Гистограмма с уже выбранными метками (Histogram.labels(...)).
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with histogram_value.time():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram_value.time():
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_cache_sources = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, int]]) -> None:
+    """
+    Подключает кеш к метрике meme_cache_requests_total.
+
+    Args:
+        name (str): Имя кеша (метка cache).
+        stats (Callable): Функция, возвращающая {"hit": n, "miss": m, ...}.
+    """
+    _cache_sources[name] = stats
+
+
+def _cache_samples() -> dict:
+    samples = {}
+    for name, stats in list(_cache_sources.items()):
+        for result, value in stats().items():
+            samples[(name, result)] = value
+    return samples
+
+
+_readiness_checks = {}
+
+
+def register_readiness(name: str, check: Callable[[], bool]) -> None:
+    """
+    Подключает компонент к эндпоинту /ready и метрике meme_ready.
+
+    Args:
+        name (str): Имя компонента (метка component).
+        check (Callable): Функция, возвращающая True, когда компонент готов.
+    """
+    _readiness_checks[name] = check
+
+
+def readiness() -> Dict[str, bool]:
+    """Готовность подключённых компонентов: {имя: готов ли}."""
+    return {name: bool(check()) for name, check in list(_readiness_checks.items())}
+
+
+# Метрики поиска и бота
+STAGE_SECONDS = Histogram(
+    "meme_stage_seconds",
+    "Длительность этапов поиска, синхронизации и отправки мемов",
+    ("stage",),
+)
+OPERATION_SECONDS = Histogram(
+    "meme_operation_seconds",
+    "Полная длительность операций (поиск, обработчик process_count, синхронизация)",
+    ("operation",),
+)
+KNN_FALLBACKS = Counter(
+    "meme_knn_fallbacks_total",
+    "Запросов, для которых понадобился KNN-поиск",
+    ("operation",),
+)
+MEME_SENDS = Counter(
+    "meme_sends_total",
+    "Отправки мемов пользователям: ok, fallback (файлом из кеша), failed",
+    ("result",),
+)
+SEND_FAILURES = Counter(
+    "meme_send_failures_total",
+    "Ошибки отправки мемов по типу исключения",
+    ("error",),
+)
+TAG_QUERIES = Counter(
+    "meme_tag_queries_total",
+    "Темы поиска: hit — ответ из индекса тегов без Elasticsearch, miss — поиск в ES",
+    ("result",),
+)
+COALESCED_CALLS = Counter(
+    "meme_coalesced_calls_total",
+    "Вызовов поиска и эмбеддингов, которые дождались уже идущего одинакового вызова",
+    ("call",),
+)
+HEDGED_REQUESTS = Counter(
+    "meme_hedged_requests_total",
+    "Дублирующие запросы к медленной зависимости: sent — отправлен, won — ответил первым",
+    ("result",),
+)
+DEGRADED_SEARCHES = Counter(
+    "meme_degraded_searches_total",
+    "Поиски, ответившие по запасному пути: text_only, stale_cache, local, empty",
+    ("path",),
+)
+BATCH_SIZE = Histogram(
+    "meme_batch_size",
+    "Размер пачек микробатчинга (запросы _msearch, эмбеддинги запросов)",
+    ("batcher",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+SYNC_DOCUMENTS = Counter(
+    "meme_sync_documents_total",
+    "Документов, загруженных в Elasticsearch при синхронизации",
+)
+READY = CallbackMetric(
+    "meme_ready",
+    "Готовность компонентов бота (1 — готов), например прогрева кешей поиска",
+    ("component",),
+    lambda: {(name,): int(ready) for name, ready in readiness().items()},
+)
+CACHE_REQUESTS = CallbackMetric(
+    "meme_cache_requests_total",
+    "Обращения к кешам по результату (hit, miss, ...)",
+    ("cache", "result"),
+    _cache_samples,
+    metric_type="counter",
+)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    registry = request.app["registry"]
+    return web.Response(
+        body=registry.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def _handle_ready(request: web.Request) -> web.Response:
+    components = readiness()
+    body = "".join(f"{name} {'ok' if ready else 'warming'}\n" for name, ready in components.items())
+    return web.Response(text=body or "ok\n", status=200 if all(components.values()) else 503)
+
+
+async def start_metrics_server(
+    host: str = METRICS_HOST, port: int = METRICS_PORT, registry: Registry = REGISTRY
+) -> web.AppRunner:
+    """
+    Запускает HTTP-эндпоинты /metrics и /ready в текущем цикле событий.
+
+    /ready отвечает 200, когда готовы все компоненты из register_readiness, иначе 503.
+
+    Args:
+        host (str): Адрес.
+        port (int): Порт.
+        registry (Registry): Какие метрики отдавать.
+
+    Returns:
+        web.AppRunner: Запущенный сервер; остановка — await runner.cleanup().
+    """
+    app = web.Application()
+    app["registry"] = registry
+    app.router.add_get("/metrics", _handle_metrics)
+    app.router.add_get("/ready", _handle_ready)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
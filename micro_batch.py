@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Микробатчинг вызовов из разных потоков.
+
+    submit() кладёт элемент в очередь и возвращает Future. Фоновый поток ждёт
+    первый элемент, затем ещё window секунд (или пока не наберётся max_batch)
+    и отдаёт накопленное одним вызовом flush(items, timeout) в пул отправки,
+    не дожидаясь ответа: пока одна пачка в пути, собирается следующая.
+    timeout — самый короткий оставшийся срок среди элементов пачки (None, если
+    сроков нет), чтобы попутчик с запасом времени не растягивал чужой бюджет;
+    элементы, чей срок истёк до отправки, получают TimeoutError и не отправляются.
+    Результаты раскладываются по Future в порядке элементов; исключение на месте
+    результата достаётся только своему элементу, исключение самого flush — всем.
+    """
+
+    def __init__(self, name: str, flush, window: float, max_batch: int, max_in_flight: int = 4):
+        """
+        Args:
+            name (str): Метка batcher в meme_batch_size.
+            flush: Функция (список элементов, таймаут в секундах или None) →
+                список результатов той же длины.
+            window (float): Сколько ждать попутчиков после первого элемента, секунды.
+            max_batch (int): Наибольший размер пачки.
+            max_in_flight (int): Пачек в пути одновременно.
+        """
+        self.name = name
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+        self._histogram = BATCH_SIZE.labels(name)
+        self._queue = []
+        self._cond = threading.Condition()
+        self._sender = ThreadPoolExecutor(max_in_flight, thread_name_prefix=f"{name}-flush")
+        self._thread = None
+
+    def submit(self, item, timeout: float | None = None) -> Future:
+        """
+        Ставит элемент в очередь; результат — в возвращённом Future.
+
+        Args:
+            item: Элемент пачки.
+            timeout (float | None): Сколько секунд у вызывающего на ответ.
+        """
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name=f"{self.name}-batcher",
+                                                daemon=True)
+                self._thread.start()
+            self._queue.append((item, deadline, future))
+            self._cond.notify()
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                flush_at = time.monotonic() + self.window
+                while len(self._queue) < self.max_batch:
+                    remaining = flush_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+            self._histogram.observe(len(batch))
+            self._sender.submit(self._send, batch)
+
+    def _send(self, batch: list) -> None:
+        now = time.monotonic()
+        live = []
+        for item, deadline, future in batch:
+            if deadline is not None and deadline <= now:
+                future.set_exception(TimeoutError(f"{self.name}: срок истёк до отправки"))
+            else:
+                live.append((item, deadline, future))
+        if not live:
+            return
+        deadlines = [deadline for _, deadline, _ in live if deadline is not None]
+        timeout = min(deadlines) - now if deadlines else None
+        try:
+            results = self.flush([item for item, _, _ in live], timeout)
+            if len(results) != len(live):
+                raise RuntimeError(f"{self.name}: {len(results)} ответов на {len(live)} запросов")
+        except Exception as e:
+            logger.error(f"Ошибка пакетного вызова {self.name} ({len(live)} шт.): {e}")
+            for _, _, future in live:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(live, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
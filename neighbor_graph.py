@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import NEIGHBORS_K
+
+DB_PATH = "memes.db"
+NEIGHBORS_TABLE = "meme_neighbors"
+EMBEDDING_COLUMNS = ("embedding", "image_embedding")
+
+BLOCK_SIZE = 1024            # строк матрицы запросов в одном матричном произведении
+ID_DTYPE = np.dtype("<i4")   # id соседей в BLOB: 4 байта на соседа
+SCORE_DTYPE = np.dtype("<f4")
+
+
+def ensure_neighbors_table(conn: sqlite3.Connection) -> None:
+    """
+    Создаёт таблицу соседей: на мем одна строка с id и близостью top-N соседей.
+
+    embedding_hash — хеш эмбеддинга, по которому считались соседи: по нему
+    повторный запуск находит изменившиеся векторы.
+    """
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {NEIGHBORS_TABLE} (
+        id INTEGER PRIMARY KEY,
+        embedding_hash TEXT,
+        neighbors BLOB,
+        scores BLOB
+    );
+    ''')
+
+
+def load_embeddings(conn: sqlite3.Connection, column: str = "embedding") -> tuple:
+    """
+    Читает эмбеддинги мемов и нормирует их для косинусной близости.
+
+    Векторы другой размерности, чем у большинства (смена провайдера посреди
+    пересчёта), пропускаются.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой мемов.
+        column (str): Колонка с эмбеддингами (EMBEDDING_COLUMNS).
+
+    Returns:
+        tuple: (ids: np.ndarray[int64], matrix: np.ndarray[float32] n×d, hashes: list[str]).
+    """
+    if column not in EMBEDDING_COLUMNS:
+        raise ValueError(f"Неизвестная колонка эмбеддингов: {column}")
+    ids, vectors, hashes = [], [], []
+    for meme_id, raw in conn.execute(
+        f"SELECT id, {column} FROM memes WHERE {column} IS NOT NULL ORDER BY id"
+    ):
+        ids.append(meme_id)
+        vectors.append(json.loads(raw))
+        hashes.append(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest())
+    if not vectors:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32), []
+
+    dims = [len(v) for v in vectors]
+    dim = max(set(dims), key=dims.count)
+    keep = [i for i, d in enumerate(dims) if d == dim]
+    if len(keep) < len(vectors):
+        print(f"[!] Пропущено эмбеддингов другой размерности: {len(vectors) - len(keep)}")
+    matrix = np.asarray([vectors[i] for i in keep], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1.0)
+    return (np.asarray([ids[i] for i in keep], dtype=np.int64), matrix,
+            [hashes[i] for i in keep])
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple:
+    """Позиции и значения k наибольших элементов каждой строки, по убыванию."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def nearest_neighbors(matrix: np.ndarray, rows: np.ndarray, k: int,
+                      block_size: int = BLOCK_SIZE) -> tuple:
+    """
+    Top-k соседей строк rows среди всех строк matrix (без самой строки).
+
+    Близости считаются блоками по block_size строк одним матричным
+    произведением, поэтому память — block_size × n, а не n × n.
+
+    Args:
+        matrix (np.ndarray): Нормированные эмбеддинги n×d.
+        rows (np.ndarray): Позиции строк, для которых нужны соседи.
+        k (int): Число соседей.
+        block_size (int): Строк в одном блоке.
+
+    Returns:
+        tuple: (позиции соседей len(rows)×k', близости len(rows)×k'), k' = min(k, n - 1).
+    """
+    k = min(k, len(matrix) - 1)
+    positions = np.empty((len(rows), max(k, 0)), dtype=np.int64)
+    scores = np.empty((len(rows), max(k, 0)), dtype=np.float32)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = matrix[block] @ matrix.T
+        sims[np.arange(len(block)), block] = -np.inf
+        positions[start:start + len(block)], scores[start:start + len(block)] = _top_k(sims, k)
+    return positions, scores
+
+
+def _merge_candidates(matrix: np.ndarray, rows: np.ndarray, stored: list, changed: np.ndarray,
+                      ids: np.ndarray, k: int, block_size: int = BLOCK_SIZE) -> list:
+    """
+    Обновляет списки соседей неизменившихся мемов с учётом изменившихся.
+
+    Близость неизменившихся мемов друг к другу не меняется, поэтому достаточно
+    сравнить строки rows только с changed и слить результат с сохранённым
+    списком. Возвращает [(neighbor_ids, scores)] в порядке rows.
+    """
+    result = []
+    changed_ids = ids[changed]
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = matrix[block] @ matrix[changed].T
+        for i, row_sims in enumerate(sims):
+            old_ids, old_scores = stored[start + i]
+            cand_ids = np.concatenate([old_ids.astype(np.int64), changed_ids])
+            cand_scores = np.concatenate([old_scores, row_sims])
+            top, top_scores = _top_k(cand_scores[None, :], k)
+            result.append((cand_ids[top[0]], top_scores[0]))
+    return result
+
+
+def build_neighbor_graph(db_path: str = DB_PATH, column: str = "embedding", k: int = NEIGHBORS_K,
+                         block_size: int = BLOCK_SIZE, full: bool = False) -> dict:
+    """
+    Пересчитывает граф соседей мемов в таблице meme_neighbors.
+
+    При повторном запуске пересчитываются только затронутые строки: мемы
+    с новым или изменившимся эмбеддингом (целиком), мемы, в чьих списках
+    был изменившийся или удалённый мем (целиком), остальные — слиянием
+    сохранённого списка с близостями к изменившимся мемам.
+
+    Args:
+        db_path (str): База SQLite.
+        column (str): Колонка эмбеддингов: embedding (описания) или image_embedding (CLIP).
+        k (int): Соседей на мем.
+        block_size (int): Строк в одном матричном произведении.
+        full (bool): Пересчитать граф целиком.
+
+    Returns:
+        dict: memes, recomputed, merged, removed, written, elapsed.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    ensure_neighbors_table(conn)
+    ids, matrix, hashes = load_embeddings(conn, column)
+    stored = {
+        meme_id: (emb_hash, neighbors, scores)
+        for meme_id, emb_hash, neighbors, scores in conn.execute(
+            f"SELECT id, embedding_hash, neighbors, scores FROM {NEIGHBORS_TABLE}"
+        )
+    }
+    expected_len = min(k, len(ids) - 1) * ID_DTYPE.itemsize
+    if any(len(neighbors) > k * ID_DTYPE.itemsize for _, neighbors, _ in stored.values()):
+        full = True  # граф строился с большим k
+
+    position = {int(meme_id): i for i, meme_id in enumerate(ids)}
+    removed = set(stored) - set(position)
+    changed = [i for i, meme_id in enumerate(ids)
+               if full or stored.get(int(meme_id), (None,))[0] != hashes[i]]
+    dirty = {int(ids[i]) for i in changed} | removed
+
+    recompute, merge, merge_stored = set(changed), [], []
+    for i, meme_id in enumerate(ids):
+        if i in recompute:
+            continue
+        _, blob, score_blob = stored[int(meme_id)]
+        neighbors = np.frombuffer(blob, dtype=ID_DTYPE)
+        # Короткий список — граф строился с меньшим k: слиянием его не дополнить
+        if len(blob) < expected_len or dirty.intersection(neighbors.tolist()):
+            recompute.add(i)
+        elif changed:
+            merge.append(i)
+            merge_stored.append((neighbors, np.frombuffer(score_blob, dtype=SCORE_DTYPE)))
+
+    updates = []
+
+    def add_update(p: int, neighbor_ids: np.ndarray, scores: np.ndarray) -> None:
+        updates.append((int(ids[p]), hashes[p], neighbor_ids.astype(ID_DTYPE).tobytes(),
+                        scores.astype(SCORE_DTYPE).tobytes()))
+
+    if recompute:
+        positions = np.fromiter(sorted(recompute), dtype=np.int64)
+        neighbor_pos, scores = nearest_neighbors(matrix, positions, k, block_size)
+        for j, p in enumerate(positions):
+            add_update(int(p), ids[neighbor_pos[j]], scores[j])
+    if merge:
+        merged = _merge_candidates(
+            matrix, np.asarray(merge, dtype=np.int64), merge_stored,
+            np.asarray(changed, dtype=np.int64), ids, k, block_size,
+        )
+        for p, (old_ids, _), (neighbor_ids, scores) in zip(merge, merge_stored, merged):
+            # Изменившиеся мемы не вошли в список — строку можно не переписывать
+            if not np.array_equal(old_ids, neighbor_ids):
+                add_update(p, neighbor_ids, scores)
+
+    with conn:
+        conn.executemany(
+            f"DELETE FROM {NEIGHBORS_TABLE} WHERE id = ?", [(meme_id,) for meme_id in removed]
+        )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {NEIGHBORS_TABLE} (id, embedding_hash, neighbors, scores) "
+            "VALUES (?, ?, ?, ?)",
+            updates,
+        )
+    conn.close()
+    stats = {
+        "memes": len(ids), "recomputed": len(recompute), "merged": len(merge),
+        "removed": len(removed), "written": len(updates),
+        "elapsed": time.perf_counter() - started,
+    }
+    print(
+        f"[✓] Граф соседей: мемов {stats['memes']}, пересчитано {stats['recomputed']}, "
+        f"слито {stats['merged']}, удалено {stats['removed']}, записано {stats['written']} "
+        f"за {stats['elapsed']:.2f} с"
+    )
+    return stats
+
+
+class NeighborGraph:
+    """
+    Граф соседей в памяти бота: id мема → BLOB с id соседей по убыванию близости.
+
+    Поиск соседей — обращение к словарю, без запросов к Elasticsearch и SQLite.
+    """
+
+    def __init__(self, rows: dict | None = None):
+        self._rows = rows or {}
+
+    @classmethod
+    def from_db(cls, db_path: str = DB_PATH) -> "NeighborGraph":
+        """Загружает граф из таблицы meme_neighbors (пустой, если базы или таблицы нет)."""
+        if not os.path.exists(db_path):
+            return cls()
+        with sqlite3.connect(db_path) as conn:
+            try:
+                rows = dict(conn.execute(f"SELECT id, neighbors FROM {NEIGHBORS_TABLE}"))
+            except sqlite3.OperationalError:
+                rows = {}
+        return cls(rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def neighbors(self, meme_id: int) -> list:
+        """Соседи мема по убыванию близости (пустой список, если мема нет в графе)."""
+        blob = self._rows.get(meme_id)
+        return np.frombuffer(blob, dtype=ID_DTYPE).tolist() if blob else []
+
+    def similar(self, meme_ids: list, exclude=(), limit: int = 5) -> list:
+        """
+        Мемы, похожие на meme_ids: соседи каждого мема берутся по очереди.
+
+        Args:
+            meme_ids (list): Мемы, к которым подбираются похожие.
+            exclude: id, которые не нужно возвращать (уже показанные).
+            limit (int): Сколько мемов вернуть.
+
+        Returns:
+            list: id похожих мемов, самые близкие — первыми.
+        """
+        skip = set(exclude) | set(meme_ids)
+        lists = [self.neighbors(meme_id) for meme_id in meme_ids]
+        result = []
+        for rank in range(max(map(len, lists), default=0)):
+            for neighbors in lists:
+                if rank < len(neighbors) and neighbors[rank] not in skip:
+                    skip.add(neighbors[rank])
+                    result.append(neighbors[rank])
+                    if len(result) >= limit:
+                        return result
+        return result
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_neighbor_graph(db_path: str = DB_PATH) -> NeighborGraph:
+    """Возвращает граф соседей, загружая его из базы при первом вызове."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = NeighborGraph.from_db(db_path)
+    return _graph
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Граф похожих мемов по эмбеддингам")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--column", default="embedding", choices=EMBEDDING_COLUMNS)
+    parser.add_argument("-k", type=int, default=NEIGHBORS_K, help="соседей на мем")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--full", action="store_true", help="пересчитать граф целиком")
+    args = parser.parse_args()
+    build_neighbor_graph(args.db, args.column, args.k, args.block_size, args.full)
@@ -0,0 +1,143 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+
+from config import BREAKER_FAILURES, BREAKER_RESET_SECONDS
+from metrics import HEDGED_REQUESTS, CallbackMetric
+
+
+class CircuitOpenError(Exception):
+    """Вызов не выполнялся: предохранитель зависимости разомкнут."""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель зависимости (Elasticsearch, провайдер эмбеддингов).
+
+    После failure_threshold ошибок подряд размыкается: allow() возвращает False,
+    и вызывающий сразу идёт по запасному пути, не тратя бюджет задержки.
+    Через reset_timeout секунд пропускает один пробный вызов (полуоткрытое
+    состояние): успех замыкает предохранитель, ошибка снова размыкает.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        """
+        Args:
+            name (str): Имя зависимости (метка dependency в meme_circuit_state).
+            failure_threshold (int): Ошибок подряд до размыкания.
+            reset_timeout (float): Сколько секунд держать разомкнутым до пробного вызова.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe = False
+        self._lock = threading.Lock()
+        _breakers[name] = self
+
+    def allow(self) -> bool:
+        """Можно ли сейчас вызывать зависимость."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe = False
+            if self.state == self.HALF_OPEN and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe = False
+
+    def call(self, fn):
+        """
+        Вызывает fn() через предохранитель.
+
+        Raises:
+            CircuitOpenError: Предохранитель разомкнут, fn не вызывалась.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            result = fn()
+        except BaseException:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def call_with_deadline(executor: Executor, fn, timeout: float, hedge_after: float | None = None):
+    """
+    Выполняет fn() в пуле executor и ждёт результата не дольше timeout секунд.
+
+    Если за hedge_after секунд ответа нет, запускается второй такой же вызов
+    (hedged request) и берётся первый успешный ответ — это срезает хвост
+    задержек из-за одного медленного запроса. fn должна быть идемпотентной.
+    Опоздавший вызов не отменяется, но его результат не ждут.
+
+    Args:
+        executor (Executor): Пул потоков.
+        fn: Функция без аргументов.
+        timeout (float): Бюджет, секунды.
+        hedge_after (float | None): Когда запускать дублирующий вызов; None — не запускать.
+
+    Returns:
+        Результат fn().
+
+    Raises:
+        TimeoutError: Ни один вызов не уложился в timeout.
+        Exception: Ошибка fn, если ошибкой закончились все вызовы.
+    """
+    deadline = time.monotonic() + timeout
+    futures = [executor.submit(fn)]
+    hedged = None
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            HEDGED_REQUESTS.labels("sent").inc()
+            hedged = executor.submit(fn)
+            futures.append(hedged)
+    error = None
+    while futures:
+        remaining = deadline - time.monotonic()
+        done, pending = wait(futures, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError(f"нет ответа за {timeout:.3f} с")
+        for future in done:
+            if future.exception() is None:
+                if future is hedged:
+                    HEDGED_REQUESTS.labels("won").inc()
+                return future.result()
+            error = future.exception()
+        futures = list(pending)
+    raise error
+
+
+_breakers = {}
+_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+CIRCUIT_STATE = CallbackMetric(
+    "meme_circuit_state",
+    "Состояние предохранителей зависимостей: 0 — замкнут, 1 — пробный вызов, 2 — разомкнут",
+    ("dependency",),
+    lambda: {(name,): _STATE_VALUES[b.state] for name, b in list(_breakers.items())},
+)
@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import unquote, urlparse
+
+from minio import Minio
+from minio.error import S3Error
+
+from config import (
+    PRESIGN_REFRESH_MARGIN,
+    PRESIGN_TTL,
+    S3_BUCKET,
+    S3_ENDPOINT,
+    S3_REGION,
+    S3_SECURE,
+)
+from metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# Размер части multipart-загрузки; объекты больше него грузятся по частям
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_minio_client() -> Minio:
+    """
+    Возвращает общий для процесса клиент MinIO.
+
+    Ключи берутся из MINIO_ACCESS_KEY / MINIO_SECRET_KEY. Клиент создаётся
+    при первом вызове, а не при импорте, поэтому модуль можно импортировать
+    без настроенного хранилища (тесты, офлайн-скрипты).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Minio(
+                S3_ENDPOINT,
+                access_key=os.getenv("MINIO_ACCESS_KEY"),
+                secret_key=os.getenv("MINIO_SECRET_KEY"),
+                secure=S3_SECURE,
+                region=S3_REGION,
+            )
+    return _client
+
+
+def object_key(data: bytes, source_url: str = "") -> str:
+    """
+    Имя объекта по содержимому: sha256 и расширение исходной ссылки.
+
+    Одинаковые картинки получают один ключ, а порядок мемов в файле на ключи не влияет.
+
+    Args:
+        data (bytes): Содержимое изображения.
+        source_url (str): Исходная ссылка (для расширения файла).
+
+    Returns:
+        str: Ключ вида "ab/ab12...ef.jpg".
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    ext = os.path.splitext(urlparse(source_url).path)[1].lower() or ".jpg"
+    return f"{digest[:2]}/{digest}{ext}"
+
+
+def expected_etag(data: bytes, part_size: int = MULTIPART_PART_SIZE) -> str:
+    """
+    ETag, который S3 вернёт для объекта после загрузки data.
+
+    Для обычной загрузки это MD5 содержимого, для multipart — MD5 от
+    склеенных MD5 частей с суффиксом "-<число частей>".
+
+    Args:
+        data (bytes): Содержимое объекта.
+        part_size (int): Размер части, с которым объект загружается.
+
+    Returns:
+        str: ETag без кавычек.
+    """
+    if len(data) <= part_size:
+        return hashlib.md5(data, usedforsecurity=False).hexdigest()
+    digests = b"".join(
+        hashlib.md5(data[i:i + part_size], usedforsecurity=False).digest()
+        for i in range(0, len(data), part_size)
+    )
+    parts = (len(data) + part_size - 1) // part_size
+    return f"{hashlib.md5(digests, usedforsecurity=False).hexdigest()}-{parts}"
+
+
+def object_matches(client, bucket_name: str, key: str, data: bytes,
+                   part_size: int = MULTIPART_PART_SIZE) -> bool:
+    """True, если объект уже лежит в бакете с тем же размером и ETag."""
+    try:
+        stat = client.stat_object(bucket_name, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+            return False
+        raise
+    return stat.size == len(data) and stat.etag.strip('"') == expected_etag(data, part_size)
+
+
+def to_object_key(image: str, bucket_name: str = S3_BUCKET) -> str | None:
+    """
+    Извлекает ключ объекта из значения поля image.
+
+    Понимает сам ключ ("ab/ab12...ef.jpg") и старые presigned-ссылки на объекты
+    бакета, которые раньше записывались в JSON и базу. Ключом считается строка
+    с путём или расширением файла: file_id Telegram ни того, ни другого не содержат.
+
+    Args:
+        image (str): Значение поля image.
+        bucket_name (str): Бакет с картинками.
+
+    Returns:
+        str | None: Ключ или None для сторонней ссылки, file_id и пустого значения.
+    """
+    if not image or image == '-':
+        return None
+    if not image.startswith(("http://", "https://")):
+        return image if "/" in image or os.path.splitext(image)[1] else None
+    parts = urlparse(image)
+    prefix = f"/{bucket_name}/"
+    if parts.netloc.split(":")[0] == S3_ENDPOINT.split(":")[0] and parts.path.startswith(prefix):
+        return unquote(parts.path[len(prefix):])
+    return None
+
+
+class PresignedUrlResolver:
+    """
+    Выдаёт ссылки на картинки мемов в момент отправки.
+
+    В базе хранятся постоянные ключи объектов, а presigned-ссылки подписываются
+    локально (без сетевых запросов: регион клиента задан явно) и кешируются
+    до момента за refresh_margin секунд до истечения. Фоновая задача
+    run_refresher переподписывает истекающие ссылки пачкой, чтобы на горячем
+    пути подпись почти не встречалась.
+
+    Сторонние http(s)-ссылки и file_id Telegram возвращаются без изменений.
+    """
+
+    def __init__(self, client: Minio | None = None, bucket_name: str = S3_BUCKET,
+                 ttl: float = PRESIGN_TTL, refresh_margin: float = PRESIGN_REFRESH_MARGIN):
+        if refresh_margin >= ttl:
+            raise ValueError("refresh_margin должен быть меньше ttl")
+        self._client = client
+        self.bucket_name = bucket_name
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Minio:
+        if self._client is None:
+            self._client = get_minio_client()
+        return self._client
+
+    def _sign(self, key: str) -> tuple:
+        url = self.client.presigned_get_object(
+            self.bucket_name, key, expires=timedelta(seconds=self.ttl)
+        )
+        return url, time.time() + self.ttl
+
+    def resolve(self, image: str) -> str:
+        """
+        Возвращает ссылку, по которой картинку можно скачать прямо сейчас.
+
+        Args:
+            image (str): Ключ объекта, старая presigned-ссылка, сторонний URL или file_id.
+
+        Returns:
+            str: Действующая ссылка (сторонний URL и file_id — без изменений).
+        """
+        key = to_object_key(image, self.bucket_name)
+        if key is None:
+            return image
+        now = time.time()
+        cached = self._urls.get(key)
+        if cached is not None and cached[1] - self.refresh_margin > now:
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        signed = self._sign(key)
+        with self._lock:
+            self._urls[key] = signed
+        return signed[0]
+
+    def refresh_expiring(self, horizon: float | None = None) -> int:
+        """
+        Переподписывает ссылки, которые истекут в ближайшие horizon секунд.
+
+        Args:
+            horizon (float | None): Горизонт, секунды (по умолчанию 2 * refresh_margin).
+
+        Returns:
+            int: Сколько ссылок переподписано.
+        """
+        deadline = time.time() + (horizon if horizon is not None else 2 * self.refresh_margin)
+        with self._lock:
+            expiring = [key for key, (_, expires) in self._urls.items() if expires <= deadline]
+        fresh = {key: self._sign(key) for key in expiring}
+        with self._lock:
+            self._urls.update(fresh)
+        self.refreshed += len(fresh)
+        return len(fresh)
+
+    async def run_refresher(self, interval: float | None = None) -> None:
+        """
+        Фоновая задача: раз в interval секунд переподписывает истекающие ссылки.
+
+        Интервал по умолчанию — половина refresh_margin, поэтому ни одна
+        закешированная ссылка не успевает попасть в окно обновления незамеченной.
+        """
+        interval = interval or self.refresh_margin / 2
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                count = await asyncio.to_thread(self.refresh_expiring)
+                if count:
+                    logger.info(f"Переподписано ссылок на картинки: {count}")
+            except Exception as e:
+                logger.error(f"Ошибка обновления presigned-ссылок: {e}")
+
+    def stats(self) -> dict:
+        return {"hit": self.hits, "miss": self.misses, "refreshed": self.refreshed}
+
+
+_default_resolver = None
+
+
+def get_url_resolver() -> PresignedUrlResolver:
+    """Возвращает общий для процесса резолвер ссылок с настройками из окружения."""
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = PresignedUrlResolver()
+    return _default_resolver
+
+
+def _default_resolver_stats() -> dict:
+    return _default_resolver.stats() if _default_resolver is not None else {}
+
+
+register_cache("presigned_url", _default_resolver_stats)
@@ -0,0 +1,629 @@
+import asyncio
+import contextvars
+import copy
+import functools
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import List
+
+from config import (
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TTL,
+    EMBED_BATCH_WINDOW_MS,
+    EMBED_MAX_BATCH,
+    ES_MSEARCH_MAX_BATCH,
+    ES_MSEARCH_WINDOW_MS,
+    SEARCH_BUDGET_MS,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    SEARCH_HEDGE_MS,
+    SEARCH_WORKERS,
+    WARMUP_CONCURRENCY,
+    WARMUP_DAYS,
+    WARMUP_QUERIES_FILE,
+    WARMUP_TOP_N,
+)
+from elasticsearch_utils import ElasticsearchManager
+from embedding_providers import EmbeddingProvider, get_embedding_provider
+from event_log import aggregate_queries, make_sink
+from inline_search import normalize_query
+from metrics import (
+    COALESCED_CALLS,
+    DEGRADED_SEARCHES,
+    KNN_FALLBACKS,
+    register_cache,
+    register_readiness,
+)
+from micro_batch import MicroBatcher
+from resilience import CircuitBreaker, call_with_deadline
+from tag_index import get_tag_index, normalize_tag
+from tracing import operation, stage
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    LRU-кеш со сроком жизни записей, безопасный для потоков.
+
+    Истёкшие записи не удаляются сразу (их вытесняет LRU): get их не отдаёт,
+    а get_stale — отдаёт.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get_stale(self, key):
+        """Значение без учёта срока жизни (для ответа, когда зависимости недоступны)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"hit": self.hits, "miss": self.misses}
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вызовов (single flight).
+
+    Первый вызов с ключом (ведущий) выполняет функцию, остальные, пришедшие
+    до его окончания, ждут тот же результат или ту же ошибку. Работает и для
+    потоков (do), и для корутин (ado) — общий concurrent.futures.Future.
+    """
+
+    def __init__(self, name: str, executor: Executor | None = None):
+        """
+        Args:
+            name (str): Метка call в meme_coalesced_calls_total.
+            executor (Executor | None): Пул для ведущих вызовов ado; None — пул
+                цикла событий по умолчанию.
+        """
+        self.name = name
+        self.executor = executor
+        self.leaders = 0
+        self.shared = 0
+        self._calls = {}
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def join(self, key) -> tuple:
+        """
+        Регистрирует вызов с ключом key.
+
+        Returns:
+            tuple: (Future результата, ведущий ли вызов). Ведущий обязан
+                завершить Future через settle.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                COALESCED_CALLS.labels(self.name).inc()
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def settle(self, key, future: Future, result=None, error: BaseException | None = None):
+        """Снимает ключ и передаёт результат (или ошибку) всем ждущим."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Выполняет fn() или ждёт результата уже идущего вызова с тем же ключом."""
+        future, leader = self.join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, result)
+        return result
+
+    async def ado(self, key, fn):
+        """
+        Асинхронный do: ведущий выполняет синхронную fn в пуле executor
+        с контекстом вызывающего (отрезки fn попадают в его трассу).
+
+        Отмена ждущей корутины не отменяет общий вызов: его результат
+        нужен остальным и попадёт в кеш. Запущенный вызов хранится в _running
+        до окончания, чтобы его не собрал сборщик мусора.
+        """
+        future, leader = self.join(key)
+        if leader:
+            def done(task: asyncio.Future) -> None:
+                self._running.discard(task)
+                if task.cancelled():
+                    self.settle(key, future, error=asyncio.CancelledError())
+                elif task.exception() is not None:
+                    self.settle(key, future, error=task.exception())
+                else:
+                    self.settle(key, future, task.result())
+
+            task = asyncio.get_running_loop().run_in_executor(
+                self.executor, contextvars.copy_context().run, fn
+            )
+            self._running.add(task)
+            task.add_done_callback(done)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> dict:
+        return {"leader": self.leaders, "shared": self.shared}
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """
+    Провайдер-обёртка: эмбеддинги запросов кешируются по нормализованному тексту.
+
+    Тексты, которых нет в кеше, кодируются исходным провайдером одним вызовом embed;
+    текст, который в этот момент уже кодирует другой поток, не отправляется
+    повторно — вызов ждёт его результата (SingleFlight). with_options(timeout=...)
+    передаёт таймаут исходному провайдеру и ограничивает им же ожидание чужого вызова.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, cache: TTLCache | None = None,
+                 flights: SingleFlight | None = None):
+        self.provider = provider
+        self.name = provider.name
+        self.dim = provider.dim
+        self.field = provider.field
+        self.cache = cache or TTLCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL)
+        self.flights = flights or SingleFlight("embedding")
+        self.timeout = None
+
+    def with_options(self, **options) -> "CachedEmbeddingProvider":
+        provider = copy.copy(self)
+        provider.provider = self.provider.with_options(**options)
+        provider.timeout = options.get("timeout")
+        return provider
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors, own, waiting = {}, {}, {}
+        for text in texts:
+            key = normalize_query(text)
+            if key in vectors or key in own or key in waiting:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                vectors[key] = cached
+                continue
+            future, leader = self.flights.join(key)
+            if leader:
+                own[key] = (text, future)
+            else:
+                waiting[key] = future
+        if own:
+            try:
+                result = self.provider.embed([text for text, _ in own.values()])
+            except BaseException as e:
+                for key, (_, future) in own.items():
+                    self.flights.settle(key, future, error=e)
+                raise
+            for (key, (_, future)), vector in zip(own.items(), result):
+                self.cache.put(key, vector)
+                self.flights.settle(key, future, vector)
+                vectors[key] = vector
+        for key, future in waiting.items():
+            vectors[key] = future.result(self.timeout)
+        return [vectors[normalize_query(text)] for text in texts]
+
+
+class BatchingEmbeddingProvider(EmbeddingProvider):
+    """
+    Провайдер-обёртка: тексты одновременных поисков кодируются одним запросом.
+
+    Каждый текст короткого вызова embed ставится в очередь MicroBatcher; тексты,
+    пришедшие из разных потоков в пределах window секунд (или пока их не
+    наберётся max_batch), уходят в исходный провайдер одним embed — для OpenAI
+    это один embeddings.create(input=[...]) вместо запроса на каждый поиск.
+    Вызовы с max_batch текстами и больше (прогрев) идут в провайдер напрямую.
+    С with_options(timeout=...) пачка отправляется с самым коротким оставшимся
+    таймаутом своих текстов и без повторов клиента.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, window: float = EMBED_BATCH_WINDOW_MS / 1000,
+                 max_batch: int = EMBED_MAX_BATCH):
+        """
+        Args:
+            provider (EmbeddingProvider): Исходный провайдер.
+            window (float): Окно сбора текстов, секунды.
+            max_batch (int): Наибольшее число текстов в одном запросе.
+        """
+        self.provider = provider
+        self.name = provider.name
+        self.dim = provider.dim
+        self.field = provider.field
+        self.batcher = MicroBatcher("embedding", self._flush, window, max_batch)
+        self.timeout = None
+
+    def with_options(self, **options) -> "BatchingEmbeddingProvider":
+        provider = copy.copy(self)
+        provider.timeout = options.get("timeout")
+        return provider
+
+    def _flush(self, texts: List[str], timeout: float | None) -> List[List[float]]:
+        provider = self.provider
+        if timeout is not None:
+            provider = provider.with_options(timeout=max(timeout, 0.001), max_retries=0)
+        return provider.embed(texts)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) >= self.batcher.max_batch:
+            return self._flush(texts, self.timeout)
+        futures = [self.batcher.submit(text, self.timeout) for text in texts]
+        return [future.result(self.timeout) for future in futures]
+
+
+def tag_search(query: str, k: int) -> tuple:
+    """
+    Локальный запасной поиск по индексу тегов: мемы, у которых есть теги из слов
+    запроса, больше совпавших тегов — выше.
+    """
+    index = get_tag_index()
+    words = set(normalize_tag(query).split()) | {normalize_tag(query)}
+    counts = Counter()
+    for word in words:
+        counts.update(index.lookup(word))
+    return tuple(meme_id for meme_id, _ in counts.most_common(k))
+
+
+class SearchService:
+    """
+    Общий для процесса вход в поиск мемов.
+
+    Держит один ElasticsearchManager (вместо нового подключения на каждый запрос;
+    запросы разных пользователей к ES собираются в _msearch — ES_MSEARCH_WINDOW_MS),
+    кеширует результаты поиска (id мемов) и эмбеддинги запросов. Одинаковые
+    одновременные поиски, которых нет в кеше, выполняются один раз (SingleFlight).
+    Синхронные методы (hybrid, search) предназначены для кода в пуле потоков
+    (executor сервиса), асинхронный ahybrid — для обработчиков бота. warm_up()
+    заранее наполняет кеши популярными темами; ready — признак, что прогрев закончен.
+
+    Гибридный поиск и search укладываются в бюджет budget: каждый этап (текстовый
+    запрос, эмбеддинг, KNN) ждут только оставшееся время, медленные запросы
+    к ES дублируются через hedge_after, а Elasticsearch и провайдер эмбеддингов
+    закрыты предохранителями. Если этап не успел или зависимость недоступна,
+    ответ собирается по запасному пути: устаревший кеш, текстовые результаты
+    без KNN, локальный поиск по тегам.
+    """
+
+    def __init__(self, manager: ElasticsearchManager | None = None,
+                 cache: TTLCache | None = None, embedding_cache: TTLCache | None = None,
+                 budget: float = SEARCH_BUDGET_MS / 1000,
+                 hedge_after: float | None = SEARCH_HEDGE_MS / 1000 or None,
+                 local_search=tag_search):
+        """
+        Args:
+            manager (ElasticsearchManager | None): Готовый менеджер (тесты, бенчмарки);
+                по умолчанию создаётся при первом поиске с кешем эмбеддингов.
+            cache (TTLCache | None): Кеш результатов поиска.
+            embedding_cache (TTLCache | None): Кеш эмбеддингов запросов.
+            budget (float): Бюджет задержки гибридного поиска, секунды.
+            hedge_after (float | None): Через сколько секунд дублировать запрос к ES.
+            local_search: Запасной поиск (запрос, k) → id мемов, когда ES недоступен.
+        """
+        self.budget = budget
+        self.hedge_after = hedge_after
+        self.local_search = local_search
+        self.es_breaker = CircuitBreaker("elasticsearch")
+        self.embedding_breaker = CircuitBreaker("embedding")
+        # Этапы поиска (_leg) и поиски целиком — в разных пулах: поиск ждёт свои этапы,
+        # и в общем пуле занятые поисками потоки не оставили бы места этапам
+        self._stage_executor = ThreadPoolExecutor(SEARCH_WORKERS, thread_name_prefix="search")
+        # Пул для поисков целиком и прогрева; им же пользуется инлайн-поиск бота
+        self.executor = ThreadPoolExecutor(SEARCH_WORKERS, thread_name_prefix="search-request")
+        self._manager = manager
+        self._manager_lock = threading.Lock()
+        self.cache = cache or TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        self.embedding_cache = embedding_cache or TTLCache(EMBEDDING_CACHE_SIZE,
+                                                           EMBEDDING_CACHE_TTL)
+        self.flights = SingleFlight("search", self.executor)
+        self.embedding_flights = SingleFlight("embedding")
+        self.ready = threading.Event()
+
+    @property
+    def manager(self) -> ElasticsearchManager:
+        with self._manager_lock:
+            if self._manager is None:
+                with stage("es_connect"):
+                    provider = get_embedding_provider()
+                    # Пачками кодируются только запросы к API; CLIP и hashing считают локально
+                    if provider.name == "openai" and EMBED_BATCH_WINDOW_MS > 0:
+                        provider = BatchingEmbeddingProvider(provider)
+                    provider = CachedEmbeddingProvider(provider, self.embedding_cache,
+                                                       self.embedding_flights)
+                    self._manager = ElasticsearchManager(provider=provider)
+                    if ES_MSEARCH_WINDOW_MS > 0:
+                        self._manager.enable_msearch_batching(ES_MSEARCH_WINDOW_MS / 1000,
+                                                              ES_MSEARCH_MAX_BATCH)
+            return self._manager
+
+    def _fetch(self, key: tuple, search) -> tuple:
+        ids = tuple(int(r['id']) for r in search())
+        # Пустой ответ не кешируется: ошибки ES тоже дают пустой список
+        if ids:
+            self.cache.put(key, ids)
+        return ids
+
+    def _leg(self, breaker: CircuitBreaker, fn, deadline: float, hedge: bool = False):
+        """
+        Один этап поиска через предохранитель и с оставшимся бюджетом.
+
+        Args:
+            breaker (CircuitBreaker): Предохранитель зависимости этапа.
+            fn: Функция (таймаут в секундах) → результат.
+            deadline (float): Момент time.monotonic(), к которому нужен ответ.
+            hedge (bool): Дублировать медленный запрос (только идемпотентные чтения).
+
+        Returns:
+            Результат fn или None, если этап пропущен или не удался.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not breaker.allow():
+            return None
+        # Контекст снимается в вызывающем потоке, чтобы отрезки этапа попали в его трассу;
+        # каждый запуск (и дублирующий) входит в свою копию: Context.run не реентерабелен
+        ctx = contextvars.copy_context()
+        try:
+            result = call_with_deadline(
+                self._stage_executor, lambda: ctx.copy().run(fn, remaining),
+                remaining, self.hedge_after if hedge else None,
+            )
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning(f"Этап поиска ({breaker.name}) не удался: {type(e).__name__}: {e}")
+            return None
+        breaker.record_success()
+        return result
+
+    def _degraded(self, key: tuple, query: str, k: int, partial: list | None) -> tuple:
+        """Ответ по запасному пути: устаревший кеш, частичные результаты, локальный поиск."""
+        stale = self.cache.get_stale(key)
+        if stale:
+            DEGRADED_SEARCHES.labels("stale_cache").inc()
+            return stale
+        if partial:
+            DEGRADED_SEARCHES.labels("text_only").inc()
+            return tuple(int(r['id']) for r in partial)
+        try:
+            local = tuple(self.local_search(query, k))
+        except Exception as e:
+            logger.error(f"Ошибка локального поиска: {e}")
+            local = ()
+        DEGRADED_SEARCHES.labels("local" if local else "empty").inc()
+        return local
+
+    @operation("search_with_hybrid")
+    def _fetch_hybrid(self, key: tuple, query: str, k: int) -> tuple:
+        """
+        Гибридный поиск как ElasticsearchManager.search_with_hybrid (текст 2*k,
+        при нехватке — KNN без дублей), но в пределах бюджета и с запасными путями.
+        Кешируется только полный ответ.
+        """
+        deadline = time.monotonic() + self.budget
+        manager = self.manager
+        text = self._leg(self.es_breaker,
+                         lambda timeout: manager.search_text(query, k * 2, timeout=timeout),
+                         deadline, hedge=True)
+        if text is None:
+            return self._degraded(key, query, k, None)
+        if len(text) >= k:
+            return self._fetch(key, lambda: text[:k])
+
+        KNN_FALLBACKS.labels("search_with_hybrid").inc()
+        knn = self._knn(manager, query, k, deadline)
+        if knn is None:
+            return self._degraded(key, query, k, text)
+        text_ids = {str(doc['id']) for doc in text}
+        filtered = [doc for doc in knn if str(doc['id']) not in text_ids]
+        return self._fetch(key, lambda: text + filtered[: k - len(text)])
+
+    def _knn(self, manager: ElasticsearchManager, query: str, k: int, deadline: float):
+        """Эмбеддинг запроса и KNN-поиск в пределах бюджета; None — этап не удался."""
+        embedded = self._leg(self.embedding_breaker,
+                             lambda timeout: manager._embed_query(manager.embedding_text(query),
+                                                                  timeout),
+                             deadline)
+        if embedded is None:
+            return None
+        field, vector = embedded
+        return self._leg(self.es_breaker,
+                         lambda timeout: manager.search_vector(field, vector, k, timeout=timeout),
+                         deadline, hedge=True)
+
+    @operation("search")
+    def _fetch_search(self, key: tuple, query: str, k: int) -> tuple:
+        """
+        Поиск как ElasticsearchManager.search (emoji — сразу KNN, иначе текст,
+        при пустом результате — KNN), но в пределах бюджета и с запасными путями.
+        """
+        deadline = time.monotonic() + self.budget
+        manager = self.manager
+        if not manager._is_emoji_only(query):
+            text = self._leg(self.es_breaker,
+                             lambda timeout: manager.search_text(query, k, timeout=timeout),
+                             deadline, hedge=True)
+            if text is None:
+                return self._degraded(key, query, k, None)
+            if text:
+                return self._fetch(key, lambda: text)
+        KNN_FALLBACKS.labels("search").inc()
+        knn = self._knn(manager, query, k, deadline)
+        if knn is None:
+            return self._degraded(key, query, k, None)
+        return self._fetch(key, lambda: knn)
+
+    def hybrid(self, query: str, k: int = 100, alpha: float = 0.5) -> list:
+        """
+        Гибридный поиск с кешем результатов, бюджетом задержки и запасными путями.
+
+        Args:
+            query (str): Тема поиска.
+            k (int): Сколько мемов найти.
+            alpha (float): Вес KNN-результатов (как и в search_with_hybrid, не используется).
+
+        Returns:
+            list: id мемов в порядке релевантности.
+        """
+        key = ("hybrid", normalize_query(query), k)
+        ids = self.cache.get(key)
+        if ids is None:
+            ids = self.flights.do(key, lambda: self._fetch_hybrid(key, query, k))
+        return list(ids)
+
+    async def ahybrid(self, query: str, k: int = 100, alpha: float = 0.5) -> list:
+        """
+        Асинхронный hybrid: попадание в кеш — без пула потоков, промах — один
+        поиск в пуле потоков на все одновременные одинаковые запросы.
+        """
+        key = ("hybrid", normalize_query(query), k)
+        ids = self.cache.get(key)
+        if ids is None:
+            ids = await self.flights.ado(key, lambda: self._fetch_hybrid(key, query, k))
+        return list(ids)
+
+    def search(self, query: str, k: int = 5) -> list:
+        """
+        Поиск как ElasticsearchManager.search (текст, при пустом результате — KNN)
+        с кешем, бюджетом задержки и запасными путями, как у hybrid.
+        """
+        key = ("search", normalize_query(query), k)
+        ids = self.cache.get(key)
+        if ids is None:
+            ids = self.flights.do(key, lambda: self._fetch_search(key, query, k))
+        return list(ids)
+
+    async def run(self, fn, *args):
+        """Выполняет блокирующую fn(*args) в пуле сервиса с контекстом вызывающего."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(contextvars.copy_context().run, fn, *args)
+        )
+
+    async def warm_up(self, queries, concurrency: int = WARMUP_CONCURRENCY, k: int = 100) -> dict:
+        """
+        Прогревает кеши: эмбеддинги всех тем (в виде embedding_text, как при
+        поиске) одним запросом к провайдеру, затем гибридный поиск не больше
+        concurrency тем одновременно.
+
+        Ошибки отдельных тем только логируются; по окончании выставляется ready.
+
+        Args:
+            queries: Темы поиска.
+            concurrency (int): Одновременных поисков.
+            k (int): Размер выдачи, как у process_count.
+
+        Returns:
+            dict: queries — прогрето тем, failed — с ошибкой, seconds — длительность.
+        """
+        started = time.perf_counter()
+        queries = list({normalize_query(q): q for q in queries if q.strip()}.values())
+        failed = 0
+        try:
+            if queries:
+                manager = await self.run(lambda: self.manager)
+                # Тот же текст, что кодирует _fetch_hybrid, иначе ключи кеша эмбеддингов
+                # разойдутся (например, у тем из emoji)
+                texts = list(dict.fromkeys(manager.embedding_text(q) for q in queries))
+                await self.run(manager.provider.embed, texts)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def warm(query: str) -> None:
+                nonlocal failed
+                async with semaphore:
+                    try:
+                        await self.ahybrid(query, k)
+                    except Exception as e:
+                        failed += 1
+                        logger.warning(f"Прогрев темы '{query}' не удался: {e}")
+
+            await asyncio.gather(*(warm(q) for q in queries))
+        except Exception as e:
+            failed = len(queries)
+            logger.error(f"Ошибка прогрева кешей поиска: {e}")
+        finally:
+            self.ready.set()
+        return {"queries": len(queries), "failed": failed,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+
+def hot_queries(top: int = WARMUP_TOP_N, days: float = WARMUP_DAYS,
+                path: str | None = WARMUP_QUERIES_FILE) -> list:
+    """
+    Популярные темы для прогрева.
+
+    Args:
+        top (int): Сколько тем вернуть.
+        days (float): За сколько последних дней смотреть журнал событий.
+        path (str | None): Файл с темами (по одной в строке, # — комментарий);
+            если задан, журнал событий не читается.
+
+    Returns:
+        list: Темы, самые популярные первыми; темы, которые ни разу
+            ничего не нашли, пропускаются.
+    """
+    if top <= 0:
+        return []
+    if path:
+        with open(path, encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+        return [line for line in lines if line and not line.startswith("#")][:top]
+    sink = make_sink()
+    if sink is None:
+        return []
+    report = aggregate_queries(sink.read(time.time() - days * 86400), top=top)
+    zero = dict(report["zero_result"])
+    return [query for query, count in report["popular"] if zero.get(query, 0) < count]
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_search_service() -> SearchService:
+    """Возвращает общий для процесса SearchService."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SearchService()
+    return _service
+
+
+register_cache("search_results", lambda: _service.cache.stats() if _service else {})
+register_cache("query_embedding", lambda: _service.embedding_cache.stats() if _service else {})
+register_readiness("warmup", lambda: _service is not None and _service.ready.is_set())
@@ -0,0 +1,180 @@
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+DB_PATH = "memes.db"
+
+SUGGEST_LIMIT = 10       # подсказок по умолчанию
+PRECOMPUTED_PREFIX = 2   # для префиксов до этой длины лучшие подсказки считаются заранее
+
+# Тег — строка в кавычках или фрагмент до запятой: "чисто 'я устал'", кринж
+_TAG_RE = re.compile(r'\s*"([^"]*)"|([^,]+)')
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_tag(tag: str) -> str:
+    """Приводит тег к виду для поиска: нижний регистр, ё → е, одиночные пробелы, без кавычек."""
+    tag = _SPACES_RE.sub(" ", tag.strip().strip('"\'').strip()).casefold()
+    return tag.replace("ё", "е")
+
+
+def parse_tags(tags: str | None) -> list:
+    """
+    Разбирает строку тегов мема из колонки memes.tags.
+
+    Args:
+        tags (str | None): Теги через запятую, часть — в двойных кавычках.
+
+    Returns:
+        list: Теги в исходном написании, без пустых и повторов.
+    """
+    if not tags or tags == '-':
+        return []
+    result, seen = [], set()
+    for quoted, plain in _TAG_RE.findall(tags):
+        tag = _SPACES_RE.sub(" ", (quoted or plain).strip().strip('"').strip())
+        key = normalize_tag(tag)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(tag)
+    return result
+
+
+class TagIndex:
+    """
+    Словарь тегов в памяти: отсортированный массив нормализованных тегов,
+    частоты и списки id мемов (posting lists) для каждого тега.
+
+    complete() — подсказки по префиксу (двоичный поиск по массиву, для коротких
+    префиксов ответ посчитан заранее), lookup() и match_query() — точный поиск
+    по словарю. Индекс неизменяем и строится целиком при старте бота.
+    """
+
+    def __init__(self, memes=()):
+        """
+        Args:
+            memes: Пары (meme_id, строка тегов).
+        """
+        postings, spellings = {}, {}
+        for meme_id, tags in memes:
+            for tag in parse_tags(tags):
+                key = normalize_tag(tag)
+                postings.setdefault(key, array("i")).append(meme_id)
+                spellings.setdefault(key, Counter())[tag] += 1
+
+        self.keys = sorted(postings)
+        self._position = {key: i for i, key in enumerate(self.keys)}
+        self.postings = [array("i", sorted(set(postings[key]))) for key in self.keys]
+        self.frequencies = array("i", map(len, self.postings))
+        # Показывается самое частое написание тега
+        self.labels = [spellings[key].most_common(1)[0][0] for key in self.keys]
+
+        top = {}
+        for i, key in enumerate(self.keys):
+            for length in range(min(PRECOMPUTED_PREFIX, len(key)) + 1):
+                top.setdefault(key[:length], []).append(i)
+        self._top = {
+            prefix: self._best(positions, SUGGEST_LIMIT) for prefix, positions in top.items()
+        }
+
+    @classmethod
+    def from_db(cls, db_path: str = DB_PATH) -> "TagIndex":
+        """Строит индекс по колонке tags базы мемов (пустой, если базы нет)."""
+        if not os.path.exists(db_path):
+            return cls()
+        with sqlite3.connect(db_path) as conn:
+            return cls(conn.execute("SELECT id, tags FROM memes WHERE tags IS NOT NULL"))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _best(self, positions, limit: int) -> list:
+        """Позиции самых частых тегов; при равной частоте — по алфавиту."""
+        return heapq.nsmallest(limit, positions, key=lambda i: (-self.frequencies[i], i))
+
+    def complete(self, prefix: str, limit: int = SUGGEST_LIMIT) -> list:
+        """
+        Подсказывает теги, начинающиеся с prefix, самые частые первыми.
+
+        Args:
+            prefix (str): Начало тега в любом регистре; пустой — самые частые теги.
+            limit (int): Сколько подсказок вернуть.
+
+        Returns:
+            list: Пары (тег, число мемов с ним).
+        """
+        prefix = normalize_tag(prefix)
+        if len(prefix) <= PRECOMPUTED_PREFIX and limit <= SUGGEST_LIMIT:
+            best = self._top.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + "\U0010ffff", start)
+            best = self._best(range(start, end), limit)
+        return [(self.labels[i], self.frequencies[i]) for i in best]
+
+    def lookup(self, tag: str) -> array:
+        """id мемов с тегом tag (пустой массив, если такого тега нет)."""
+        i = self._position.get(normalize_tag(tag))
+        return self.postings[i] if i is not None else array("i")
+
+    def match_query(self, query: str) -> list | None:
+        """
+        Отвечает на запрос, который целиком состоит из известных тегов.
+
+        Запрос — один тег или несколько через запятую; результат — мемы,
+        у которых есть все эти теги.
+
+        Args:
+            query (str): Тема поиска пользователя.
+
+        Returns:
+            list | None: id мемов по возрастанию; None, если запрос не чисто
+                теговый или таких мемов нет (тогда нужен полнотекстовый поиск).
+        """
+        keys = [normalize_tag(part) for part in query.split(",")]
+        if not keys or not all(key in self._position for key in keys):
+            return None
+        lists = sorted((self.postings[self._position[key]] for key in keys), key=len)
+        result = set(lists[0])
+        for postings in lists[1:]:
+            result.intersection_update(postings)
+        return sorted(result) or None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_tag_index(db_path: str = DB_PATH) -> TagIndex:
+    """Возвращает индекс тегов, строя его из базы при первом вызове."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TagIndex.from_db(db_path)
+    return _index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Подсказки по словарю тегов мемов")
+    parser.add_argument("prefixes", nargs="*", help="префиксы для подсказок")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--limit", type=int, default=SUGGEST_LIMIT)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = TagIndex.from_db(args.db)
+    print(f"[i] Тегов: {len(index)}, индекс построен за {time.perf_counter() - started:.3f} с")
+    for prefix in args.prefixes:
+        started = time.perf_counter()
+        suggestions = index.complete(prefix, args.limit)
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        print(f"[+] {prefix!r} ({elapsed_us:.0f} мкс): "
+              + ", ".join(f"{tag} ({count})" for tag, count in suggestions))
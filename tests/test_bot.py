@@ -1,6 +1,8 @@
 import pytest
-from unittest.mock import patch, AsyncMock, MagicMock
+from unittest.mock import ANY, patch, AsyncMock, MagicMock
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import ReplyKeyboardRemove
+from search_service import SearchService
 from bot import (
     MemeStates,
     process_action,
@@ -11,6 +13,17 @@ from bot import (
     Texts,
 )
 pytest_plugins = ("pytester",)
+
+
+def _es_manager(text_results, knn_results=()):
+    """Мок ElasticsearchManager для гибридного поиска SearchService."""
+    manager = MagicMock()
+    manager.search_text.return_value = list(text_results)
+    manager.embedding_text.side_effect = lambda query: query
+    manager._embed_query.return_value = ("image_embedding", [0.1, 0.2])
+    manager.search_vector.return_value = list(knn_results)
+    return manager
+
 @pytest.mark.asyncio
 async def test_send_meme_with_description_success(mock_bot):
     """
@@ -83,8 +96,7 @@ async def test_process_count_with_mock_db(mock_message, mock_state):
     mock_message.text = "5"
     mock_state.get_data.return_value = {'topic': 'тест'}
 
-    es_mock_instance = MagicMock()
-    es_mock_instance.search_with_hybrid.return_value = [{'id': str(i)} for i in range(1, 11)]
+    es_mock_instance = _es_manager([{'id': str(i)} for i in range(1, 11)])
 
     db_memes = [(i, f'img_{i}', f'name_{i}', f'desc_{i}') for i in range(1, 11)]
     mock_cursor = MagicMock()
@@ -92,7 +104,8 @@ async def test_process_count_with_mock_db(mock_message, mock_state):
     mock_conn = MagicMock()
     mock_conn.cursor.return_value = mock_cursor
 
-    with patch('bot.ElasticsearchManager', return_value=es_mock_instance) as mock_es_class, \
+    service = SearchService(manager=es_mock_instance)
+    with patch('bot.get_search_service', return_value=service), \
          patch('bot.sqlite3.connect') as mock_connect, \
          patch('bot.random.sample', lambda population, k: population[:k]), \
          patch('bot.bot', AsyncMock()):
@@ -101,10 +114,16 @@ async def test_process_count_with_mock_db(mock_message, mock_state):
         
         await process_count(mock_message, mock_state)
 
-        mock_es_class.assert_called_once()
-        es_mock_instance.search_with_hybrid.assert_called_once_with('тест', k=100, alpha=0.5)
+        es_mock_instance.search_text.assert_called_once_with('тест', 200, timeout=ANY)
+        es_mock_instance.search_vector.assert_called_once_with(
+            'image_embedding', [0.1, 0.2], 100, timeout=ANY
+        )
         assert mock_message.answer.call_count > 0
 
+        # Повторная тема отвечается из кеша результатов, без второго запроса к ES
+        await process_count(mock_message, mock_state)
+        es_mock_instance.search_text.assert_called_once()
+
 
 @pytest.mark.asyncio
 async def test_process_action_more_memes(mock_message, mock_state):
@@ -145,3 +164,138 @@ async def test_process_action_new_theme(mock_message, mock_state):
         reply_markup=ReplyKeyboardRemove()
     )
     mock_state.set_state.assert_awaited_once_with(MemeStates.waiting_for_topic)
+
+
+@pytest.mark.asyncio
+async def test_send_meme_falls_back_to_cached_file(mock_bot):
+    """
+    Проверяет, что при отказе Telegram скачать картинку по ссылке
+    мем отправляется файлом из локального кеша изображений.
+    """
+    test_meme = (7, 'https://example.com/7.jpg', 'Test Meme', '')
+    mock_bot.send_photo.side_effect = [
+        TelegramBadRequest(method=MagicMock(), message='failed to get HTTP URL content'),
+        None,
+    ]
+    cache = MagicMock()
+    cache.aget = AsyncMock(return_value=b'image-bytes')
+
+    with patch('bot.bot', mock_bot), patch('bot.get_image_cache', return_value=cache):
+        result = await send_meme_with_description(123, test_meme)
+
+    assert result is True
+    cache.aget.assert_awaited_once_with('https://example.com/7.jpg')
+    photo = mock_bot.send_photo.await_args_list[1].kwargs['photo']
+    assert photo.data == b'image-bytes'
+
+
+@pytest.mark.asyncio
+async def test_process_action_similar_memes(mock_message, mock_state, mock_bot):
+    """
+    Проверяет кнопку "Похожие": соседи последних показанных мемов берутся
+    из графа без Elasticsearch, показанные пропускаются, отправленные
+    становятся опорой для следующего нажатия.
+    """
+    import numpy as np
+    from neighbor_graph import NeighborGraph
+
+    mock_message.text = Texts.similar_memes
+    mock_state.get_data.return_value = {'shown_memes': [1, 2], 'last_sent': [1]}
+    graph = NeighborGraph({1: np.array([2, 3, 4], dtype='<i4').tobytes()})
+    db_memes = [(4, 'img_4', 'name_4', ''), (3, 'img_3', 'name_3', '')]
+
+    with patch('bot.bot', mock_bot), \
+         patch('bot.get_neighbor_graph', return_value=graph), \
+         patch('bot.load_memes', return_value=db_memes) as mock_load, \
+         patch('bot.get_search_service') as mock_service:
+        await process_action(mock_message, mock_state)
+
+    mock_service.assert_not_called()
+    mock_load.assert_called_once_with([3, 4])
+    photos = [c.kwargs['photo'] for c in mock_bot.send_photo.await_args_list]
+    assert photos == ['img_3', 'img_4']
+    mock_state.update_data.assert_awaited_once_with(shown_memes=[1, 2, 3, 4], last_sent=[3, 4])
+    mock_state.set_state.assert_awaited_once_with(MemeStates.waiting_for_action)
+
+
+@pytest.mark.asyncio
+async def test_process_count_pure_tag_query_skips_elasticsearch(mock_message, mock_state):
+    """
+    Проверяет, что тема из известного тега решается индексом тегов
+    без обращения к Elasticsearch.
+    """
+    from tag_index import TagIndex
+
+    mock_message.text = "2"
+    mock_state.get_data.return_value = {'topic': 'Кринж'}
+    index = TagIndex([(1, 'кринж, кот'), (2, 'кот'), (3, 'кринж')])
+
+    with patch('bot.get_tag_index', return_value=index), \
+         patch('bot.load_memes', return_value=[(1, 'img_1', 'n1', ''), (3, 'img_3', 'n3', '')]) \
+            as mock_load, \
+         patch('bot.get_search_service') as mock_service, \
+         patch('bot.random.sample', lambda population, k: population[:k]), \
+         patch('bot.bot', AsyncMock()):
+        await process_count(mock_message, mock_state)
+
+    mock_service.assert_not_called()
+    mock_load.assert_called_once_with([1, 3])
+
+
+@pytest.mark.asyncio
+async def test_inline_query_prefers_cached_file_ids():
+    """
+    Проверяет инлайн-ответ: уже отправленный мем отдаётся по file_id,
+    остальные — по ссылке, в порядке выдачи; неполный ответ кешируется на секунду.
+    """
+    from types import SimpleNamespace
+    from aiogram.types import InlineQueryResultCachedPhoto, InlineQueryResultPhoto
+    from bot import inline_query_handler
+    from inline_search import FileIdRegistry
+
+    inline = MagicMock()
+    inline.resolve = AsyncMock(return_value=((2, 1), False))
+    registry = FileIdRegistry()
+    registry.remember(1, SimpleNamespace(photo=[SimpleNamespace(file_id="AgAC1")]))
+    query = MagicMock()
+    query.query, query.from_user.id = "кот", 7
+    query.answer = AsyncMock()
+
+    with patch('bot.get_inline_search', return_value=inline), \
+         patch('bot.file_ids', registry), \
+         patch('bot.load_memes', return_value=[(1, 'a/1.png', 'первый', ''),
+                                               (2, 'https://img.example/2.jpg', 'второй', '')]):
+        await inline_query_handler(query)
+
+    inline.resolve.assert_awaited_once_with(7, "кот")
+    results = query.answer.await_args.args[0]
+    assert isinstance(results[0], InlineQueryResultPhoto)
+    assert results[0].photo_url == 'https://img.example/2.jpg'
+    assert isinstance(results[1], InlineQueryResultCachedPhoto)
+    assert results[1].photo_file_id == "AgAC1"
+    assert query.answer.await_args.kwargs["cache_time"] == 1
+
+
+@pytest.mark.asyncio
+async def test_handlers_record_events(mock_message, mock_state, mock_bot):
+    """Проверяет, что поиск без результатов и отправка мема попадают в журнал событий."""
+    from event_log import EventLog
+    from tests.test_event_log import RecordingSink
+
+    log = EventLog(RecordingSink())
+    mock_message.text = "3"
+    mock_message.chat.id = 5
+    mock_state.get_data.return_value = {'topic': 'пельмени'}
+    es_mock = _es_manager([])
+
+    with patch('bot.get_event_log', return_value=log), \
+         patch('bot.get_search_service', return_value=SearchService(manager=es_mock)), \
+         patch('bot.bot', mock_bot):
+        await process_count(mock_message, mock_state)
+        await send_meme_with_description(5, (1, 'image_data', 'n', ''))
+
+    log.flush()
+    search, send = log.sink.batches[0]
+    assert (search["kind"], search["query"], search["results"], search["result"]) == \
+        ("search", "пельмени", 0, "es")
+    assert (send["kind"], send["meme_id"], send["result"]) == ("send", 1, "ok")
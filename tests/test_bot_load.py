@@ -0,0 +1,29 @@
+import bot
+from benchmarks.bot_load import simulate_load
+
+
+async def test_simulate_load_walks_full_flow_and_restores_bot():
+    """
+    Проверяет, что симулятор проводит пользователей через весь сценарий поиска,
+    считает вызовы Bot API и ES и возвращает боту настоящие сессию и сервис поиска.
+    """
+    session = bot.bot.session
+    get_service = bot.get_search_service
+
+    report = await simulate_load(
+        [3], docs=40, dim=16, telegram_latency_ms=0, es_latency_ms=0,
+        embed_latency_ms=0, trace_memory=False
+    )
+
+    level = report["levels"][3]
+    assert set(level["handlers"]) == {
+        "cmd_start", "handle_start_search", "process_topic", "process_count", "process_action"
+    }
+    assert level["handlers"]["process_count"]["count"] == 6
+    assert level["updates"] == 18
+    assert level["calls_per_flow"]["telegram.sendPhoto"] >= 2
+    assert level["calls_per_flow"]["es._search"] >= 2
+    assert "c3/loop_lag" in report["latency"]
+
+    assert bot.bot.session is session
+    assert bot.get_search_service is get_service
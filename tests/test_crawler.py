@@ -0,0 +1,204 @@
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "data_base"))
+
+from crawler import (  # noqa: E402
+    HostRateLimiter,
+    MemeCrawler,
+    UrlRegistry,
+    reparse_archive,
+    write_bulk_file,
+)
+from html_archive import HtmlArchive  # noqa: E402
+from parsing import HTML_PARSERS, extract_meme, extract_post_links  # noqa: E402
+
+ARTICLE_HTML = """
+<html><body>
+<h1 itemprop="headline">{name}</h1>
+<figure class="s-post-media-img post-thumbnail post-media-b"><img src="{image}"></figure>
+<div itemprop="articleBody"><p>{description}</p><p>Второй абзац</p></div>
+</body></html>
+"""
+
+LIST_HTML = """
+<html><body><div class="bb-col col-content">
+{posts}
+</div></body></html>
+"""
+
+
+def _write_article(site: Path, slug: str, name: str, mtime: float | None = None) -> None:
+    path = site / "memes" / f"{slug}.html"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        ARTICLE_HTML.format(name=name, image=f"/img/{slug}.jpg", description=f"Про {name}"),
+        encoding="utf-8",
+    )
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _write_list(site: Path, page: int, base: str, slugs: list) -> None:
+    posts = "\n".join(
+        f'<article class="post"><a href="{base}/memes/{slug}.html">{slug}</a></article>'
+        for slug in slugs
+    )
+    path = site / "list" / "page" / str(page)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(LIST_HTML.format(posts=posts), encoding="utf-8")
+
+
+@pytest.fixture
+async def site(tmp_path):
+    """Локальный статический сайт (aiohttp add_static отдаёт ETag/Last-Modified и 304)."""
+    root = tmp_path / "site"
+    root.mkdir()
+    statuses = Counter()
+
+    async def count_statuses(request, response):
+        # Статус 304 FileResponse выставляет только в prepare
+        statuses[response.status] += 1
+
+    app = web.Application()
+    app.on_response_prepare.append(count_statuses)
+    app.router.add_static("/", root)
+    server = TestServer(app)
+    await server.start_server()
+    base = str(server.make_url("")).rstrip("/")
+    try:
+        yield root, base, statuses
+    finally:
+        await server.close()
+
+
+@pytest.mark.parametrize("parser", HTML_PARSERS)
+def test_extract_functions_parse_fixture_html(parser):
+    """Проверяет разбор страницы статьи и страницы списка без сети каждым бэкендом."""
+    if parser != "html.parser":
+        pytest.importorskip("lxml")
+    html = ARTICLE_HTML.format(name="Кот <b>и</b> пёс", image="/c.jpg", description="Мем")
+    meme = extract_meme(html, parser)
+    assert meme == {"name": "Котипёс", "description": "Мем", "image": "/c.jpg"}
+    empty = {"name": "-", "description": "-", "image": "-"}
+    assert extract_meme("<html></html>", parser) == empty
+    assert extract_meme("", parser) == empty
+
+    html = LIST_HTML.format(posts='<article class="post"><a href="/a">a</a></article>'
+                                  '<article class="post big"><a>-</a><a href="/b">b</a></article>'
+                                  '<article class="poster"><a href="/c">c</a></article>')
+    assert extract_post_links(html, parser) == ["/a", "/b"]
+    assert extract_post_links("<html></html>", parser) == []
+
+
+async def test_incremental_crawl_keeps_ids_and_uses_conditional_requests(site, tmp_path):
+    """
+    Проверяет полный цикл на локальном сайте:
+    первый обход скачивает всё, повторный получает только 304,
+    изменённая и новая статьи обрабатываются, id остаются прежними.
+    """
+    root, base, statuses = site
+    old = time.time() - 3600
+    for slug in ("a", "b", "c"):
+        _write_article(root, slug, f"Мем {slug}", mtime=old)
+    _write_list(root, 1, base, ["a", "b"])
+    _write_list(root, 2, base, ["c", "a"])
+    registry_path = str(tmp_path / "registry.json")
+
+    def crawl():
+        registry = UrlRegistry(registry_path)
+        crawler = MemeCrawler(f"{base}/list/page/", registry, tags={2: "тег"},
+                              concurrency=4, host_interval=0)
+        return registry, crawler
+
+    registry, crawler = crawl()
+    stats = await crawler.crawl(range(1, 3))
+    registry.save()
+    assert stats["new"] == 3 and stats["failed"] == 0
+    records = registry.records()
+    assert [(r["id"], r["name"]) for r in records] == [
+        ("1", "Мем a"), ("2", "Мем b"), ("3", "Мем c")
+    ]
+    assert records[1]["tags"] == "тег"
+
+    statuses.clear()
+    registry, crawler = crawl()
+    stats = await crawler.crawl(range(1, 3))
+    registry.save()
+    assert stats["not_modified"] == 3 and stats["fetched"] == 0
+    assert statuses[304] == 3
+
+    _write_article(root, "b", "Мем b (новая версия)")
+    _write_article(root, "d", "Мем d")
+    _write_list(root, 1, base, ["d", "a", "b"])
+    registry, crawler = crawl()
+    stats = await crawler.crawl(range(1, 3))
+    registry.save()
+    assert (stats["new"], stats["changed"], stats["not_modified"]) == (1, 1, 2)
+    names = {r["id"]: r["name"] for r in registry.records()}
+    assert names == {"1": "Мем a", "2": "Мем b (новая версия)", "3": "Мем c", "4": "Мем d"}
+
+
+async def test_missing_pages_are_counted_as_failures(site, tmp_path):
+    """Проверяет, что 404 статьи не роняет обход и не попадает в выходной файл."""
+    root, base, _ = site
+    _write_article(root, "a", "Мем a")
+    _write_list(root, 1, base, ["a", "missing"])
+    registry = UrlRegistry(str(tmp_path / "registry.json"))
+    crawler = MemeCrawler(f"{base}/list/page/", registry, host_interval=0)
+
+    stats = await crawler.crawl([1])
+    output = tmp_path / "memes_base.json"
+    write_bulk_file(registry.records(), str(output))
+
+    assert stats["new"] == 1 and stats["failed"] == 1
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[0]) == {"index": {"_index": "first_index", "_id": 1}}
+    assert json.loads(lines[1])["name"] == "Мем a"
+
+
+async def test_host_rate_limiter_spaces_requests():
+    """Проверяет паузу между запросами к одному хосту и независимость хостов."""
+    limiter = HostRateLimiter(interval=0.05)
+    started = time.perf_counter()
+    for _ in range(3):
+        await limiter.wait("example.com")
+    await limiter.wait("other.com")
+    elapsed = time.perf_counter() - started
+    assert 0.1 <= elapsed < 0.2
+
+
+async def test_archived_pages_reparse_without_network(site, tmp_path):
+    """
+    Проверяет, что краулер сохраняет статьи в архив, а повторный разбор
+    в пуле процессов пересобирает записи уже после остановки сайта.
+    """
+    root, base, _ = site
+    for slug in ("a", "b"):
+        _write_article(root, slug, f"Мем {slug}")
+    _write_list(root, 1, base, ["a", "b"])
+    archive = HtmlArchive(str(tmp_path / "archive"))
+    registry = UrlRegistry(str(tmp_path / "registry.json"))
+    crawler = MemeCrawler(f"{base}/list/page/", registry, host_interval=0, archive=archive)
+    await crawler.crawl([1])
+    archive.close()
+    assert len(archive) == 2
+
+    # Записи «испортились» (например, поменяли селекторы) — пересобираем из архива
+    registry.urls[f"{base}/memes/a.html"]["record"]["name"] = "старое"
+    registry.urls[f"{base}/unknown.html"] = {"id": 99}
+    stats = reparse_archive(HtmlArchive(str(tmp_path / "archive")), registry,
+                            processes=2, parser="html.parser")
+
+    assert (stats["reparsed"], stats["changed"], stats["unchanged"], stats["missing"]) == (
+        2, 1, 1, 1
+    )
+    assert [r["name"] for r in registry.records()] == ["Мем a", "Мем b"]
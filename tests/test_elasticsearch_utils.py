@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock, ANY
 
 from elasticsearch_utils import ElasticsearchManager
+from embedding_providers import ClipTextEmbeddingProvider
 
 
 @pytest.fixture
@@ -9,12 +10,12 @@ def manager():
     """
     Фикстура, создающая экземпляр ElasticsearchManager для тестов.
 
-    Заменяет внешние зависимости (Elasticsearch, OpenAI) и внутренние
+    Заменяет внешние зависимости (Elasticsearch, провайдер эмбеддингов) и внутренние
     методы поиска (_search_text_fields, _search_knn) на моки (MagicMock)
     для полной изоляции тестируемой логики.
     """
     with patch('elasticsearch_utils.Elasticsearch') as mock_es_class, \
-         patch('elasticsearch_utils.OpenAI') as mock_openai_class:
+         patch('elasticsearch_utils.get_embedding_provider'):
         
         mock_es_instance = mock_es_class.return_value
         mock_es_instance.ping.return_value = True
@@ -22,7 +23,6 @@ def manager():
         manager_instance = ElasticsearchManager(db_path='fake.db')
 
         manager_instance.es = mock_es_instance
-        manager_instance.client = mock_openai_class.return_value
         manager_instance.index_name = "test_index"
     
     manager_instance._search_text_fields = MagicMock()
@@ -116,3 +116,38 @@ def test_hybrid_search_falls_back_to_knn_on_no_text_results(manager):
     
     assert len(results) == k
     assert results[0]['id'] == 301
+
+
+def test_initialize_elasticsearch_adds_clip_field_to_existing_index(manager):
+    """Проверяет, что в существующий индекс без clip_embedding добавляется это поле."""
+    manager.es.indices.exists.return_value = True
+    manager.es.indices.get_mapping.return_value = {
+        "test_index": {"mappings": {"properties": {"image_embedding": {}}}}
+    }
+    manager.initialize_elasticsearch()
+    manager.es.indices.put_mapping.assert_called_once_with(index="test_index", properties=ANY)
+    assert "clip_embedding" in manager.es.indices.put_mapping.call_args.kwargs["properties"]
+
+
+def test_knn_with_clip_provider_does_not_call_openai():
+    """
+    Проверяет KNN-поиск с провайдером clip: запрос кодируется локально,
+    поиск идёт по полю clip_embedding, клиент OpenAI не создаётся.
+    """
+    with patch('elasticsearch_utils.Elasticsearch') as mock_es_class, \
+         patch('embedding_providers.OpenAI') as mock_openai_class, \
+         patch('embedding_providers.clip_utils.encode_text', return_value=[0.1] * 512):
+        mock_es_class.return_value.ping.return_value = True
+        mock_es_class.return_value.search.return_value = {
+            "hits": {"hits": [{"_source": {"db_id": 5, "name": "мем"}, "_score": 0.9}]}
+        }
+        clip_manager = ElasticsearchManager(
+            db_path='fake.db', provider=ClipTextEmbeddingProvider()
+        )
+
+        results = clip_manager._search_knn("кот", 3)
+
+    mock_openai_class.assert_not_called()
+    body = mock_es_class.return_value.search.call_args.kwargs["body"]
+    assert body["query"]["knn"]["field"] == "clip_embedding"
+    assert results[0]["id"] == 5
@@ -0,0 +1,60 @@
+import math
+from unittest.mock import MagicMock
+
+import pytest
+
+from embedding_providers import (
+    HashingEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+    get_embedding_provider,
+)
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_hashing_provider_is_deterministic_and_normalized():
+    """Одинаковый текст всегда даёт один и тот же нормированный вектор нужной длины."""
+    provider = HashingEmbeddingProvider(dim=256)
+
+    first, second = provider.embed(["грустный кот", "грустный кот"])
+
+    assert first == second
+    assert len(first) == 256
+    assert math.isclose(math.sqrt(sum(v * v for v in first)), 1.0, rel_tol=1e-9)
+
+
+def test_hashing_provider_keeps_similar_texts_close():
+    """Тексты с общими словами ближе друг к другу, чем тексты без общих слов."""
+    provider = HashingEmbeddingProvider(dim=512)
+    query, similar, other = provider.embed(["грустный кот", "очень грустный кот", "Илон Маск"])
+
+    assert _cosine(query, similar) > _cosine(query, other)
+
+
+def test_get_embedding_provider_returns_shared_instance():
+    """Фабрика возвращает один экземпляр провайдера на процесс."""
+    assert get_embedding_provider("hashing") is get_embedding_provider("hashing")
+
+
+def test_get_embedding_provider_rejects_unknown_name():
+    """Неизвестное имя провайдера — ошибка."""
+    with pytest.raises(ValueError):
+        get_embedding_provider("word2vec")
+
+
+def test_openai_with_options_uses_configured_client_copy():
+    """with_options отдаёт копию провайдера с настроенным клиентом, исходный не меняется."""
+    provider = OpenAIEmbeddingProvider(api_key="test")
+    provider.client = MagicMock()
+    limited = provider.with_options(timeout=0.5, max_retries=0)
+    limited.client.embeddings.create.return_value = MagicMock(data=[MagicMock(index=0,
+                                                                              embedding=[1.0])])
+
+    assert limited.embed(["кот"]) == [[1.0]]
+    provider.client.with_options.assert_called_once_with(timeout=0.5, max_retries=0)
+    assert limited.client is not provider.client
+    provider.client.embeddings.create.assert_not_called()
+    local = HashingEmbeddingProvider(dim=8)
+    assert local.with_options(timeout=1) is local
@@ -0,0 +1,80 @@
+import threading
+
+from event_log import (
+    EventLog,
+    JsonlEventSink,
+    SQLiteEventSink,
+    aggregate_queries,
+    make_sink,
+)
+
+
+class RecordingSink:
+    """Хранилище в памяти, запоминающее пачки и потоки записи."""
+
+    def __init__(self):
+        self.batches = []
+        self.threads = []
+
+    def write(self, events):
+        self.batches.append(list(events))
+        self.threads.append(threading.get_ident())
+
+
+def test_ring_buffer_drops_oldest_and_flushes_to_sqlite(tmp_path):
+    """Проверяет вытеснение старых событий из буфера и запись в SQLite с доп. полями."""
+    sink = SQLiteEventSink(str(tmp_path / "events.db"))
+    log = EventLog(sink, capacity=3, batch_size=2)
+    for i in range(5):
+        log.record("send", chat_id=1, meme_id=i, result="ok", error=None if i else "x")
+    assert len(log) == 3 and log.dropped == 2
+
+    log.flush()
+    events = list(sink.read())
+    assert [e["meme_id"] for e in events] == [2, 3, 4]
+    assert events[0]["kind"] == "send" and "data" not in events[0]
+    assert log.stats() == {"recorded": 5, "written": 3, "dropped": 2, "failed": 0}
+
+
+async def test_aflush_writes_batches_off_the_event_loop():
+    """Проверяет, что буфер пишется пачками в пуле потоков, а не в цикле событий."""
+    sink = RecordingSink()
+    log = EventLog(sink, batch_size=2)
+    for i in range(5):
+        log.record("search", query=f"q{i}", results=i)
+    await log.aflush()
+    assert [len(batch) for batch in sink.batches] == [2, 2, 1]
+    assert threading.get_ident() not in sink.threads
+    assert len(log) == 0
+
+
+def test_jsonl_sink_rotates_and_reads_all_files(tmp_path):
+    """Проверяет ротацию JSONL по размеру и чтение событий из всех файлов по порядку."""
+    sink = JsonlEventSink(str(tmp_path / "events"), max_bytes=200)
+    log = EventLog(sink, batch_size=2)
+    for i in range(10):
+        log.record("search", query="котики", results=i)
+    log.flush()
+    assert len(sink.files()) > 1
+    assert [e["results"] for e in sink.read()] == list(range(10))
+    assert list(sink.read(since=float("inf"))) == []
+
+
+def test_disabled_log_and_aggregation():
+    """Проверяет отключённый журнал и сводку популярных и пустых запросов."""
+    log = EventLog(make_sink("off"))
+    log.record("search", query="кот")
+    assert len(log) == 0
+
+    events = [
+        {"kind": "search", "query": "Кот", "results": 5},
+        {"kind": "search", "query": "кот ", "results": 3},
+        {"kind": "search", "query": "пельмени", "results": 0},
+        {"kind": "send", "meme_id": 7, "result": "failed"},
+        {"kind": "send", "meme_id": 8, "result": "ok"},
+    ]
+    report = aggregate_queries(events)
+    assert report["searches"] == 3
+    assert report["popular"] == [("кот", 2), ("пельмени", 1)]
+    assert report["zero_result"] == [("пельмени", 1)]
+    assert report["failed_sends"] == [(7, 1)]
@@ -1,140 +1,188 @@
 import sqlite3
 import json
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, MagicMock
 
-from generate_embeddings import get_embedding, main
+import pytest
 
+from embedding_providers import HashingEmbeddingProvider, OpenAIEmbeddingProvider
+from generate_embeddings import get_embedding, load_checkpoint, main, save_checkpoint
+from embedding_stub_server import start_stub_server
 
-@patch('generate_embeddings.client')
-def test_get_embedding_success(mock_client):
+
+@patch('generate_embeddings.get_embedding_provider')
+def test_get_embedding_success(mock_get_provider):
     """
-    Проверяет успешное получение эмбеддинга от API.
+    Проверяет успешное получение эмбеддинга от провайдера.
 
     Убеждается, что функция возвращает корректный вектор,
-    когда API отвечает успешно.
+    когда провайдер отвечает успешно.
     """
-    mock_response = MagicMock()
-    mock_response.data[0].embedding = [0.1, 0.2, 0.3]
-    mock_client.embeddings.create.return_value = mock_response
+    mock_get_provider.return_value.embed_one.return_value = [0.1, 0.2, 0.3]
 
     text = "тестовый текст"
     embedding = get_embedding(text)
 
     assert embedding == [0.1, 0.2, 0.3]
-    mock_client.embeddings.create.assert_called_once_with(
-        model="text-embedding-3-small",
-        input=text
-    )
+    mock_get_provider.return_value.embed_one.assert_called_once_with(text)
 
 
-@patch('generate_embeddings.client')
-def test_get_embedding_api_error(mock_client):
+@patch('generate_embeddings.get_embedding_provider')
+def test_get_embedding_api_error(mock_get_provider):
     """
     Проверяет обработку ошибки при вызове API.
 
-    Убеждается, что функция возвращает None, если клиент OpenAI
+    Убеждается, что функция возвращает None, если провайдер
     вызывает исключение.
     """
-    mock_client.embeddings.create.side_effect = Exception("API Error")
+    mock_get_provider.return_value.embed_one.side_effect = Exception("API Error")
 
     embedding = get_embedding("любой текст")
 
     assert embedding is None
 
 
-@patch('generate_embeddings.get_embedding')
-@patch('sqlite3.connect')
-def test_main_happy_path(mock_connect, mock_get_embedding):
+def test_openai_provider_keeps_input_order():
+    """
+    Проверяет, что пакетный вызов возвращает векторы в порядке входных текстов,
+    даже если API отдал их в другом порядке.
+    """
+    provider = OpenAIEmbeddingProvider(api_key="test")
+    provider.client = MagicMock()
+    first, second = MagicMock(index=0, embedding=[1.0]), MagicMock(index=1, embedding=[2.0])
+    provider.client.embeddings.create.return_value = MagicMock(data=[second, first])
+
+    assert provider.embed(["a", "b"]) == [[1.0], [2.0]]
+    provider.client.embeddings.create.assert_called_once_with(
+        model="text-embedding-3-small",
+        input=["a", "b"]
+    )
+
+
+@pytest.fixture
+def stub_client():
+    """
+    Фикстура: локальная заглушка эмбеддингов (429 на каждый 3-й запрос)
+    и провайдер OpenAI, направленный на неё.
+    """
+    server = start_stub_server(dim=8, rate_limit_every=3)
+    provider = OpenAIEmbeddingProvider(
+        dim=8,
+        api_key="test",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        max_retries=0,
+    )
+    with patch('generate_embeddings.get_embedding_provider', return_value=provider), \
+         patch('generate_embeddings.BACKOFF_BASE', 0.001), \
+         patch('generate_embeddings.BATCH_SIZE', 16), \
+         patch('generate_embeddings.COMMIT_EVERY', 32):
+        yield server
+    server.shutdown()
+
+
+def _make_db(path, count):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE memes (id INTEGER PRIMARY KEY, name TEXT, description TEXT)")
+    conn.executemany(
+        "INSERT INTO memes (id, name, description) VALUES (?, ?, ?)",
+        [(i, f"мем {i}", "   " if i % 10 == 0 else f"описание {i}") for i in range(1, count + 1)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_main_embeds_all_rows_in_batches(tmp_path, stub_client):
     """
-    Имитирует ситуацию, когда колонка 'embedding' успешно добавляется,
-    находятся мемы для обработки, и для них успешно генерируются
-    и сохраняются эмбеддинги.
+    Прогоняет задачу против локальной заглушки: все непустые описания
+    получают эмбеддинги, запросов к API меньше, чем строк, ошибки лимитов
+    переживаются повторами, чекпоинт после успешного запуска удаляется.
     """
-    mock_conn = mock_connect.return_value
-    mock_cursor = mock_conn.cursor.return_value
-    mock_cursor.fetchall.return_value = [(1, 'мем 1'), (2, 'мем 2')]
-    mock_get_embedding.return_value = [0.5, 0.6]
+    db_path = str(tmp_path / "memes.db")
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    _make_db(db_path, 200)
+
+    stats = main(db_path=db_path, checkpoint_path=checkpoint_path)
 
-    main()
+    conn = sqlite3.connect(db_path)
+    filled = conn.execute("SELECT COUNT(*) FROM memes WHERE embedding IS NOT NULL").fetchone()[0]
+    vector = json.loads(conn.execute("SELECT embedding FROM memes WHERE id = 1").fetchone()[0])
+    conn.close()
 
-    assert mock_cursor.execute.call_count > 2  
+    assert filled == 180
+    assert stats["processed"] == 180 and stats["failed"] == 0
+    assert len(vector) == 8
+    assert stub_client.input_count == 180
+    assert stub_client.request_count < 30
+    assert not (tmp_path / "checkpoint.json").exists()
 
-    mock_cursor.execute.assert_any_call("ALTER TABLE memes ADD COLUMN embedding TEXT")
 
-    mock_cursor.execute.assert_any_call(
-        """
-        SELECT id, description FROM memes 
-        WHERE embedding IS NULL AND description IS NOT NULL 
-        LIMIT ?
-    """, (5,))
+def test_main_resumes_from_checkpoint(tmp_path, stub_client):
+    """
+    Проверяет, что прерванный запуск продолжается с id из чекпоинта.
+    """
+    db_path = str(tmp_path / "memes.db")
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    _make_db(db_path, 50)
+    save_checkpoint(checkpoint_path, 30, False)
+
+    stats = main(db_path=db_path, checkpoint_path=checkpoint_path)
 
-    expected_update_calls = [
-        call("UPDATE memes SET embedding = ? WHERE id = ?", (json.dumps([0.5, 0.6]), 1)),
-        call("UPDATE memes SET embedding = ? WHERE id = ?", (json.dumps([0.5, 0.6]), 2)),
-    ]
-    mock_cursor.execute.assert_has_calls(expected_update_calls, any_order=True)
+    conn = sqlite3.connect(db_path)
+    ids = [r[0] for r in conn.execute("SELECT id FROM memes WHERE embedding IS NOT NULL")]
+    conn.close()
 
-    assert mock_conn.commit.call_count == 3  #тут 1 для ALTER, 2 для UPDATE
-    mock_conn.close.assert_called_once()
+    assert min(ids) == 31
+    assert stats["processed"] == 18
 
 
-@patch('generate_embeddings.get_embedding')
-@patch('sqlite3.connect')
-def test_main_column_already_exists(mock_connect, mock_get_embedding):
+def test_main_respects_limit(tmp_path, stub_client):
+    """
+    Проверяет, что limit ограничивает число обрабатываемых строк.
     """
-    Проверяет сценарий, когда колонка 'embedding' уже существует.
+    db_path = str(tmp_path / "memes.db")
+    _make_db(db_path, 100)
+
+    stats = main(db_path=db_path, limit=20, checkpoint_path=str(tmp_path / "c.json"))
+
+    assert stats["processed"] == 18
 
-    Убеждается, что скрипт корректно обрабатывает `sqlite3.OperationalError`
-    и продолжает выполнение.
 
-    Args:
-        mock_connect (MagicMock): Мок для `sqlite3.connect`.
-        mock_get_embedding (MagicMock): Мок для функции `get_embedding`.
+def test_limited_reembed_continues_where_previous_run_stopped(tmp_path):
     """
-    mock_conn = mock_connect.return_value
-    mock_cursor = mock_conn.cursor.return_value
-    
-    mock_cursor.execute.side_effect = [sqlite3.OperationalError, None]
-    mock_cursor.fetchall.return_value = [] 
+    Проверяет, что запуск --reembed --limit оставляет чекпоинт, следующий
+    продолжает с места остановки, а чекпоинт удаляется, когда таблица пройдена.
+    """
+    db_path = str(tmp_path / "memes.db")
+    checkpoint_path = str(tmp_path / "c.json")
+    _make_db(db_path, 30)
+    provider = MagicMock(wraps=HashingEmbeddingProvider(dim=8), field="image_embedding")
+    provider.with_options.return_value = provider
+
+    with patch('generate_embeddings.get_embedding_provider', return_value=provider):
+        first = main(db_path=db_path, limit=20, reembed=True, checkpoint_path=checkpoint_path)
+        assert load_checkpoint(checkpoint_path) == {"last_id": 20, "reembed": True}
+        second = main(db_path=db_path, limit=20, reembed=True, checkpoint_path=checkpoint_path)
 
-    main()
-    mock_cursor.execute.assert_any_call("ALTER TABLE memes ADD COLUMN embedding TEXT")
-    mock_cursor.execute.assert_any_call(
-        """
-        SELECT id, description FROM memes 
-        WHERE embedding IS NULL AND description IS NOT NULL 
-        LIMIT ?
-    """, (5,))
+    assert first["processed"] == 18 and second["processed"] == 9
+    assert not (tmp_path / "c.json").exists()
+    # Повторы делает сам скрипт, повторы клиента отключены
+    provider.with_options.assert_called_with(max_retries=0)
 
 
-@patch('generate_embeddings.get_embedding')
-@patch('sqlite3.connect')
-def test_main_embedding_fails_for_one_meme(mock_connect, mock_get_embedding):
+def test_main_runs_offline_with_hashing_provider(tmp_path):
     """
-    Проверяет, что UPDATE не вызывается для мема, у которого не удалось
-    получить эмбеддинг.
-    
+    Проверяет офлайн-прогон: провайдер hashing заполняет эмбеддинги без сети.
     """
-    mock_conn = mock_connect.return_value
-    mock_cursor = mock_conn.cursor.return_value
-    mock_cursor.fetchall.return_value = [(1, 'хороший мем'), (2, 'плохой мем')]
+    db_path = str(tmp_path / "memes.db")
+    _make_db(db_path, 30)
 
-    mock_get_embedding.side_effect = [[0.5, 0.6], None]
+    stats = main(db_path=db_path, checkpoint_path=str(tmp_path / "c.json"), provider_name="hashing")
 
-    main()
-    successful_update_call = call(
-        "UPDATE memes SET embedding = ? WHERE id = ?",
-        (json.dumps([0.5, 0.6]), 1)
-    )
-    all_execute_calls = mock_cursor.execute.call_args_list
-    
-    assert successful_update_call in all_execute_calls
-
-    update_calls_count = 0
-    for c in all_execute_calls: #смотрим сколько раз вызывается update
-        if 'UPDATE' in c[0][0]:
-            update_calls_count += 1
-            
-    assert update_calls_count == 1
-    
-    assert mock_conn.commit.call_count == 2
\ No newline at end of file
+    assert stats["processed"] == 27 and stats["failed"] == 0
+
+
+def test_main_rejects_clip_provider(tmp_path):
+    """
+    Провайдер clip кодирует запросы под картинки и для описаний не подходит.
+    """
+    with pytest.raises(ValueError):
+        main(db_path=str(tmp_path / "memes.db"), provider_name="clip")
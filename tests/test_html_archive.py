@@ -0,0 +1,50 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "data_base"))
+
+from html_archive import INDEX_NAME, HtmlArchive  # noqa: E402
+
+
+def test_append_and_read_back_latest_version(tmp_path):
+    """
+    Проверяет сохранение и чтение страниц: последняя версия побеждает,
+    повтор того же содержимого не пишет новую запись, архив переживает переоткрытие.
+    """
+    archive = HtmlArchive(str(tmp_path))
+    first = archive.append("https://m/1", "<p>Кот</p>", etag='"a"')
+    assert archive.append("https://m/1", "<p>Кот</p>") is first
+    archive.append("https://m/1", "<p>Кот v2</p>")
+    archive.append("https://m/2", "<p>Пёс</p>")
+    archive.close()
+
+    reopened = HtmlArchive(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.get("https://m/1") == "<p>Кот v2</p>"
+    assert reopened.get("https://m/2") == "<p>Пёс</p>"
+    assert reopened.get("https://m/3") is None
+    with open(tmp_path / INDEX_NAME, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_segments_roll_over_and_torn_index_line_is_ignored(tmp_path):
+    """
+    Проверяет переход на новый сегмент по размеру и устойчивость
+    к оборванной последней строке индекса после сбоя.
+    """
+    archive = HtmlArchive(str(tmp_path), max_segment_bytes=200)
+    pages = {f"https://m/{i}": os.urandom(150).hex() for i in range(4)}
+    for url, html in pages.items():
+        archive.append(url, html)
+    archive.close()
+    with open(tmp_path / INDEX_NAME, "a", encoding="utf-8") as f:
+        f.write('{"url": "https://m/broken", "segm')
+
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) == 4
+    reopened = HtmlArchive(str(tmp_path), max_segment_bytes=200)
+    assert "https://m/broken" not in reopened
+    for url, html in pages.items():
+        assert reopened.get(url) == html
+    reopened.append("https://m/new", "<p>новая</p>")
+    assert reopened.get("https://m/new") == "<p>новая</p>"
@@ -0,0 +1,147 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from image_cache import ImageCache, cache_key
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    """Отдаёт файлы из server.files с ETag и поддержкой If-None-Match."""
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        self.server.requests.append((path, self.headers.get('If-None-Match')))
+        body = self.server.files.get(path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{len(body)}-{body[:4].hex()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def image_server():
+    """Фикстура: локальный HTTP-сервер с тестовыми «картинками»."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ImageHandler)
+    server.files = {'/a.jpg': b'A' * 100, '/b.jpg': b'B' * 100, '/copy.jpg': b'A' * 100}
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+
+
+def test_second_get_is_served_from_disk(tmp_path, image_server):
+    """Повторный запрос свежей записи не обращается к сети."""
+    cache = ImageCache(cache_dir=str(tmp_path))
+    url = f'{image_server.base}/a.jpg'
+
+    assert cache.get(url) == b'A' * 100
+    assert cache.get(url) == b'A' * 100
+
+    assert len(image_server.requests) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path, image_server):
+    """Устаревшая запись перепроверяется условным запросом, тело повторно не скачивается."""
+    cache = ImageCache(cache_dir=str(tmp_path), ttl=0)
+    url = f'{image_server.base}/a.jpg'
+
+    cache.get(url)
+    assert cache.get(url) == b'A' * 100
+
+    assert image_server.requests[1][1] is not None
+    assert cache.revalidated == 1
+
+
+def test_presigned_signature_is_not_part_of_key():
+    """Подпись presigned-ссылки не влияет на ключ кеша."""
+    first = 'https://s3.example/bucket/1.jpg?X-Amz-Signature=aaa&X-Amz-Date=1&v=2'
+    second = 'https://s3.example/bucket/1.jpg?X-Amz-Signature=bbb&X-Amz-Date=2&v=2'
+    assert cache_key(first) == cache_key(second)
+
+
+def test_same_content_is_stored_once(tmp_path, image_server):
+    """Одинаковое содержимое по разным ссылкам хранится одним файлом."""
+    cache = ImageCache(cache_dir=str(tmp_path))
+
+    cache.get(f'{image_server.base}/a.jpg')
+    cache.get(f'{image_server.base}/copy.jpg')
+
+    objects = [p for p in (tmp_path / 'objects').rglob('*') if p.is_file()]
+    assert len(objects) == 1
+
+
+def test_lru_eviction_keeps_cache_under_limit(tmp_path, image_server):
+    """При превышении лимита удаляется давно не использованная запись."""
+    cache = ImageCache(cache_dir=str(tmp_path), max_bytes=150)
+    url_a, url_b = f'{image_server.base}/a.jpg', f'{image_server.base}/b.jpg'
+
+    cache.get(url_a)
+    cache.get(url_b)
+
+    assert cache.peek(url_a) is None
+    assert cache.peek(url_b) == b'B' * 100
+
+
+
+def test_changed_content_replaces_old_blob(tmp_path, image_server):
+    """
+    Когда содержимое по ссылке меняется, старый файл удаляется, если на него
+    не ссылаются другие записи; общий с другой ссылкой файл остаётся.
+    """
+    cache = ImageCache(cache_dir=str(tmp_path), ttl=0)
+    url_a, url_copy = f'{image_server.base}/a.jpg', f'{image_server.base}/copy.jpg'
+
+    cache.get(url_a)
+    cache.get(url_copy)
+    image_server.files['/copy.jpg'] = b'C' * 100
+    assert cache.get(url_copy) == b'C' * 100
+    image_server.files['/a.jpg'] = b'D' * 100
+    assert cache.get(url_a) == b'D' * 100
+
+    objects = sorted(p.read_bytes()[:1] for p in (tmp_path / 'objects').rglob('*') if p.is_file())
+    assert objects == [b'C', b'D']
+    assert cache._conn.execute("SELECT SUM(size) FROM blobs").fetchone()[0] == 200
+
+
+def test_eviction_drops_unreferenced_blobs_first(tmp_path, image_server):
+    """Содержимое без записей (например, от старых версий кеша) удаляется раньше живых записей."""
+    cache = ImageCache(cache_dir=str(tmp_path), max_bytes=250)
+    url_a = f'{image_server.base}/a.jpg'
+    cache.get(url_a)
+    cache._conn.execute("INSERT INTO blobs (sha256, size) VALUES ('00orphan', 100)")
+    cache._conn.commit()
+
+    cache.get(f'{image_server.base}/b.jpg')
+
+    assert cache.peek(url_a) == b'A' * 100
+    assert cache._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 2
+
+@pytest.mark.asyncio
+async def test_async_get_shares_entries_with_sync(tmp_path, image_server):
+    """Асинхронный API видит записи, сохранённые синхронным, и наоборот."""
+    cache = ImageCache(cache_dir=str(tmp_path))
+    url_a, url_b = f'{image_server.base}/a.jpg', f'{image_server.base}/b.jpg'
+
+    cache.get(url_a)
+    assert await cache.aget(url_a) == b'A' * 100
+    assert await cache.aget(url_b) == b'B' * 100
+    assert cache.peek(url_b) == b'B' * 100
+
+    assert len(image_server.requests) == 2
@@ -1,92 +1,146 @@
-from unittest.mock import patch, mock_open, call
+import json
+import sqlite3
 
 from import_memes import update_database_from_jsonl
 
-@patch('sqlite3.connect')
-@patch('builtins.open', new_callable=mock_open)
-def test_update_database_happy_path(mock_file_open, mock_db_connect):
+
+def _write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT id, name, image, description, tags FROM memes ORDER BY id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_update_database_happy_path(tmp_path):
+    """
+    Проверяет основной успешный сценарий: обычный JSONL импортируется в новую базу.
     """
-    Проверяет основной успешный сценарий обновления БД из JSONL файла.
+    db_path = tmp_path / "memes.db"
+    data_path = tmp_path / "memes.jsonl"
+    _write_lines(data_path, [
+        '{"id": 1, "name": "Meme 1", "description": "Desc 1", "tags": "tag1"}',
+        '{"id": 2, "name": "Meme 2", "images": "img2.png", '
+        '"description": "Desc 2", "tags": "tag2"}',
+    ])
 
-    Убеждается, что для каждой валидной строки в файле вызывается
-    корректный SQL-запрос на вставку/обновление.
+    stats = update_database_from_jsonl(str(db_path), str(data_path))
+
+    assert _rows(db_path) == [
+        (1, "Meme 1", "-", "Desc 1", "tag1"),
+        (2, "Meme 2", "img2.png", "Desc 2", "tag2"),
+    ]
+    assert stats["inserted"] == 2
+    assert stats["errors"] == 0
+
+
+def test_bulk_format_headers_are_not_errors(tmp_path, capsys):
     """
-    json_line1 = '{"id": 1, "name": "Meme 1", "description": "Desc 1", "tags": "tag1"}'
-    json_line2 = '{"id": 2, "name": "Meme 2", "images": "img2.png", "description": "Desc 2", "tags": "tag2"}'
-    mock_file_content = f"{json_line1}\n{json_line2}"
-    mock_file_open.return_value.readlines.return_value = mock_file_content.splitlines()
-
-    mock_conn = mock_db_connect.return_value
-
-    update_database_from_jsonl('fake_db.db', 'fake_data.jsonl')
-
-    create_table_sql = '''
-    CREATE TABLE IF NOT EXISTS memes (
-        id INTEGER PRIMARY KEY,
-        name TEXT,
-        image TEXT,
-        description TEXT,
-        tags TEXT,
-        embedding TEXT
-    );
-    '''
-    
-    insert_sql_template = '''
-                INSERT INTO memes (id, name, image, description, tags)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    name = excluded.name,
-                    image = excluded.image,
-                    description = excluded.description,
-                    tags = excluded.tags
-            '''
-            
-    expected_calls = [
-        call(create_table_sql), 
-        call(insert_sql_template, (1, 'Meme 1', '-', 'Desc 1', 'tag1')),
-        call(insert_sql_template, (2, 'Meme 2', 'img2.png', 'Desc 2', 'tag2'))
+    Проверяет bulk-формат Elasticsearch: строки {"index": ...} пропускаются молча,
+    а их _id подставляется, если в документе нет поля id.
+    """
+    db_path = tmp_path / "memes.db"
+    data_path = tmp_path / "memes_base.json"
+    _write_lines(data_path, [
+        '{"index": {"_index": "first_index", "_id": 1}}',
+        '{"id": "1", "name": "Барби", "images": "barbie.jpg", '
+        '"description": "шок", "tags": "кукла"}',
+        '{"index": {"_index": "first_index", "_id": 7}}',
+        '{"name": "Без id", "images": "x.png", "description": "d", "tags": "t"}',
+    ])
+
+    stats = update_database_from_jsonl(str(db_path), str(data_path))
+
+    assert _rows(db_path) == [
+        (1, "Барби", "barbie.jpg", "шок", "кукла"),
+        (7, "Без id", "x.png", "d", "t"),
     ]
-    
-    mock_conn.cursor().execute.assert_has_calls(expected_calls, any_order=False)
-    
-    mock_conn.commit.assert_called_once()
-    mock_conn.close.assert_called_once()
+    assert stats["errors"] == 0
+    assert "Ошибка" not in capsys.readouterr().out
 
 
-@patch('sqlite3.connect')
-@patch('builtins.open', new_callable=mock_open)
-def test_update_database_with_bad_data(mock_file_open, mock_db_connect):
+def test_update_database_with_bad_data(tmp_path):
     """
     Проверяет, что скрипт устойчив к ошибкам в данных.
 
     Если в файле есть пустые строки или некорректный JSON,
     скрипт должен пропустить их и обработать только валидные данные.
     """
-    valid_line = '{"id": 10, "name": "Valid Meme", "description": "Good one", "tags": "ok"}'
-    malformed_line = '{"id": 11, "name": "Broken JSON"' 
-    empty_line = ''
-    mock_file_content = f"{valid_line}\n{malformed_line}\n{empty_line}"
-    mock_file_open.return_value.readlines.return_value = mock_file_content.splitlines()
-
-    mock_conn = mock_db_connect.return_value
-    mock_cursor = mock_conn.cursor.return_value
-
-    update_database_from_jsonl('fake_db.db', 'fake_data.jsonl')
-
-    insert_sql = '''
-                INSERT INTO memes (id, name, image, description, tags)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    name = excluded.name,
-                    image = excluded.image,
-                    description = excluded.description,
-                    tags = excluded.tags
-            '''
-    
-    insert_calls = [c for c in mock_cursor.execute.call_args_list if "INSERT" in c[0][0]]
-    assert len(insert_calls) == 1
-    
-    assert insert_calls[0] == call(insert_sql, (10, 'Valid Meme', '-', 'Good one', 'ok'))
-    
-    mock_conn.commit.assert_called_once()
-    mock_conn.close.assert_called_once()
\ No newline at end of file
+    db_path = tmp_path / "memes.db"
+    data_path = tmp_path / "memes.jsonl"
+    _write_lines(data_path, [
+        '{"id": 10, "name": "Valid Meme", "description": "Good one", "tags": "ok"}',
+        '{"id": 11, "name": "Broken JSON"',
+        '',
+        '{"name": "No id"}',
+    ])
+
+    stats = update_database_from_jsonl(str(db_path), str(data_path))
+
+    assert _rows(db_path) == [(10, "Valid Meme", "-", "Good one", "ok")]
+    assert stats["errors"] == 2
+
+
+def test_reimport_counts_inserted_updated_unchanged(tmp_path):
+    """
+    Проверяет повторный импорт: неизменённые строки не переписываются,
+    изменённые обновляются, новые добавляются, эмбеддинги не затираются.
+    """
+    db_path = tmp_path / "memes.db"
+    data_path = tmp_path / "memes.jsonl"
+    memes = [{"id": i, "name": f"Meme {i}", "description": f"Desc {i}", "tags": "t"}
+             for i in range(1, 6)]
+    _write_lines(data_path, [json.dumps(m) for m in memes])
+    update_database_from_jsonl(str(db_path), str(data_path), batch_size=2)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE memes SET embedding = '[0.5]' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    memes[1]["description"] = "Changed"
+    memes.append({"id": 6, "name": "Meme 6", "description": "Desc 6", "tags": "t"})
+    _write_lines(data_path, [json.dumps(m) for m in memes])
+    stats = update_database_from_jsonl(str(db_path), str(data_path), batch_size=2)
+
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (1, 1, 4)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT description FROM memes WHERE id = 2").fetchone()[0] == "Changed"
+    assert conn.execute("SELECT embedding FROM memes WHERE id = 1").fetchone()[0] == "[0.5]"
+    conn.close()
+
+
+def test_legacy_table_gets_content_hash_column(tmp_path):
+    """
+    Проверяет миграцию старой базы без content_hash: колонка добавляется,
+    строки, импортированные прежней версией, переписываются один раз.
+    """
+    db_path = tmp_path / "memes.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE memes (id INTEGER PRIMARY KEY, name TEXT, image TEXT, "
+        "description TEXT, tags TEXT, embedding TEXT)"
+    )
+    conn.execute("INSERT INTO memes VALUES (1, 'Old', '-', 'Desc', 'tag', NULL)")
+    conn.commit()
+    conn.close()
+    data_path = tmp_path / "memes.jsonl"
+    _write_lines(data_path, ['{"id": 1, "name": "Old", "description": "Desc", "tags": "tag"}'])
+
+    first = update_database_from_jsonl(str(db_path), str(data_path))
+    second = update_database_from_jsonl(str(db_path), str(data_path))
+
+    assert first["updated"] == 1
+    assert second["unchanged"] == 1
+
+
+def test_missing_file_returns_none(tmp_path):
+    """Проверяет, что отсутствующий файл не создаёт базу и не роняет скрипт."""
+    db_path = tmp_path / "memes.db"
+    assert update_database_from_jsonl(str(db_path), str(tmp_path / "nope.jsonl")) is None
+    assert not db_path.exists()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from minio.error import S3Error
+
+import s3_storage
+from import_to_s3 import UploadManifest, process_image_urls
+from s3_storage import expected_etag, object_key
+
+
+class FakeMinio:
+    """Замена MinIO в памяти: stat_object / put_object с ETag как у S3."""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.stats = 0
+        self._lock = threading.Lock()
+
+    def stat_object(self, bucket_name, object_name):
+        with self._lock:
+            self.stats += 1
+            obj = self.objects.get((bucket_name, object_name))
+        if obj is None:
+            raise S3Error(None, "NoSuchKey", "Object does not exist", object_name,
+                          "req", "host", bucket_name, object_name)
+        return SimpleNamespace(size=obj["size"], etag=f'"{obj["etag"]}"')
+
+    def put_object(self, bucket_name, object_name, data, length, content_type, part_size):
+        body = data.read()
+        assert len(body) == length
+        with self._lock:
+            self.puts.append(object_name)
+            self.objects[(bucket_name, object_name)] = {
+                "size": length, "etag": expected_etag(body, part_size),
+                "content_type": content_type,
+            }
+
+
+class FakeCache:
+    def __init__(self, images: dict, broken: set = ()):
+        self.images = images
+        self.broken = set(broken)
+
+    def get(self, url):
+        if url in self.broken:
+            raise ConnectionError("сеть недоступна")
+        return self.images[url]
+
+
+def _write_memes(path, urls):
+    lines = []
+    for i, url in enumerate(urls, start=1):
+        lines.append(json.dumps({"index": {"_index": "first_index", "_id": i}}))
+        lines.append(json.dumps({"id": str(i), "name": f"m{i}", "images": url}))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.fixture
+def memes(tmp_path):
+    urls = [f"https://img.example/{i}.png" for i in range(6)]
+    images = {url: f"картинка {i}".encode() * 100 for i, url in enumerate(urls)}
+    memes_path = tmp_path / "memes_base.json"
+    # Повтор ссылки и мем без картинки не должны давать лишних загрузок
+    _write_memes(memes_path, urls + [urls[0], "-"])
+    return memes_path, images, str(tmp_path / "manifest.jsonl")
+
+
+def test_uploads_by_content_hash_and_resumes_from_manifest(memes):
+    """
+    Проверяет первую загрузку (ключи по хешу содержимого, без повторов)
+    и повторный запуск, который ничего не скачивает и не проверяет.
+    """
+    memes_path, images, manifest_path = memes
+    client = FakeMinio()
+
+    stats = process_image_urls(str(memes_path), "bucket", manifest_path, workers=4,
+                               client=client, cache=FakeCache(images))
+
+    assert stats["uploaded"] == 6 and stats["failed"] == 0
+    assert sorted(client.puts) == sorted(object_key(data, url) for url, data in images.items())
+    assert all(key.endswith(".png") for key in client.puts)
+    assert UploadManifest(manifest_path).keys() == {
+        url: object_key(data, url) for url, data in images.items()
+    }
+
+    stats = process_image_urls(str(memes_path), "bucket", manifest_path, workers=4,
+                               client=client, cache=FakeCache({}))
+    assert stats["resumed"] == 6 and stats["uploaded"] == 0
+    assert len(client.puts) == 6
+
+
+def test_existing_objects_are_skipped_by_etag(memes, tmp_path):
+    """Проверяет, что без манифеста объекты с совпадающим ETag не загружаются заново."""
+    memes_path, images, manifest_path = memes
+    client = FakeMinio()
+    process_image_urls(str(memes_path), "bucket", manifest_path, client=client,
+                       cache=FakeCache(images))
+
+    stats = process_image_urls(str(memes_path), "bucket", str(tmp_path / "new.jsonl"),
+                               client=client, cache=FakeCache(images))
+
+    assert (stats["existing"], stats["uploaded"]) == (6, 0)
+    assert len(client.puts) == 6
+
+
+def test_failures_are_recorded_and_retried(memes):
+    """Проверяет, что ошибка попадает в манифест и повторяется следующим запуском."""
+    memes_path, images, manifest_path = memes
+    broken = "https://img.example/3.png"
+    client = FakeMinio()
+
+    stats = process_image_urls(str(memes_path), "bucket", manifest_path, client=client,
+                               cache=FakeCache(images, broken={broken}))
+    assert stats["failed"] == 1
+    assert "сеть недоступна" in UploadManifest(manifest_path).entries[broken]["error"]
+
+    stats = process_image_urls(str(memes_path), "bucket", manifest_path, client=client,
+                               cache=FakeCache(images))
+    assert (stats["resumed"], stats["uploaded"], stats["failed"]) == (5, 1, 0)
+
+
+def test_multipart_etag_matches_s3_scheme():
+    """Проверяет расчёт ETag: MD5 для обычной загрузки, MD5 от MD5 частей для multipart."""
+    data = b"a" * 10 + b"b" * 5
+    assert expected_etag(data, part_size=100) == hashlib.md5(data).hexdigest()
+    parts = hashlib.md5(b"a" * 10).digest() + hashlib.md5(b"b" * 5).digest()
+    assert expected_etag(data, part_size=10) == f"{hashlib.md5(parts).hexdigest()}-2"
+
+
+def test_import_has_no_side_effects():
+    """Проверяет, что импорт модуля не создаёт клиента и ничего не загружает."""
+    assert s3_storage._client is None
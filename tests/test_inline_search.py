@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from inline_search import FileIdRegistry, InlineSearch, PrefixCache
+
+
+class FakeSearch:
+    """Синхронный поиск с задержкой, считающий вызовы."""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        if self.gate is not None:
+            self.gate.wait(2)
+        time.sleep(self.delay)
+        return [len(query), len(query) + 1]
+
+
+async def test_cache_hit_skips_debounce_and_search():
+    """Проверяет, что повторный запрос отдаётся из кеша без паузы и поиска."""
+    search = FakeSearch()
+    inline = InlineSearch(search, debounce=0.01, budget=1)
+    assert await inline.resolve(1, "Кот  Дня") == ((7, 8), True)
+
+    started = time.monotonic()
+    assert await inline.resolve(2, "кот дня") == ((7, 8), True)
+    assert time.monotonic() - started < 0.01
+    assert search.calls == ["кот дня"]
+    assert inline.stats() == {"hit": 1, "miss": 1, "superseded": 0, "partial": 0}
+
+
+async def test_superseded_keystrokes_are_not_searched():
+    """Проверяет, что из быстро набранных запросов ищется только последний."""
+    search = FakeSearch()
+    inline = InlineSearch(search, debounce=0.05, budget=1)
+    answers = await asyncio.gather(
+        inline.resolve(1, "к"), inline.resolve(1, "ко"), inline.resolve(1, "кот"),
+    )
+    assert answers == [None, None, ((3, 4), True)]
+    assert search.calls == ["кот"]
+
+
+async def test_budget_falls_back_to_cached_prefix():
+    """
+    Проверяет, что при медленном поиске отдаётся неполный ответ по префиксу,
+    а поиск доигрывает в фоне и заполняет кеш.
+    """
+    cache = PrefixCache()
+    cache.put("ко", [42])
+    search = FakeSearch(delay=0.2)
+    inline = InlineSearch(search, debounce=0, budget=0.05, cache=cache)
+
+    assert await inline.resolve(1, "кот") == ((42,), False)
+    await asyncio.sleep(0.3)
+    assert cache.get("кот") == (3, 4)
+    assert inline.stats()["partial"] == 1
+
+
+async def test_users_share_one_inflight_search():
+    """Проверяет, что одинаковые запросы разных пользователей ждут один поиск."""
+    gate = threading.Event()
+    search = FakeSearch(gate=gate)
+    inline = InlineSearch(search, debounce=0, budget=1)
+    pending = asyncio.gather(inline.resolve(1, "кот"), inline.resolve(2, "кот"))
+    await asyncio.sleep(0.05)
+    gate.set()
+    assert await pending == [((3, 4), True), ((3, 4), True)]
+    assert search.calls == ["кот"]
+
+
+def test_file_id_registry_keeps_largest_photo():
+    """Проверяет, что запоминается file_id самого большого размера фото."""
+    registry = FileIdRegistry()
+    registry.remember(1, SimpleNamespace(photo=[SimpleNamespace(file_id="small"),
+                                                SimpleNamespace(file_id="big")]))
+    registry.remember(2, SimpleNamespace(photo=None))
+    assert registry.get(1) == "big"
+    assert registry.get(2) is None
+    assert len(registry) == 1
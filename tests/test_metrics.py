@@ -0,0 +1,129 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import aiohttp
+
+from metrics import (
+    REGISTRY,
+    STAGE_SECONDS,
+    Counter,
+    Histogram,
+    Registry,
+    register_cache,
+    register_readiness,
+    start_metrics_server,
+    timed,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Проверяет формат гистограммы: накопленные корзины, +Inf, _sum и _count."""
+    registry = Registry()
+    histogram = Histogram("test_seconds", "Тест", ("stage",), buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 5.0):
+        histogram.labels("es").observe(value)
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="es",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="es",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{stage="es",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{stage="es"} 5.55' in text
+    assert 'test_seconds_count{stage="es"} 3' in text
+
+
+def test_counter_labels_are_escaped():
+    """Проверяет счётчик с метками и экранирование кавычек в значениях."""
+    registry = Registry()
+    counter = Counter("test_total", "Тест", ("error",), registry=registry)
+    counter.labels('Bad "request"').inc()
+    counter.labels(error='Bad "request"').inc(2)
+
+    assert 'test_total{error="Bad \\"request\\""} 3' in registry.render()
+
+
+async def test_timed_decorator_records_sync_and_async_calls():
+    """Проверяет, что timed замеряет обычные и асинхронные функции и сохраняет их имя."""
+    registry = Registry()
+    histogram = Histogram("test_op_seconds", "Тест", ("operation",), registry=registry)
+
+    @timed(histogram.labels("sync"))
+    def sync_call():
+        return 1
+
+    @timed(histogram.labels("async"))
+    async def async_call():
+        return 2
+
+    assert sync_call() == 1
+    assert await async_call() == 2
+    assert async_call.__name__ == "async_call"
+    assert histogram.labels("sync").count == 1
+    assert histogram.labels("async").count == 1
+
+
+def test_search_records_stage_timings():
+    """Проверяет, что поиск записывает этапы текстового запроса, эмбеддинга и KNN."""
+    from elasticsearch_utils import ElasticsearchManager
+
+    with patch('elasticsearch_utils.Elasticsearch') as mock_es_class:
+        mock_es_class.return_value.ping.return_value = True
+        provider = MagicMock(field="image_embedding")
+        provider.embed_one.return_value = [0.1, 0.2]
+        manager = ElasticsearchManager(db_path='fake.db', provider=provider)
+    manager.es.search.return_value = {"hits": {"hits": []}}
+
+    stages = ("es_text", "embedding", "es_knn")
+    before = {stage: STAGE_SECONDS.labels(stage).count for stage in stages}
+    manager.search("кот")
+    for stage, count in before.items():
+        assert STAGE_SECONDS.labels(stage).count == count + 1, stage
+
+
+def test_instrumentation_overhead_is_small():
+    """Грубая проверка накладных расходов: таймер этапа — единицы микросекунд."""
+    stage = STAGE_SECONDS.labels("overhead_check")
+    started = time.perf_counter()
+    for _ in range(10000):
+        with stage.time():
+            pass
+    per_call = (time.perf_counter() - started) / 10000
+    assert per_call < 50e-6
+
+
+async def test_metrics_endpoint_serves_prometheus_text():
+    """Проверяет HTTP-эндпоинт /metrics и метрику попаданий в кеш."""
+    register_cache("test_cache", lambda: {"hit": 3, "miss": 1})
+    runner = await start_metrics_server(host="127.0.0.1", port=0)
+    try:
+        port = runner.addresses[0][1]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                assert response.status == 200
+                assert response.headers["Content-Type"].startswith("text/plain")
+                text = await response.text()
+    finally:
+        await runner.cleanup()
+
+    assert 'meme_cache_requests_total{cache="test_cache",result="hit"} 3' in text
+    assert "# TYPE meme_stage_seconds histogram" in text
+
+
+async def test_ready_endpoint_reflects_registered_components():
+    """Проверяет /ready: 503 и «warming», пока компонент не готов, и метрику meme_ready."""
+    state = {"ready": False}
+    register_readiness("test_component", lambda: state["ready"])
+    runner = await start_metrics_server(host="127.0.0.1", port=0)
+    try:
+        port = runner.addresses[0][1]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                assert response.status == 503
+                assert "test_component warming" in await response.text()
+            state["ready"] = True
+            async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                assert "test_component ok" in await response.text()
+    finally:
+        await runner.cleanup()
+
+    assert 'meme_ready{component="test_component"} 1' in REGISTRY.render()
@@ -0,0 +1,126 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from micro_batch import MicroBatcher
+
+
+def test_concurrent_submits_share_one_flush():
+    """
+    Проверяет, что элементы из разных потоков в пределах окна уходят одной пачкой,
+    а результаты и ошибки элементов возвращаются своим вызывающим.
+    """
+    batches = []
+
+    def flush(items, timeout):
+        batches.append(list(items))
+        return [ValueError(item) if item < 0 else item * 10 for item in items]
+
+    batcher = MicroBatcher("test", flush, window=0.05, max_batch=16)
+    with ThreadPoolExecutor(8) as pool:
+        futures = list(pool.map(batcher.submit, [1, 2, -3, 4, 5, 6]))
+    assert [f.result(1) for f in futures if f is not futures[2]] == [10, 20, 40, 50, 60]
+    with pytest.raises(ValueError):
+        futures[2].result(1)
+    assert len(batches) == 1 and sorted(batches[0]) == [-3, 1, 2, 4, 5, 6]
+
+
+def test_max_batch_splits_and_flush_error_reaches_everyone():
+    """Проверяет деление по max_batch и ошибку всего пакетного вызова у каждого элемента."""
+    sizes = []
+    gate = threading.Event()
+
+    def flush(items, timeout):
+        sizes.append(len(items))
+        gate.wait(1)
+        raise ConnectionError("ES недоступен")
+
+    batcher = MicroBatcher("test_split", flush, window=0.2, max_batch=3)
+    started = time.monotonic()
+    futures = [batcher.submit(i) for i in range(7)]
+    time.sleep(0.05)
+    gate.set()
+    for future in futures[:6]:
+        with pytest.raises(ConnectionError):
+            future.result(1)
+    # Полные пачки отправляются, не дожидаясь конца окна
+    assert time.monotonic() - started < 0.2
+    with pytest.raises(ConnectionError):
+        futures[6].result(1)
+    assert sizes == [3, 3, 1]
+
+
+def test_batch_uses_tightest_deadline_and_drops_expired_items():
+    """
+    Проверяет, что пачка получает самый короткий оставшийся срок своих элементов,
+    а элемент с истёкшим сроком не отправляется и получает TimeoutError.
+    """
+    calls = []
+
+    def flush(items, timeout):
+        calls.append((sorted(items), timeout))
+        return list(items)
+
+    batcher = MicroBatcher("test_deadline", flush, window=0.05, max_batch=16)
+    loose, tight = batcher.submit("loose", timeout=10), batcher.submit("tight", timeout=0.5)
+    expired = batcher.submit("expired", timeout=0.01)
+    assert (loose.result(1), tight.result(1)) == ("loose", "tight")
+    with pytest.raises(TimeoutError):
+        expired.result(1)
+    [(items, timeout)] = calls
+    assert items == ["loose", "tight"] and 0.3 < timeout <= 0.5
+
+    batcher.submit("no deadline").result(1)
+    assert calls[-1][1] is None
+
+
+def test_manager_batches_searches_into_msearch(tmp_path):
+    """
+    Проверяет ElasticsearchManager с микробатчингом против замены ES: одновременные
+    текстовые и KNN-запросы уходят через _msearch и дают те же ответы, что и _search.
+    """
+    from elasticsearch import Elasticsearch
+
+    from benchmarks.fake_es import start_fake_elasticsearch
+    from benchmarks.search_benchmark import build_dataset
+    from elasticsearch_utils import ElasticsearchManager
+    from embedding_providers import HashingEmbeddingProvider
+
+    db_path = str(tmp_path / "memes.db")
+    vocabulary = build_dataset(db_path, docs=40, dim=16)
+    server = start_fake_elasticsearch()
+    try:
+        manager = ElasticsearchManager(
+            db_path=db_path, index_name="bench", embedding_dim=16,
+            provider=HashingEmbeddingProvider(dim=16), es=Elasticsearch(server.url)
+        )
+        manager.initialize_elasticsearch()
+        manager.sync_db_to_elasticsearch()
+        field, vector = manager._embed_query(vocabulary[1])
+        expected_text = manager.search_text(vocabulary[0], 5)
+        expected_knn = manager.search_vector(field, vector, 5)
+
+        manager.enable_msearch_batching(window=0.05, max_batch=32)
+        with ThreadPoolExecutor(10) as pool:
+            texts = [pool.submit(manager.search_text, vocabulary[0], 5, timeout=5)
+                     for _ in range(5)]
+            knns = [pool.submit(manager.search_vector, field, vector, 5) for _ in range(5)]
+            assert all(f.result() == expected_text for f in texts)
+            assert all(f.result() == expected_knn for f in knns)
+
+        assert server.request_counts["_search"] == 2
+        assert 1 <= server.request_counts["_msearch"] <= 3
+
+        # Зависший _msearch не держит вызывающего дольше его бюджета
+        release = threading.Event()
+        manager.batcher.flush = lambda bodies, timeout: release.wait(2) and []
+        started = time.monotonic()
+        with pytest.raises(FutureTimeoutError):
+            manager.search_text(vocabulary[0], 5, timeout=0.1)
+        assert time.monotonic() - started < 0.5
+        release.set()
+    finally:
+        server.shutdown()
@@ -0,0 +1,84 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from neighbor_graph import NeighborGraph, build_neighbor_graph, nearest_neighbors
+
+
+def _write_embeddings(db_path, vectors: dict):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS memes (id INTEGER PRIMARY KEY, embedding TEXT)")
+    conn.execute("DELETE FROM memes")
+    conn.executemany("INSERT INTO memes VALUES (?, ?)",
+                     [(i, json.dumps(v.tolist())) for i, v in vectors.items()])
+    conn.commit()
+    conn.close()
+
+
+def _graph_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = {meme_id: np.frombuffer(blob, dtype="<i4").tolist()
+            for meme_id, blob in conn.execute("SELECT id, neighbors FROM meme_neighbors")}
+    conn.close()
+    return rows
+
+
+def test_blocked_top_k_matches_brute_force():
+    """Проверяет, что блочный расчёт совпадает с полной матрицей близостей."""
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(50, 8)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    positions, scores = nearest_neighbors(matrix, np.arange(50), k=5, block_size=7)
+
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    expected = np.argsort(-sims, axis=1)[:, :5]
+    assert (positions == expected).all()
+    assert np.allclose(scores, np.take_along_axis(sims, expected, axis=1))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_incremental_rebuild_equals_full_rebuild(tmp_path, seed):
+    """
+    Проверяет, что после изменения, добавления и удаления эмбеддингов
+    инкрементальный пересчёт даёт тот же граф, что и полный.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = {i: rng.normal(size=6) for i in range(1, 81)}
+    db_path = str(tmp_path / "memes.db")
+    _write_embeddings(db_path, vectors)
+    build_neighbor_graph(db_path, k=4, block_size=16)
+
+    for i in (3, 17, 42):
+        vectors[i] = rng.normal(size=6)
+    for i in (5, 60):
+        del vectors[i]
+    vectors[100] = rng.normal(size=6)
+    _write_embeddings(db_path, vectors)
+
+    stats = build_neighbor_graph(db_path, k=4, block_size=16)
+    assert stats["removed"] == 2 and stats["recomputed"] < len(vectors)
+    incremental = _graph_rows(db_path)
+
+    full_path = str(tmp_path / "full.db")
+    _write_embeddings(full_path, vectors)
+    build_neighbor_graph(full_path, k=4, block_size=16)
+    assert incremental == _graph_rows(full_path)
+
+    stats = build_neighbor_graph(db_path, k=4, block_size=16)
+    assert stats["recomputed"] == stats["merged"] == stats["written"] == 0
+
+
+def test_similar_interleaves_neighbors_and_skips_shown(tmp_path):
+    """Проверяет выдачу похожих: соседи мемов по очереди, без показанных и повторов."""
+    graph = NeighborGraph({
+        1: np.array([2, 3, 4], dtype="<i4").tobytes(),
+        5: np.array([3, 6, 7], dtype="<i4").tobytes(),
+    })
+    assert graph.neighbors(1) == [2, 3, 4]
+    assert graph.neighbors(99) == []
+    assert graph.similar([1, 5], exclude=[2], limit=3) == [3, 6, 4]
+    assert NeighborGraph.from_db(str(tmp_path / "empty.db")).similar([1]) == []
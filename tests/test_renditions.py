@@ -0,0 +1,128 @@
+import io
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from minio.error import S3Error
+from PIL import Image
+
+from import_memes import ensure_schema, update_database_from_jsonl
+from make_renditions import build_renditions, render, rendition_key
+from s3_storage import expected_etag
+
+
+def _image_bytes(size, fmt, mode="RGB", noise=False):
+    if noise:
+        image = Image.frombytes(mode, size, bytes(range(256)) * (size[0] * size[1] * 3 // 256 + 1))
+    else:
+        image = Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30))
+    out = io.BytesIO()
+    image.save(out, format=fmt)
+    return out.getvalue()
+
+
+class FakeBucket:
+    """Бакет в памяти: get_object / stat_object / put_object."""
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.puts = []
+
+    def get_object(self, bucket_name, object_name):
+        data = self.objects[object_name]
+        return SimpleNamespace(read=lambda: data, close=lambda: None, release_conn=lambda: None)
+
+    def stat_object(self, bucket_name, object_name):
+        if object_name not in self.objects:
+            raise S3Error(None, "NoSuchKey", "Object does not exist", object_name,
+                          "req", "host", bucket_name, object_name)
+        data = self.objects[object_name]
+        return SimpleNamespace(size=len(data), etag=f'"{expected_etag(data)}"')
+
+    def put_object(self, bucket_name, object_name, data, length, content_type):
+        self.puts.append((object_name, content_type))
+        self.objects[object_name] = data.read()
+
+
+class FakeCache:
+    def __init__(self, images):
+        self.images = images
+
+    def get(self, url):
+        return self.images[url]
+
+
+def test_render_caps_side_and_size():
+    """Проверяет уменьшение по длинной стороне, JPEG без прозрачности и потолок размера."""
+    data = _image_bytes((3000, 1500), "PNG", mode="RGBA")
+    copy = Image.open(io.BytesIO(render(data, fmt="JPEG", max_side=1280)))
+    assert (copy.format, copy.mode, copy.size) == ("JPEG", "RGB", (1280, 640))
+
+    noisy = _image_bytes((1200, 1200), "PNG", noise=True)
+    assert len(render(noisy, fmt="WEBP", max_bytes=20_000)) <= 20_000
+
+
+def test_render_keeps_fitting_jpeg():
+    """Проверяет, что небольшой JPEG не перекодируется."""
+    assert render(_image_bytes((800, 600), "JPEG"), fmt="JPEG") is None
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_build_renditions_records_keys_incrementally(tmp_path, processes):
+    """
+    Проверяет полный проход: копии кладутся рядом с оригиналами, ключи пишутся
+    в базу (одна копия на повторяющуюся картинку), file_id пропускается,
+    повторный запуск ничего не делает.
+    """
+    big_key = "ab/ab12.png"
+    small_jpeg = _image_bytes((400, 300), "JPEG")
+    bucket = FakeBucket({big_key: _image_bytes((2000, 2000), "PNG")})
+    cache = FakeCache({"https://img.example/s.jpg": small_jpeg})
+
+    db_path = str(tmp_path / "memes.db")
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    conn.executemany("INSERT INTO memes (id, image) VALUES (?, ?)", [
+        (1, big_key), (2, big_key), (3, "https://img.example/s.jpg"), (4, "AgACAgIAAxkBAAIB"),
+    ])
+    conn.commit()
+    conn.close()
+
+    stats = build_renditions(db_path, "bucket", processes=processes, client=bucket, cache=cache)
+    assert (stats["rendered"], stats["original"], stats["failed"]) == (1, 1, 0)
+    assert bucket.puts == [("ab/ab12.tg.jpg", "image/jpeg")]
+    assert rendition_key(big_key) == "ab/ab12.tg.jpg"
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT id, COALESCE(rendition, image) FROM memes ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [(1, "ab/ab12.tg.jpg"), (2, "ab/ab12.tg.jpg"),
+                    (3, "https://img.example/s.jpg"), (4, "AgACAgIAAxkBAAIB")]
+
+    stats = build_renditions(db_path, "bucket", processes=processes, client=bucket, cache=cache)
+    assert stats["rendered"] + stats["original"] + stats["failed"] == 0
+
+
+def test_changed_image_resets_rendition(tmp_path):
+    """Проверяет, что повторный импорт со сменой картинки сбрасывает устаревшую копию."""
+    db_path = str(tmp_path / "memes.db")
+    memes_path = tmp_path / "memes.jsonl"
+
+    def write(images):
+        memes_path.write_text("".join(
+            json.dumps({"id": str(i), "name": "m", "images": image}) + "\n"
+            for i, image in enumerate(images, start=1)
+        ), encoding="utf-8")
+
+    write(["a/1.png", "a/2.png"])
+    update_database_from_jsonl(db_path, str(memes_path))
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE memes SET rendition = image || '.tg.jpg'")
+    conn.commit()
+
+    write(["a/1.png", "a/3.png"])
+    update_database_from_jsonl(db_path, str(memes_path))
+    rows = conn.execute("SELECT rendition FROM memes ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [("a/1.png.tg.jpg",), (None,)]
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from metrics import HEDGED_REQUESTS
+from resilience import CircuitBreaker, CircuitOpenError, call_with_deadline
+
+
+def test_breaker_opens_probes_and_closes():
+    """Проверяет размыкание после серии ошибок, один пробный вызов и замыкание."""
+    breaker = CircuitBreaker("test_dependency", failure_threshold=2, reset_timeout=0.05)
+
+    def fail():
+        raise RuntimeError("нет ответа")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 1)
+
+    time.sleep(0.06)
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.call(lambda: 1) == 1
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_hedged_call_cuts_tail_latency_and_respects_deadline():
+    """
+    Проверяет дублирующий запрос: медленный первый вызов обгоняется вторым;
+    если медленны оба, через бюджет поднимается TimeoutError.
+    """
+    delays = iter([1.0, 0.0])
+    executor = ThreadPoolExecutor(4)
+    won = HEDGED_REQUESTS.labels("won").value
+
+    def call():
+        time.sleep(next(delays))
+        return "ok"
+
+    started = time.monotonic()
+    assert call_with_deadline(executor, call, timeout=0.5, hedge_after=0.05) == "ok"
+    assert time.monotonic() - started < 0.3
+    assert HEDGED_REQUESTS.labels("won").value == won + 1
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        call_with_deadline(executor, lambda: time.sleep(0.5), timeout=0.1, hedge_after=0.02)
+    assert time.monotonic() - started < 0.3
+    executor.shutdown(wait=False)
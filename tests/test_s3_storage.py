@@ -0,0 +1,115 @@
+import json
+import sqlite3
+
+import pytest
+
+import s3_storage
+from get_url_from_beget import update_db_with_keys, update_json_with_keys
+from import_memes import content_hash
+from s3_storage import PresignedUrlResolver, to_object_key
+
+KEY = "ab/ab12.jpg"
+LEGACY_URL = (
+    f"https://{s3_storage.S3_ENDPOINT}/{s3_storage.S3_BUCKET}/0.jpg"
+    "?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Expires=604800"
+)
+
+
+class FakeSigner:
+    """Считает подписи; ссылка содержит номер подписи, чтобы отличать переподписанные."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def presigned_get_object(self, bucket_name, object_name, expires):
+        self.calls += 1
+        return f"https://s3/{bucket_name}/{object_name}?sig={self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(s3_storage.time, "time", lambda: now[0])
+    return now
+
+
+def test_resolver_caches_until_refresh_margin(clock):
+    """
+    Проверяет, что ссылка подписывается один раз и переподписывается
+    только при приближении к истечению срока.
+    """
+    signer = FakeSigner()
+    resolver = PresignedUrlResolver(signer, "bucket", ttl=100, refresh_margin=10)
+
+    first = resolver.resolve(KEY)
+    assert resolver.resolve(KEY) == first
+    clock[0] += 89
+    assert resolver.resolve(KEY) == first
+    clock[0] += 2
+    assert resolver.resolve(KEY) != first
+    assert signer.calls == 2
+    assert resolver.stats() == {"hit": 2, "miss": 2, "refreshed": 0}
+
+
+def test_resolver_passes_through_foreign_values():
+    """Проверяет, что сторонние ссылки, file_id и '-' не подписываются."""
+    signer = FakeSigner()
+    resolver = PresignedUrlResolver(signer, "bucket", ttl=100, refresh_margin=10)
+    for value in ("https://img.example/1.png", "AgACAgIAAxkBAAIB", "-"):
+        assert resolver.resolve(value) == value
+    assert signer.calls == 0
+
+
+def test_legacy_presigned_url_maps_to_key():
+    """Проверяет, что старая presigned-ссылка на объект бакета превращается в ключ."""
+    assert to_object_key(LEGACY_URL) == "0.jpg"
+    assert to_object_key(KEY) == KEY
+    assert to_object_key("https://img.example/0.jpg") is None
+
+
+def test_refresh_expiring_resigns_in_bulk(clock):
+    """Проверяет фоновое обновление: переподписываются только истекающие ссылки."""
+    signer = FakeSigner()
+    resolver = PresignedUrlResolver(signer, "bucket", ttl=100, refresh_margin=10)
+    resolver.resolve("a/1.jpg")
+    clock[0] += 50
+    resolver.resolve("a/2.jpg")
+
+    clock[0] += 35
+    assert resolver.refresh_expiring() == 1
+    calls = signer.calls
+    clock[0] += 10
+    resolver.resolve("a/1.jpg")
+    resolver.resolve("a/2.jpg")
+    assert signer.calls == calls
+
+
+def test_rewrite_json_and_db_to_object_keys(tmp_path):
+    """Проверяет перевод файла мемов и базы со ссылок на постоянные ключи объектов."""
+    keys = {"https://img.example/1.png": "cd/cd34.png"}
+    memes_path = tmp_path / "memes_base.json"
+    memes_path.write_text("\n".join([
+        json.dumps({"index": {"_index": "first_index", "_id": 1}}),
+        json.dumps({"id": "1", "images": "https://img.example/1.png"}),
+        json.dumps({"id": "2", "images": LEGACY_URL}),
+        json.dumps({"id": "3", "images": "https://other.example/3.png"}),
+    ]) + "\n", encoding="utf-8")
+
+    assert update_json_with_keys(str(memes_path), keys) == 2
+    images = [json.loads(line).get("images") for line in memes_path.read_text().splitlines()]
+    assert images == [None, "cd/cd34.png", "0.jpg", "https://other.example/3.png"]
+
+    db_path = str(tmp_path / "memes.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE memes (id INTEGER PRIMARY KEY, name TEXT, image TEXT, "
+                 "description TEXT, tags TEXT, content_hash TEXT)")
+    conn.execute("INSERT INTO memes VALUES (1, 'm', 'https://img.example/1.png', 'd', 't', 'x')")
+    conn.commit()
+    conn.close()
+
+    assert update_db_with_keys(db_path, keys) == 1
+    conn = sqlite3.connect(db_path)
+    image, row_hash = conn.execute("SELECT image, content_hash FROM memes").fetchone()
+    conn.close()
+    assert image == "cd/cd34.png"
+    assert row_hash == content_hash(("m", "cd/cd34.png", "d", "t"))
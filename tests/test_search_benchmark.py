@@ -0,0 +1,74 @@
+import pytest
+
+from benchmarks.common import compare_with_baseline, percentile, save_baseline, summarize
+from benchmarks.search_benchmark import run
+
+
+def test_percentile_interpolates():
+    """Проверяет перцентили с интерполяцией между соседними замерами."""
+    values = [4, 1, 3, 2]
+    assert percentile(values, 0) == 1
+    assert percentile(values, 50) == pytest.approx(2.5)
+    assert percentile(values, 100) == 4
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_with_baseline_reports_regressions(tmp_path):
+    """Проверяет, что рост p95 и падение пропускной способности сверх допуска — регрессии."""
+    path = tmp_path / "baseline.json"
+    save_baseline(str(path), {"search/text": summarize([0.010] * 10, 0.1)})
+
+    assert compare_with_baseline({"search/text": summarize([0.011] * 10, 0.11)}, str(path)) == []
+    regressions = compare_with_baseline({"search/text": summarize([0.020] * 10, 0.2)}, str(path))
+    assert len(regressions) == 2
+
+
+def test_run_covers_all_scenarios_against_fake_services():
+    """
+    Прогоняет бенчмарк в миниатюре: ElasticsearchManager с настоящим клиентом
+    ES против локальной замены и заглушки embeddings API.
+    """
+    results = run(
+        docs=60, dim=16, iterations=4, es_latency_ms=0, embed_latency_ms=0,
+        k=3, hybrid_k=10, sync_repeats=1
+    )
+
+    assert set(results) == {
+        "sync_db_to_elasticsearch",
+        *(f"{method}/{kind}" for method in ("search", "search_with_hybrid")
+          for kind in ("text", "knn_fallback", "emoji")),
+    }
+    for name, row in results.items():
+        assert row["errors"] == 0, name
+        assert row["count"] > 0
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"]
+
+
+def test_fake_elasticsearch_serves_text_and_knn_search(tmp_path):
+    """Проверяет, что замена ES отвечает на текстовый и KNN-поиск менеджера после bulk-загрузки."""
+    from elasticsearch import Elasticsearch
+
+    from benchmarks.fake_es import start_fake_elasticsearch
+    from benchmarks.search_benchmark import build_dataset
+    from elasticsearch_utils import ElasticsearchManager
+    from embedding_providers import HashingEmbeddingProvider
+
+    db_path = str(tmp_path / "memes.db")
+    vocabulary = build_dataset(db_path, docs=40, dim=16)
+    server = start_fake_elasticsearch()
+    try:
+        manager = ElasticsearchManager(
+            db_path=db_path, index_name="bench", embedding_dim=16,
+            provider=HashingEmbeddingProvider(dim=16), es=Elasticsearch(server.url)
+        )
+        manager.initialize_elasticsearch()
+        manager.sync_db_to_elasticsearch()
+
+        text_results = manager._search_text_fields(vocabulary[0], 5)
+        assert text_results
+        assert all(vocabulary[0] in " ".join([r["name"], r["tags"], r["description"]])
+                   for r in text_results)
+        assert len(manager.search("qwxzjvqw", k=5)) == 5
+        assert server.request_counts["_bulk"] == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,363 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from embedding_providers import EmbeddingProvider
+from event_log import EventLog, SQLiteEventSink
+from metrics import DEGRADED_SEARCHES
+from search_service import (
+    BatchingEmbeddingProvider,
+    CachedEmbeddingProvider,
+    SearchService,
+    SingleFlight,
+    TTLCache,
+    hot_queries,
+)
+from tracing import stage, start_trace
+
+
+class FakeProvider(EmbeddingProvider):
+    name, dim, field = "fake", 2, "image_embedding"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class SlowManager:
+    """Менеджер поиска с задержкой текстового запроса, считающий одновременные вызовы."""
+
+    def __init__(self, delay=0.02, fail=(), embed_delay=0.0):
+        self.provider = CachedEmbeddingProvider(FakeProvider())
+        self.delay = delay
+        self.embed_delay = embed_delay
+        self.fail = set(fail)
+        self.active = self.peak = 0
+        self.calls = []
+        self.embed_timeouts = []
+        self._lock = threading.Lock()
+
+    def search_text(self, query, k, timeout=None):
+        with self._lock:
+            self.calls.append(query)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if query in self.fail:
+            raise RuntimeError("ES недоступен")
+        return [{"id": str(len(query))}]
+
+    def embedding_text(self, query):
+        return query
+
+    def _is_emoji_only(self, query):
+        return False
+
+    def _embed_query(self, text, timeout=None):
+        self.embed_timeouts.append(timeout)
+        time.sleep(self.embed_delay)
+        return self.provider.field, self.provider.embed_one(text)
+
+    def search_vector(self, field, vector, k, timeout=None):
+        return [{"id": "100"}]
+
+
+def _no_local(query, k):
+    return ()
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.002)
+
+
+def test_embedding_cache_embeds_only_missing_texts():
+    """Проверяет, что в провайдер уходят только новые тексты и без повторов."""
+    inner = FakeProvider()
+    provider = CachedEmbeddingProvider(inner)
+    assert provider.embed(["Кот", "кот ", "пёс"]) == [[3.0, 1.0], [3.0, 1.0], [3.0, 1.0]]
+    assert provider.embed_one("КОТ") == [3.0, 1.0]
+    provider.embed(["пёс", "мем"])
+    assert inner.calls == [["Кот", "пёс"], ["мем"]]
+    assert provider.cache.stats() == {"hit": 2, "miss": 3}
+
+
+def test_hybrid_caches_only_non_empty_results():
+    """Проверяет кеш результатов по нормализованной теме; пустой ответ не кешируется."""
+    manager = MagicMock()
+    manager.search_text.side_effect = [[{"id": "7"}, {"id": 3}], [], []]
+    manager._embed_query.return_value = ("image_embedding", [0.1])
+    manager.search_vector.return_value = []
+    service = SearchService(manager=manager, hedge_after=None)
+    assert service.hybrid("Котики") == [7, 3]
+    assert service.hybrid(" котики ") == [7, 3]
+    assert service.hybrid("пусто") == []
+    assert service.hybrid("пусто") == []
+    assert manager.search_text.call_count == 3
+
+
+async def test_warm_up_bounded_concurrency_and_ready_flag():
+    """
+    Проверяет прогрев: эмбеддинги всех тем одним запросом, не больше concurrency
+    поисков одновременно, недоступный ES не прерывает прогрев, ready выставляется в конце.
+    """
+    manager = SlowManager(fail={"жаба"})
+    service = SearchService(manager=manager, hedge_after=None, local_search=_no_local)
+    queries = ["кот", "Кот", "пёс", "мем", "жаба", " "]
+    assert not service.ready.is_set()
+
+    stats = await service.warm_up(queries, concurrency=2)
+
+    assert (stats["queries"], stats["failed"]) == (4, 0)
+    assert service.ready.is_set()
+    assert manager.peak == 2
+    assert manager.provider.provider.calls == [["Кот", "пёс", "мем", "жаба"]]
+    assert service.hybrid("мем") == [3, 100] and len(manager.calls) == 4
+
+
+
+async def test_warm_up_embeds_the_text_used_by_search():
+    """Проверяет, что прогрев кодирует embedding_text темы, и поиск по ней не кодирует заново."""
+    manager = SlowManager()
+    manager.embedding_text = lambda query: "кот" if query == "🐱" else query
+    service = SearchService(manager=manager, hedge_after=None, local_search=_no_local)
+
+    await service.warm_up(["🐱"])
+
+    assert manager.provider.provider.calls == [["кот"]]
+
+
+async def test_search_stages_attach_to_update_trace():
+    """Проверяет, что этапы гибридного поиска из пула сервиса попадают в трассу обновления."""
+    class TracedManager(SlowManager):
+        def search_text(self, query, k, timeout=None):
+            with stage("es_text"):
+                return super().search_text(query, k, timeout)
+
+        def _embed_query(self, text, timeout=None):
+            with stage("embedding"):
+                return super()._embed_query(text, timeout)
+
+        def search_vector(self, field, vector, k, timeout=None):
+            with stage("es_knn"):
+                return super().search_vector(field, vector, k, timeout)
+
+    service = SearchService(manager=TracedManager(delay=0), hedge_after=None)
+    with start_trace("update") as trace:
+        assert await service.ahybrid("кот") == [3, 100]
+
+    [operation_span] = trace.root.children
+    assert operation_span.name == "search_with_hybrid"
+    assert [child.name for child in operation_span.children] == ["es_text", "embedding", "es_knn"]
+
+def test_hot_queries_from_file_and_event_log(tmp_path):
+    """Проверяет источники тем для прогрева: файл и журнал событий без пустых тем."""
+    path = tmp_path / "hot.txt"
+    path.write_text("# популярное\nкот\n\nпёс\nмем\n", encoding="utf-8")
+    assert hot_queries(top=2, path=str(path)) == ["кот", "пёс"]
+
+    sink = SQLiteEventSink(str(tmp_path / "events.db"))
+    log = EventLog(sink)
+    for query, results in [("кот", 5), ("Кот", 5), ("пельмени", 0), ("пельмени", 0), ("пёс", 1)]:
+        log.record("search", query=query, results=results)
+    log.flush()
+    with patch("search_service.make_sink", return_value=sink):
+        assert hot_queries(top=10, path=None) == ["кот", "пёс"]
+    assert hot_queries(top=0) == []
+
+
+async def test_identical_concurrent_searches_share_one_call():
+    """
+    Проверяет single flight: одновременные одинаковые темы (с точностью
+    до нормализации) ищутся один раз, ошибка ведущего достаётся всем ждущим.
+    """
+    import asyncio
+
+    manager = SlowManager(delay=0.05)
+    service = SearchService(manager=manager, hedge_after=None)
+    results = await asyncio.gather(*(service.ahybrid(q) for q in ["Кот", "кот", " кот ", "пёс"]))
+    assert results == [[3, 100]] * 4
+    assert sorted(manager.calls) == ["Кот", "пёс"]
+    assert service.flights.stats() == {"leader": 2, "shared": 2}
+
+    calls = []
+
+    def broken():
+        calls.append(1)
+        time.sleep(0.05)
+        raise RuntimeError("сломано")
+
+    flights = SingleFlight("test")
+    errors = await asyncio.gather(flights.ado("x", broken), flights.ado("x", broken),
+                                  return_exceptions=True)
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert len(calls) == 1 and flights._calls == {}
+
+
+
+async def test_async_leader_runs_on_given_pool_and_is_kept_until_done():
+    """Проверяет, что ведущий ado выполняется в переданном пуле и держится до окончания."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    flights = SingleFlight("test", ThreadPoolExecutor(1, thread_name_prefix="own-pool"))
+    gate = threading.Event()
+
+    def leader():
+        gate.wait(2)
+        return threading.current_thread().name
+
+    waiter = asyncio.ensure_future(flights.ado("x", leader))
+    await asyncio.sleep(0.01)
+    assert len(flights._running) == 1
+    gate.set()
+    assert (await waiter).startswith("own-pool")
+    assert flights._running == set()
+
+def test_embedding_calls_coalesce_across_threads():
+    """Проверяет, что текст, который уже кодирует другой поток, не кодируется повторно."""
+    gate = threading.Event()
+
+    class GatedProvider(FakeProvider):
+        def embed(self, texts):
+            gate.wait(2)
+            return super().embed(texts)
+
+    inner = GatedProvider()
+    provider = CachedEmbeddingProvider(inner)
+    results = []
+    threads = [threading.Thread(target=lambda t=t: results.append(provider.embed(t)))
+               for t in (["кот"], ["Кот", "пёс"])]
+    threads[0].start()
+    _wait_until(lambda: "кот" in provider.flights._calls)
+    threads[1].start()
+    _wait_until(lambda: provider.flights.shared == 1)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert sorted(inner.calls) == [["кот"], ["пёс"]]
+    assert sorted(results) == [[[3.0, 1.0]], [[3.0, 1.0], [3.0, 1.0]]]
+    assert provider.flights.stats() == {"leader": 2, "shared": 1}
+
+
+def test_concurrent_embeddings_share_one_provider_call():
+    """
+    Проверяет, что тексты одновременных поисков кодируются одним вызовом провайдера,
+    а каждый поток получает свой вектор; длинный список идёт в провайдер напрямую.
+    """
+    inner = FakeProvider()
+    provider = CachedEmbeddingProvider(BatchingEmbeddingProvider(inner, window=0.1, max_batch=8))
+    texts = ["кот", "собака", "пёс", "хомячок", "кот"]
+    results = {}
+    threads = [threading.Thread(target=lambda i=i, t=t: results.update({i: provider.embed_one(t)}))
+               for i, t in enumerate(texts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [results[i] for i in range(len(texts))] == [[float(len(t)), 1.0] for t in texts]
+    assert len(inner.calls) == 1 and sorted(inner.calls[0]) == ["кот", "пёс", "собака", "хомячок"]
+
+    batch = [f"тема {i}" for i in range(8)]
+    assert provider.embed(batch) == inner.embed(batch)
+    assert inner.calls[-2] == batch
+
+
+def test_slow_embedding_returns_partial_text_within_budget():
+    """
+    Проверяет бюджет: если эмбеддинг не успевает, возвращаются текстовые
+    результаты без KNN, не дольше бюджета, и такой ответ не кешируется.
+    """
+    manager = SlowManager(delay=0, embed_delay=0.5)
+    service = SearchService(manager=manager, budget=0.1, hedge_after=None)
+    before = DEGRADED_SEARCHES.labels("text_only").value
+
+    started = time.monotonic()
+    assert service.hybrid("кот") == [3]
+    assert time.monotonic() - started < 0.3
+    assert DEGRADED_SEARCHES.labels("text_only").value == before + 1
+    assert service.cache.get(("hybrid", "кот", 100)) is None
+    assert service.embedding_breaker.failures == 1
+    # Провайдер получил оставшийся бюджет, а не ждёт ответа сколько угодно
+    assert 0 < manager.embed_timeouts[0] <= 0.1
+
+
+def test_embedding_timeout_reaches_provider_through_wrappers():
+    """
+    Проверяет, что таймаут из with_options доходит через кеш и пачки до исходного
+    провайдера (без повторов), а ожидание медленного провайдера им ограничено.
+    """
+    class OptionsProvider(FakeProvider):
+        def __init__(self, delay=0.0):
+            super().__init__()
+            self.delay = delay
+            self.options = []
+
+        def with_options(self, **options):
+            self.options.append(options)
+            return self
+
+        def embed(self, texts):
+            time.sleep(self.delay)
+            return super().embed(texts)
+
+    inner = OptionsProvider()
+    provider = CachedEmbeddingProvider(BatchingEmbeddingProvider(inner, window=0.01, max_batch=8))
+    assert provider.with_options(timeout=0.5, max_retries=0).embed(["кот"]) == [[3.0, 1.0]]
+    [options] = inner.options
+    assert options["max_retries"] == 0 and 0 < options["timeout"] <= 0.5
+    assert provider.embed(["пёс"]) == [[3.0, 1.0]] and len(inner.options) == 1
+
+    slow = CachedEmbeddingProvider(BatchingEmbeddingProvider(OptionsProvider(delay=0.5),
+                                                             window=0.01, max_batch=8))
+    started = time.monotonic()
+    with pytest.raises(FutureTimeoutError):
+        slow.with_options(timeout=0.05).embed(["кот"])
+    assert time.monotonic() - started < 0.3
+
+
+
+def test_plain_search_is_bounded_by_budget():
+    """
+    Проверяет, что search (инлайн-режим) укладывается в бюджет: медленный ES
+    даёт локальный запасной ответ и ошибку предохранителя, быстрый — текстовые результаты.
+    """
+    slow = SearchService(manager=SlowManager(delay=0.5), budget=0.1, hedge_after=None,
+                         local_search=lambda query, k: (7,))
+    started = time.monotonic()
+    assert slow.search("кот") == [7]
+    assert time.monotonic() - started < 0.3
+    assert slow.es_breaker.failures == 1
+
+    manager = SlowManager(delay=0)
+    service = SearchService(manager=manager, hedge_after=None)
+    assert service.search("кот") == [3] and service.search("Кот") == [3]
+    assert manager.calls == ["кот"] and manager.embed_timeouts == []
+
+def test_breaker_opens_and_serves_stale_cache_or_local_results():
+    """
+    Проверяет предохранитель ES: после серии ошибок ES больше не вызывается,
+    ответ берётся из устаревшего кеша, а без него — из локального поиска.
+    """
+    manager = SlowManager(delay=0, fail={"кот", "пёс"})
+    cache = TTLCache(10, ttl=0)
+    cache.put(("hybrid", "кот", 100), (42,))
+    service = SearchService(manager=manager, cache=cache, hedge_after=None,
+                            local_search=lambda query, k: (7, 8))
+    service.es_breaker.failure_threshold = 2
+
+    assert service.hybrid("кот") == [42]
+    assert service.hybrid("пёс") == [7, 8]
+    assert service.es_breaker.state == "open"
+    assert service.hybrid("кот") == [42]
+    assert manager.calls == ["кот", "пёс"]
@@ -0,0 +1,53 @@
+import sqlite3
+
+from tag_index import TagIndex, parse_tags
+
+MEMES = [
+    (1, 'кринж, Кот, "чисто мой вайб", "да, это я"'),
+    (2, 'кот, котики, ёлка'),
+    (3, 'Кот, кринж, кофе'),
+    (4, '-'),
+]
+
+
+def test_parse_tags_handles_quotes_and_duplicates():
+    """Проверяет разбор строки тегов: кавычки, запятая внутри кавычек, повторы."""
+    assert parse_tags('кринж, Кот, "чисто мой вайб", "да, это я", кот') == [
+        "кринж", "Кот", "чисто мой вайб", "да, это я"
+    ]
+    assert parse_tags('-') == [] and parse_tags(None) == []
+
+
+def test_complete_ranks_by_frequency_and_normalizes():
+    """Проверяет подсказки: частые теги первыми, регистр и ё не важны."""
+    index = TagIndex(MEMES)
+    assert index.complete("ко") == [("Кот", 3), ("котики", 1), ("кофе", 1)]
+    assert index.complete("КОТ", limit=1) == [("Кот", 3)]
+    assert index.complete("елк") == [("ёлка", 1)]
+    assert index.complete("")[:2] == [("Кот", 3), ("кринж", 2)]
+    assert index.complete("нет") == []
+
+
+def test_match_query_answers_pure_tag_queries():
+    """Проверяет точный поиск: один тег, пересечение тегов и запросы не из тегов."""
+    index = TagIndex(MEMES)
+    assert list(index.lookup("кот")) == [1, 2, 3]
+    assert index.match_query("Кот") == [1, 2, 3]
+    assert index.match_query("кот, кринж") == [1, 3]
+    assert index.match_query("кот в сапогах") is None
+    assert index.match_query("котики, кофе") is None
+
+
+def test_from_db_and_missing_db(tmp_path):
+    """Проверяет построение индекса из базы и пустой индекс без базы (файл не создаётся)."""
+    db_path = tmp_path / "memes.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE memes (id INTEGER PRIMARY KEY, tags TEXT)")
+    conn.executemany("INSERT INTO memes VALUES (?, ?)", MEMES)
+    conn.commit()
+    conn.close()
+    assert TagIndex.from_db(str(db_path)).match_query("кофе") == [3]
+
+    missing = tmp_path / "missing.db"
+    assert len(TagIndex.from_db(str(missing))) == 0
+    assert not missing.exists()
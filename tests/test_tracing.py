@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import bot
+from benchmarks.bot_load import make_update
+from benchmarks.fake_telegram import FakeTelegramSession
+from tracing import (
+    SamplingProfiler,
+    arm_profiling,
+    claim_profiling,
+    render_tree,
+    span,
+    stage,
+    start_trace,
+)
+
+
+def test_spans_nest_into_tree():
+    """Проверяет, что этапы и отрезки складываются в дерево текущей трассы."""
+    with start_trace("update", update_id=1) as trace:
+        with span("handler"):
+            with stage("es_text", k=5) as es_span:
+                es_span.set(hits=3)
+            with stage("embedding"):
+                pass
+
+    handler = trace.root.children[0]
+    assert handler.name == "handler"
+    assert [child.name for child in handler.children] == ["es_text", "embedding"]
+    assert handler.children[0].attributes == {"k": 5, "hits": 3}
+    assert trace.root.duration >= handler.duration >= 0
+    tree = render_tree(trace.root)
+    assert "update" in tree and "    es_text" in tree and "hits=3" in tree
+
+
+def test_span_outside_trace_is_noop():
+    """Вне трассы отрезок ничего не создаёт."""
+    with span("orphan") as orphan:
+        assert orphan is None
+
+
+async def test_trace_context_propagates_to_threads():
+    """Проверяет, что отрезки из asyncio.to_thread попадают в трассу обновления."""
+    def blocking():
+        with span("in_thread"):
+            time.sleep(0.001)
+
+    with start_trace("update") as trace:
+        await asyncio.to_thread(blocking)
+
+    assert [child.name for child in trace.root.children] == ["in_thread"]
+
+
+def test_profiling_claims_exactly_n_updates():
+    """Проверяет, что профилирование забирает ровно N следующих обновлений."""
+    session = arm_profiling("cpu", 2, chat_id=1)
+    assert claim_profiling() is session
+    assert claim_profiling() is session
+    assert claim_profiling() is None
+
+
+def test_sampling_profiler_sees_busy_function():
+    """Проверяет, что сэмплирующий профилировщик находит функцию, занимающую поток."""
+    def busy_loop_for_profiler():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.002).start()
+    busy_loop_for_profiler()
+    profiler.stop()
+
+    assert profiler.samples > 0
+    assert "busy_loop_for_profiler" in profiler.report()
+
+
+def test_es_profile_flag_added_when_profiling_es():
+    """В режиме es поисковые запросы получают profile: true, сводка попадает в трассу."""
+    from elasticsearch_utils import ElasticsearchManager
+
+    with patch('elasticsearch_utils.Elasticsearch') as mock_es_class:
+        mock_es_class.return_value.ping.return_value = True
+        manager = ElasticsearchManager(db_path='fake.db', provider=MagicMock())
+    manager.es.search.return_value = {
+        "hits": {"hits": [{"_source": {"db_id": 1}, "_score": 1.0}]},
+        "profile": {"shards": [{"id": "[n][idx][0]", "searches": [{"query": [
+            {"type": "BooleanQuery", "description": "tags:кот", "time_in_nanos": 2_500_000}
+        ]}]}]},
+    }
+
+    with start_trace("update") as trace:
+        trace.profile_mode = "es"
+        manager._search_text_fields("кот", 5)
+
+    assert manager.es.search.call_args.kwargs["body"]["profile"] is True
+    name, lines = trace.es_profiles[0]
+    assert name == "es_text"
+    assert "BooleanQuery 2.50 мс" in lines[0]
+
+    manager._search_text_fields("кот", 5)
+    assert "profile" not in manager.es.search.call_args.kwargs["body"]
+
+
+async def test_bot_logs_slow_updates_and_sends_profile_report(caplog):
+    """
+    Прогоняет обновления через dp: медленные логируются с деревом отрезков,
+    а /profile от администратора присылает отчёт файлом после N запросов.
+    """
+    session = FakeTelegramSession()
+    session.middleware = bot.bot.session.middleware
+    with patch.object(bot.bot, 'session', session), \
+         patch('bot.ADMIN_IDS', {42}), \
+         patch('bot.TRACE_SLOW_MS', 0), \
+         caplog.at_level(logging.WARNING, logger='bot'):
+        await bot.dp.feed_update(bot.bot, make_update(1, 7, "/profile"))
+        assert session.calls["sendMessage"] == 1
+        assert session.history[-1][2].text == bot.Texts.admin_only
+
+        await bot.dp.feed_update(bot.bot, make_update(2, 42, "/profile 2 cpu"))
+        await bot.dp.feed_update(bot.bot, make_update(3, 42, "/start"))
+        assert session.calls["sendDocument"] == 0
+        await bot.dp.feed_update(bot.bot, make_update(4, 42, "/help"))
+        assert session.calls["sendDocument"] == 1
+
+    assert any("cmd_start" in r.message and "telegram.sendMessage" in r.message
+               for r in caplog.records)
+    document = session.history[-1][2]
+    report = document.document.data.decode("utf-8")
+    assert "cmd_start" in report and "cmd_help" in report
+    assert "сэмплов" in report
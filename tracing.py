@@ -0,0 +1,344 @@
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextvars import ContextVar
+
+from metrics import OPERATION_SECONDS, STAGE_SECONDS
+
+# Интервал опроса стека сэмплирующим профилировщиком, секунды
+PROFILE_SAMPLE_INTERVAL = 0.005
+# Сколько кадров стека сохранять в одном сэмпле
+PROFILE_STACK_DEPTH = 25
+
+_current_span: ContextVar = ContextVar("meme_trace_span", default=None)
+
+
+class Span:
+    """
+    Отрезок времени внутри трассы обновления: обработчик, этап поиска, вызов Bot API.
+
+    Атрибуты:
+      - name: имя этапа.
+      - attributes: произвольные пометки (k, поле KNN, ошибка, ...).
+      - children: вложенные отрезки в порядке начала.
+      - duration: длительность в секундах (None, пока отрезок не закрыт).
+    """
+
+    __slots__ = ("name", "attributes", "children", "trace", "offset", "duration")
+
+    def __init__(self, name: str, trace: "Trace", attributes: dict):
+        self.name = name
+        self.trace = trace
+        self.attributes = attributes
+        self.children = []
+        self.offset = time.perf_counter() - trace.started if trace else 0.0
+        self.duration = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """
+    Трасса одного обновления Telegram: дерево Span с корнем root.
+
+    profile_mode — "cpu" или "es", если обновление попало под профилирование
+    (см. arm_profiling); es_profiles — краткие сводки profile из ответов ES.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.started = time.perf_counter()
+        self.profile_mode = None
+        self.es_profiles = []
+        self.root = Span(name, self, attributes)
+        self.root.offset = 0.0
+
+
+class _SpanContext:
+    """Контекстный менеджер отрезка; заодно пишет длительность в гистограмму метрик."""
+
+    __slots__ = ("name", "attributes", "histogram", "span", "token", "started")
+
+    def __init__(self, name: str, attributes: dict, histogram=None):
+        self.name = name
+        self.attributes = attributes
+        self.histogram = histogram
+        self.span = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            self.span = Span(self.name, parent.trace, self.attributes)
+            parent.children.append(self.span)
+            self.token = _current_span.set(self.span)
+        self.started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if self.histogram is not None:
+            self.histogram.observe(elapsed)
+        if self.span is not None:
+            self.span.duration = elapsed
+            if exc_type is not None:
+                self.span.attributes["error"] = exc_type.__name__
+            _current_span.reset(self.token)
+        return False
+
+
+def span(name: str, **attributes) -> _SpanContext:
+    """
+    Открывает вложенный отрезок текущей трассы.
+
+    Вне трассы (скрипты, тесты) ничего не записывает, кроме замера времени.
+    """
+    return _SpanContext(name, attributes)
+
+
+def stage(name: str, **attributes) -> _SpanContext:
+    """Этап поиска или отправки: отрезок трассы + гистограмма meme_stage_seconds."""
+    return _SpanContext(name, attributes, STAGE_SECONDS.labels(name))
+
+
+def operation(name: str):
+    """
+    Декоратор операции целиком (обычной или async функции):
+    отрезок трассы + гистограмма meme_operation_seconds.
+    """
+    histogram = OPERATION_SECONDS.labels(name)
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _SpanContext(name, {}, histogram):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _SpanContext(name, {}, histogram):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes) -> None:
+    """Добавляет пометки к текущему отрезку, если трасса активна."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+class start_trace:
+    """
+    Начинает трассу обновления и делает её корень текущим отрезком.
+
+    Использование:
+        with start_trace("update", update_id=1) as trace:
+            ...
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.trace = Trace(name, **attributes)
+
+    def __enter__(self) -> Trace:
+        self._token = _current_span.set(self.trace.root)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.root.duration = time.perf_counter() - self.trace.started
+        if exc_type is not None:
+            self.trace.root.attributes["error"] = exc_type.__name__
+        _current_span.reset(self._token)
+        return False
+
+
+def current_trace() -> Trace | None:
+    current = _current_span.get()
+    return current.trace if current is not None else None
+
+
+def render_tree(root: Span) -> str:
+    """
+    Форматирует дерево отрезков: смещение от начала трассы, длительность, имя и пометки.
+    """
+    lines = []
+
+    def walk(node: Span, depth: int) -> None:
+        duration = f"{node.duration * 1000:8.1f} мс" if node.duration is not None else "   (открыт)"
+        attributes = " ".join(f"{k}={v}" for k, v in node.attributes.items())
+        lines.append(
+            f"+{node.offset * 1000:7.1f} {duration}  {'  ' * depth}{node.name}"
+            + (f"  [{attributes}]" if attributes else "")
+        )
+        for child in node.children:
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return "\n".join(lines)
+
+
+def es_profile_requested() -> bool:
+    """True, если текущее обновление профилируется в режиме es (нужно profile: true в запросе)."""
+    trace = current_trace()
+    return trace is not None and trace.profile_mode == "es"
+
+
+def _summarize_es_profile(profile: dict) -> list:
+    lines = []
+    for shard in profile.get("shards", []):
+        for search in shard.get("searches", []):
+            for query in search.get("query", []):
+                lines.append(
+                    f"{shard.get('id', '?')} {query.get('type', '?')} "
+                    f"{query.get('time_in_nanos', 0) / 1e6:.2f} мс "
+                    f"{str(query.get('description', ''))[:120]}"
+                )
+        for aggregation in shard.get("aggregations", []):
+            lines.append(
+                f"{shard.get('id', '?')} агрегация {aggregation.get('type', '?')} "
+                f"{aggregation.get('time_in_nanos', 0) / 1e6:.2f} мс"
+            )
+    return lines or ["(пустой profile)"]
+
+
+def record_es_profile(name: str, response) -> None:
+    """Сохраняет сводку profile из ответа ES в трассу (если профилирование es включено)."""
+    trace = current_trace()
+    if trace is None or trace.profile_mode != "es":
+        return
+    profile = response.get("profile") if hasattr(response, "get") else None
+    if profile:
+        trace.es_profiles.append((name, _summarize_es_profile(profile)))
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик потока: раз в interval секунд снимает стек
+    через sys._current_frames() и считает одинаковые стеки.
+
+    Профилирует весь поток (обычно поток event loop), поэтому при одновременных
+    обновлениях в отчёт попадает и их работа.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(
+                    f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+                )
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self, top: int = 15) -> str:
+        """Самые частые функции на вершине стека и самые частые стеки целиком."""
+        if not self.samples:
+            return "(нет сэмплов)"
+        leaves = _Tally()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        lines = [f"сэмплов: {self.samples} (раз в {self.interval * 1000:.0f} мс)", "",
+                 "функции на вершине стека:"]
+        for leaf, count in leaves.most_common(top):
+            lines.append(f"  {100 * count / self.samples:5.1f}%  {leaf}")
+        lines += ["", "стеки:"]
+        for stack, count in self.stacks.most_common(top):
+            chain = " <- ".join(reversed(stack[-6:]))
+            lines.append(f"  {100 * count / self.samples:5.1f}%  {chain}")
+        return "\n".join(lines)
+
+
+class ProfileSession:
+    """
+    Профилирование следующих count обновлений, включённое командой администратора.
+
+    Атрибуты:
+      - mode: "cpu" (сэмплирующий профилировщик) или "es" (profile: true в запросах ES).
+      - chat_id: куда отправить отчёт.
+      - reports: отчёты уже обработанных обновлений.
+    """
+
+    def __init__(self, mode: str, count: int, chat_id: int):
+        self.mode = mode
+        self.count = count
+        self.chat_id = chat_id
+        self.claimed = 0
+        self.reports = []
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        """Забирает слот под очередное обновление; False, если слоты кончились."""
+        with self._lock:
+            if self.claimed >= self.count:
+                return False
+            self.claimed += 1
+            return True
+
+    def add_report(self, text: str) -> bool:
+        """Сохраняет отчёт; True, если это был последний ожидаемый отчёт."""
+        with self._lock:
+            self.reports.append(text)
+            return len(self.reports) >= self.count
+
+    def render(self) -> str:
+        return f"\n\n{'=' * 60}\n\n".join(self.reports)
+
+
+PROFILE_MODES = ("cpu", "es")
+_profile_session = None
+
+
+def arm_profiling(mode: str, count: int, chat_id: int) -> ProfileSession:
+    """
+    Включает профилирование следующих count обновлений.
+
+    Raises:
+        ValueError: Неизвестный режим или count < 1.
+    """
+    global _profile_session
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Неизвестный режим профилирования: {mode}")
+    if count < 1:
+        raise ValueError("Число запросов должно быть положительным")
+    _profile_session = ProfileSession(mode, count, chat_id)
+    return _profile_session
+
+
+def claim_profiling() -> ProfileSession | None:
+    """Возвращает активную сессию профилирования, если очередное обновление в неё попадает."""
+    global _profile_session
+    session = _profile_session
+    if session is None or not session.claim():
+        return None
+    if session.claimed >= session.count:
+        _profile_session = None
+    return session